@@ -1,100 +1,353 @@
-from flask import Flask, request, jsonify, render_template, redirect
+from flask import (
+    Blueprint, Flask, Response, current_app, request, jsonify, render_template, redirect, make_response, g,
+    stream_with_context
+)
 from flask_cors import CORS
 from dotenv import load_dotenv
-from src.utils.config import load_config
+from src.utils.config import load_config, get_ingestion_mode, get_dashboard_cache_ttl, get_dashboard_cache_stale_ttl
+from src.utils.response_cache import StaleWhileRevalidateCache
+from src.utils.compression import COMPRESSIBLE_TYPES, choose_encoding, should_compress, compress, compress_static, weak_etag
+from src.utils.gateway import LLMUnavailable, get_gateway, get_gateway_stats
+from src.utils.metrics import stage, stats_gauge, start_profile, finish_profile, server_timing, render_prometheus
+from src.utils.api_helpers import (
+    MAX_PAGE_SIZE, FEEDBACK_OUTCOMES, PROMETHEUS_CONTENT_TYPE, page_limit, parse_feedback_filters,
+    parse_search_query, parse_report_period, parse_timeline_params, timeline_buckets, dashboard_payload, static_version,
+    static_cache_control, serialize_feedback, is_valid_feedback_request, wants_async_ingestion, retry_after_headers,
+    wants_profile, record_request
+)
 from src.database.database import *
 from src.analysis.analysis import *
-from src.reporting.report import schedule_weekly_report
-import threading
+from src.analysis.cache import get_cache_stats
+from src.analysis.features import assign_feature_cluster
+from src.analysis.prefilter import get_prefilter_stats
+from src.ingestion.worker import start_ingestion_workers, notify_ingestion_workers
+from src.ingestion.bulk import BulkImporter, read_feedback_items, detect_format, stream_report
+from src.ingestion.submissions import parse_idempotency_key, submit_once
+import io
+import json
+import time
+from datetime import date
 
 # Load configuration
 load_config()
 
-app = Flask(__name__)
+# Routes and request hooks; create_app() registers them on a new app
+routes = Blueprint('api', __name__)
 
-CORS(app)
+# Endpoints answered without touching the database (no schema check needed)
+SCHEMA_FREE_ENDPOINTS = ('static', 'api.health_check')
 
-# Initialize the database on startup
-init_db()
+# Dashboard data cache (default timeline), invalidated whenever feedbacks are written
+dashboard_cache = StaleWhileRevalidateCache(get_dashboard_cache_ttl(), get_dashboard_cache_stale_ttl())
+on_feedbacks_changed(dashboard_cache.invalidate)
+
+stats_gauge('alumind_dashboard_cache', 'Dashboard cache statistics', dashboard_cache.stats, register=True)
+
+# Start timing the request; X-Profile: 1 also collects its stage breakdown
+@routes.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if wants_profile(request.headers):
+        g.profile_token = start_profile()
+
+# Check (or apply, see SCHEMA_STARTUP) the schema migrations before the first request that
+# needs the database, so importing the app never waits on it
+@routes.before_app_request
+def check_schema():
+    if request.endpoint in SCHEMA_FREE_ENDPOINTS:
+        return None
+    try:
+        ensure_schema_once()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+    return None
+
+# Record request metrics; profiled requests get their breakdown in a Server-Timing header
+@routes.after_app_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    record_request(request.method, request.url_rule, response.status_code, elapsed)
+    if 'profile_token' in g:
+        response.headers['Server-Timing'] = server_timing(finish_profile(g.pop('profile_token')), elapsed)
+    return response
+
+# Compress text bodies for clients that accept it; versioned static files may be kept for a year
+@routes.after_app_request
+def compress_response(response):
+    static = request.endpoint == 'static'
+    if static and request.args.get('v'):
+        response.headers['Cache-Control'] = static_cache_control()
+    if response.mimetype not in COMPRESSIBLE_TYPES or (response.is_streamed and not static):
+        # Streamed bodies (e.g. the report preview) are sent as they are produced
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if not encoding or not should_compress(response.status_code, response.mimetype, response.content_length or 0,
+                                           response.headers):
+        return response
+
+    etag = response.headers.get('ETag')
+    if static:
+        # Static files are sent straight from disk; read them to compress (once per version)
+        response.direct_passthrough = False
+        body = compress_static(etag, response.get_data(), encoding)
+    else:
+        body = compress(response.get_data(), encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.headers['ETag'] = weak_etag(etag)
+    return response
+
+# Static URLs carry a hash of the file (?v=...), so a changed file gets a new URL
+@routes.app_url_defaults
+def version_static_urls(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_version(current_app.static_folder, values['filename'])
+        if version:
+            values['v'] = version
+
+# Stop collecting stages if the response never reached after_request
+@routes.teardown_app_request
+def discard_profile(error=None):
+    if 'profile_token' in g:
+        finish_profile(g.pop('profile_token'))
 
 # Redirect endpoint
-@app.route('/')
+@routes.route('/')
 def tohome():
     return redirect("/dashboard", code=302)
 
 # Error handler endpoint
-@app.errorhandler(404)
-def page_not_found():
+@routes.app_errorhandler(404)
+def page_not_found(error):
     return "<h1>404</h1><p>The resource could not be found.</p>", 404
 
 # Create feedback endpoint
-@app.route('/feedbacks', methods=['POST'])
+@routes.route('/feedbacks', methods=['POST'])
 def create_feedback():
-    if not request.json or 'id' not in request.json or 'feedback' not in request.json:
+    if not is_valid_feedback_request(request.json):
+        FEEDBACK_OUTCOMES.inc(('invalid',))
         return jsonify({'error': 'Invalid request data'}), 400
+    try:
+        idempotency_key = parse_idempotency_key(request.headers)
+    except ValueError as e:
+        FEEDBACK_OUTCOMES.inc(('invalid',))
+        return jsonify({'error': str(e)}), 400
     
     feedback_data = {
         'id': request.json['id'],
         'feedback': request.json['feedback']
     }
+    queue = wants_async_ingestion(get_ingestion_mode(), request.args)
+
+    # The id is reserved before any analysis, so duplicates and retries never reach the LLM
+    try:
+        body, status_code, headers = submit_once(
+            feedback_data, idempotency_key, lambda: process_feedback(feedback_data, queue))
+    except Exception as e:
+        FEEDBACK_OUTCOMES.inc(('error',))
+        return jsonify({'error': str(e)}), 500
+    return jsonify(body), status_code, headers
+
+# Analyze (or queue) a reserved feedback submission; returns (body, status, headers)
+def process_feedback(feedback_data, queue):
+    # Async mode: store the raw feedback and let the worker pool analyze it
+    if queue:
+        try:
+            if not enqueue_feedback(feedback_data['id'], feedback_data['feedback']):
+                FEEDBACK_OUTCOMES.inc(('duplicate',))
+                return {'error': 'Feedback with this ID already exists'}, 409, {}
+            notify_ingestion_workers()
+        except Exception as e:
+            FEEDBACK_OUTCOMES.inc(('error',))
+            return {'error': str(e)}, 500, {}
+
+        FEEDBACK_OUTCOMES.inc(('queued',))
+
+        status_url = '/feedbacks/%s' % feedback_data['id']
+        return {'id': feedback_data['id'], 'status': 'PENDING', 'status_url': status_url}, 202, {'Location': status_url}
     
     try:
         # Analyze feedback using LLM
-        if spam_filter(feedback_data['feedback']):
-            analysis_result = analyze_feedback_langchain(feedback_data['feedback'], feedback_data['id'])
+        is_valid, analysis_result = analyze_feedback(feedback_data['feedback'], feedback_data['id'])
+        if is_valid:
             feedback_data['sentiment'] = analysis_result['sentiment']
             feedback_data['feature_code'] = analysis_result.get('feature_code')
             feedback_data['feature_reason'] = analysis_result.get('feature_reason')
+            feedback_data.update(analysis_provenance())
+            with stage('clustering'):
+                feedback_data['feature_cluster_id'] = assign_feature_cluster(
+                    feedback_data['feature_code'], feedback_data['feature_reason']
+                )
             
             # Insert feedback into the database
             insert_feedback(feedback_data)
-            return jsonify(analysis_result), 201
+            FEEDBACK_OUTCOMES.inc(('created',))
+            return analysis_result, 201, {}
         else:
-            return jsonify({'error': 'Feedback is spam'}), 400
+            FEEDBACK_OUTCOMES.inc(('spam',))
+            return {'error': 'Feedback is spam'}, 400, {}
     except psycopg2.IntegrityError:
-        return jsonify({'error': 'Feedback with this ID already exists'}), 409
+        FEEDBACK_OUTCOMES.inc(('duplicate',))
+        return {'error': 'Feedback with this ID already exists'}, 409, {}
+    except LLMUnavailable as e:
+        # Provider overloaded or rate limited even after retries: ask the client to come back
+        FEEDBACK_OUTCOMES.inc(('unavailable',))
+        return {'error': str(e)}, 503, retry_after_headers(e)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        FEEDBACK_OUTCOMES.inc(('error',))
+        return {'error': str(e)}, 500, {}
+
+# List feedbacks endpoint (keyset pagination: pass next_cursor back as ?cursor=)
+@routes.route('/feedbacks', methods=['GET'])
+def list_feedbacks():
+    try:
+        limit = page_limit(request.args)
+        filters = parse_feedback_filters(request.args)
+        feedbacks, next_cursor = get_feedbacks_page(limit=limit, cursor=request.args.get('cursor'), **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': [serialize_feedback(row) for row in feedbacks],
+        'next_cursor': next_cursor
+    }), 200
+
+# Search feedbacks endpoint: best matches first, with highlighted excerpts (?fuzzy=1 tolerates typos)
+@routes.route('/feedbacks/search', methods=['GET'])
+def find_feedbacks():
+    try:
+        q, fuzzy = parse_search_query(request.args)
+        results = search_feedbacks(q, limit=page_limit(request.args), fuzzy=fuzzy,
+                                   **parse_feedback_filters(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'items': [serialize_feedback(row) for row in results]}), 200
+
+# Bulk import endpoint (JSONL, CSV or a JSON array of {id, feedback} objects); the JSONL report is
+# streamed chunk by chunk as the rows are committed
+@routes.route('/feedbacks/bulk', methods=['POST'])
+def bulk_import_feedbacks():
+    if request.is_json:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({'error': 'Invalid request data'}), 400
+    else:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        items = read_feedback_items(stream, detect_format(request.content_type))
+
+    report = stream_report(BulkImporter().run(items))
+    return Response(stream_with_context(report), mimetype='application/x-ndjson')
+
+# Feedback analysis status endpoint
+@routes.route('/feedbacks/<feedback_id>', methods=['GET'])
+def get_feedback(feedback_id):
+    feedback_status = get_feedback_status(feedback_id)
+    if feedback_status is None:
+        return jsonify({'error': 'Feedback not found'}), 404
+    return jsonify(feedback_status), 200
 
 # Health check endpoint
-@app.route('/health', methods=['GET'])
+@routes.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'}), 200
 
-# Dashboard endpoint
-@app.route('/dashboard', methods=['GET'])
-def dashboard():
+# Runtime statistics endpoint
+@routes.route('/stats', methods=['GET'])
+def runtime_stats():
+    return jsonify({
+        'db_pool': peek_pool_stats(),
+        'llm_cache': get_cache_stats(),
+        'spam_prefilter': get_prefilter_stats(),
+        'llm_gateway': get_gateway_stats(),
+        'dashboard_cache': dashboard_cache.stats()
+    }), 200
+
+# Prometheus metrics endpoint
+@routes.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body = render_prometheus(extra=get_gateway().metrics())
+    return body, 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+# Render the dashboard data as compact JSON (every figure comes from the stats tables)
+def render_dashboard_data(bucket=None, days=None):
+    if bucket is None or days is None:
+        bucket, days = parse_timeline_params({})
+    buckets = timeline_buckets(date.today(), days, bucket)
+
     total_feedbacks = get_total_feedback_count()
     sentiment_data = get_sentiment_data()
     top_features = get_top_requested_features()
-    feedbacks = get_detailed_feedbacks()
-    
-    sentiment_summary = [
-        {
-            'sentiment': row['sentiment'],
-            'count': row['count'],
-            'percentage': row['percentage']
-        } for row in sentiment_data
-    ]
-    
-    return render_template(
-        "dashboard.html",
-        total_feedbacks=total_feedbacks,
-        sentiment_summary=sentiment_summary,
-        top_features=top_features,
-        feedbacks=feedbacks
-    )
+    timeline = get_feedback_timeline(bucket, buckets[0])
+
+    with stage('render'):
+        payload = dashboard_payload(total_feedbacks, sentiment_data, top_features, timeline, bucket, buckets)
+        return json.dumps(payload, separators=(',', ':'))
+
+# Dashboard endpoint: a static shell; its figures and table are fetched by the page
+@routes.route('/dashboard', methods=['GET'])
+def dashboard():
+    response = make_response(render_template("dashboard.html"))
+    response.add_etag()
+    # Let browsers keep the page but revalidate it on every load (answered with 304 when unchanged)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Dashboard data endpoint (?bucket=day|week|month&days=N for the timeline)
+@routes.route('/dashboard/data', methods=['GET'])
+def dashboard_data():
+    try:
+        timeline = parse_timeline_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The default view is cached; other timelines are cheap reads of the daily counters
+    if timeline == parse_timeline_params({}):
+        body, etag = dashboard_cache.get(render_dashboard_data)
+    else:
+        body = render_dashboard_data(*timeline)
+        etag = dashboard_cache.make_etag(body)
+
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Weekly report preview (?start=YYYY-MM-DD), streamed: the figures arrive first and the narrative
+# once it is ready; narratives are cached per period, so previews repeat no LLM calls
+@routes.route('/reports/weekly', methods=['GET'])
+def weekly_report_preview():
+    try:
+        start, end = parse_report_period(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # The report code (and its LLM client) is loaded on the first preview
+    from src.reporting.report import stream_weekly_report
+    return Response(stream_with_context(stream_weekly_report(start, end)), mimetype='text/html')
 
 # Graphical feedback endpoint
-@app.route('/submit', methods=['GET'])
+@routes.route('/submit', methods=['GET'])
 def submit_feedback_page():
     return render_template("submit_feedback.html", )
 
+# Application factory (e.g. gunicorn "api:create_app()"); the schema is checked on the first
+# request and LangChain/OpenAI are imported by the first LLM call
+def create_app():
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(routes)
+
+    # Resume queued analyses left over from a previous run
+    if get_ingestion_mode() == 'async':
+        start_ingestion_workers()
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    # Start the scheduler in a separate thread
-    scheduler_thread = threading.Thread(target=schedule_weekly_report)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
-    
-    # Run the Flask app
+    # Weekly reports are sent by a separate process: python -m src.reporting.scheduler
     app.run(debug=True)
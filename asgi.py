@@ -0,0 +1,385 @@
+import asyncio
+import io
+import json
+import time
+from datetime import date
+import psycopg
+from quart import Blueprint, Quart, current_app, request, jsonify, render_template, redirect, make_response, g, abort
+from quart.wrappers.response import DataBody, FileBody
+from quart_cors import cors
+from src.utils.config import load_config, get_ingestion_mode, get_dashboard_cache_ttl, get_dashboard_cache_stale_ttl
+from src.utils.response_cache import StaleWhileRevalidateCache
+from src.utils.compression import COMPRESSIBLE_TYPES, choose_encoding, should_compress, compress, compress_static, weak_etag
+from src.utils.gateway import LLMUnavailable, get_gateway, get_gateway_stats
+from src.utils.metrics import stage, stats_gauge, start_profile, finish_profile, server_timing, render_prometheus
+from src.utils.api_helpers import (
+    FEEDBACK_OUTCOMES, PROMETHEUS_CONTENT_TYPE, page_limit, parse_feedback_filters, parse_search_query,
+    parse_report_period, parse_timeline_params, timeline_buckets, dashboard_payload, static_version,
+    static_cache_control, serialize_feedback, is_valid_feedback_request, wants_async_ingestion, retry_after_headers,
+    wants_profile, record_request
+)
+from src.database.database import ensure_schema_once, schema_ready, on_feedbacks_changed, peek_pool_stats
+from src.database.async_database import (
+    open_async_pool, close_async_pool, get_async_pool_stats, insert_feedback_async, enqueue_feedback_async,
+    get_total_feedback_count_async, get_sentiment_data_async, get_top_requested_features_async,
+    get_feedback_timeline_async, get_feedbacks_page_async, get_feedback_status_async, search_feedbacks_async,
+    reserve_submission_async, finish_submission_async
+)
+from src.analysis.analysis import analysis_provenance, analyze_feedback_async
+from src.analysis.cache import get_cache_stats
+from src.analysis.features import assign_feature_cluster
+from src.analysis.prefilter import get_prefilter_stats
+from src.ingestion.worker import start_ingestion_workers, notify_ingestion_workers
+from src.ingestion.bulk import BulkImporter, read_feedback_items, detect_format, stream_report
+from src.ingestion.submissions import parse_idempotency_key, asubmit_once
+
+# asyncio serving mode: the routes and responses of api.py, with LLM calls awaited (ainvoke)
+# and queries on an async connection pool, so a pending analysis costs a coroutine instead
+# of a thread. Run with an ASGI server, e.g.: hypercorn asgi:app
+
+# Load configuration
+load_config()
+
+# Routes and request hooks; create_app() registers them on a new app
+routes = Blueprint('api', __name__)
+
+# Endpoints answered without touching the database (no schema check needed)
+SCHEMA_FREE_ENDPOINTS = ('static', 'api.health_check')
+
+# Dashboard data cache (default timeline), invalidated whenever feedbacks are written
+dashboard_cache = StaleWhileRevalidateCache(get_dashboard_cache_ttl(), get_dashboard_cache_stale_ttl())
+on_feedbacks_changed(dashboard_cache.invalidate)
+
+stats_gauge('alumind_dashboard_cache', 'Dashboard cache statistics', dashboard_cache.stats, register=True)
+
+@routes.before_app_serving
+async def startup():
+    await open_async_pool()
+    # Resume queued analyses left over from a previous run
+    if get_ingestion_mode() == 'async':
+        start_ingestion_workers()
+
+@routes.after_app_serving
+async def shutdown():
+    await close_async_pool()
+
+# Start timing the request; X-Profile: 1 also collects its stage breakdown
+@routes.before_app_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+    if wants_profile(request.headers):
+        g.profile_token = start_profile()
+
+# Check (or apply, see SCHEMA_STARTUP) the schema migrations before the first request that needs
+# the database; the check runs once, on the blocking driver
+@routes.before_app_request
+async def check_schema():
+    if schema_ready() or request.endpoint in SCHEMA_FREE_ENDPOINTS:
+        return None
+    try:
+        await asyncio.to_thread(ensure_schema_once)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+    return None
+
+# Record request metrics; profiled requests get their breakdown in a Server-Timing header
+@routes.after_app_request
+async def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    record_request(request.method, request.url_rule, response.status_code, elapsed)
+    if 'profile_token' in g:
+        response.headers['Server-Timing'] = server_timing(finish_profile(g.pop('profile_token')), elapsed)
+    return response
+
+# Compress text bodies for clients that accept it, like api.py
+@routes.after_app_request
+async def compress_response(response):
+    static = request.endpoint == 'static'
+    if static and request.args.get('v'):
+        response.headers['Cache-Control'] = static_cache_control()
+    if response.mimetype not in COMPRESSIBLE_TYPES or not isinstance(response.response, (DataBody, FileBody)):
+        # Streamed bodies (e.g. the report preview) are sent as they are produced
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if not encoding or not should_compress(response.status_code, response.mimetype, response.content_length or 0,
+                                           response.headers):
+        return response
+
+    etag = response.headers.get('ETag')
+    data = await response.get_data()
+    body = compress_static(etag, data, encoding) if static else compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.headers['ETag'] = weak_etag(etag)
+    return response
+
+# Static URLs carry a hash of the file (?v=...), so a changed file gets a new URL
+@routes.app_url_defaults
+def version_static_urls(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_version(current_app.static_folder, values['filename'])
+        if version:
+            values['v'] = version
+
+# Stop collecting stages if the response never reached after_request
+@routes.teardown_app_request
+async def discard_profile(error=None):
+    if 'profile_token' in g:
+        finish_profile(g.pop('profile_token'))
+
+# Redirect endpoint
+@routes.route('/')
+async def tohome():
+    return redirect("/dashboard", code=302)
+
+# Error handler endpoint
+@routes.app_errorhandler(404)
+async def page_not_found(error):
+    return "<h1>404</h1><p>The resource could not be found.</p>", 404
+
+# Create feedback endpoint
+@routes.route('/feedbacks', methods=['POST'])
+async def create_feedback():
+    # Same as Flask's request.json: wrong content type is a 415, malformed JSON a 400
+    if not request.is_json:
+        abort(415)
+    data = await request.get_json()
+    if not is_valid_feedback_request(data):
+        FEEDBACK_OUTCOMES.inc(('invalid',))
+        return jsonify({'error': 'Invalid request data'}), 400
+    try:
+        idempotency_key = parse_idempotency_key(request.headers)
+    except ValueError as e:
+        FEEDBACK_OUTCOMES.inc(('invalid',))
+        return jsonify({'error': str(e)}), 400
+
+    feedback_data = {
+        'id': data['id'],
+        'feedback': data['feedback']
+    }
+    queue = wants_async_ingestion(get_ingestion_mode(), request.args)
+
+    # The id is reserved before any analysis, so duplicates and retries never reach the LLM
+    try:
+        body, status_code, headers = await asubmit_once(
+            feedback_data, idempotency_key, lambda: process_feedback(feedback_data, queue),
+            reserve_submission_async, finish_submission_async)
+    except Exception as e:
+        FEEDBACK_OUTCOMES.inc(('error',))
+        return jsonify({'error': str(e)}), 500
+    return jsonify(body), status_code, headers
+
+# Analyze (or queue) a reserved feedback submission; returns (body, status, headers)
+async def process_feedback(feedback_data, queue):
+    # Async mode: store the raw feedback and let the worker pool analyze it
+    if queue:
+        try:
+            if not await enqueue_feedback_async(feedback_data['id'], feedback_data['feedback']):
+                FEEDBACK_OUTCOMES.inc(('duplicate',))
+                return {'error': 'Feedback with this ID already exists'}, 409, {}
+            notify_ingestion_workers()
+        except Exception as e:
+            FEEDBACK_OUTCOMES.inc(('error',))
+            return {'error': str(e)}, 500, {}
+
+        FEEDBACK_OUTCOMES.inc(('queued',))
+
+        status_url = '/feedbacks/%s' % feedback_data['id']
+        return {'id': feedback_data['id'], 'status': 'PENDING', 'status_url': status_url}, 202, {'Location': status_url}
+
+    try:
+        is_valid, analysis_result = await analyze_feedback_async(feedback_data['feedback'], feedback_data['id'])
+        if is_valid:
+            feedback_data['sentiment'] = analysis_result['sentiment']
+            feedback_data['feature_code'] = analysis_result.get('feature_code')
+            feedback_data['feature_reason'] = analysis_result.get('feature_reason')
+            feedback_data.update(analysis_provenance())
+            # Clustering may query the database or an embeddings API; keep it off the event loop
+            with stage('clustering'):
+                feedback_data['feature_cluster_id'] = await asyncio.to_thread(
+                    assign_feature_cluster, feedback_data['feature_code'], feedback_data['feature_reason']
+                )
+
+            await insert_feedback_async(feedback_data)
+            FEEDBACK_OUTCOMES.inc(('created',))
+            return analysis_result, 201, {}
+        else:
+            FEEDBACK_OUTCOMES.inc(('spam',))
+            return {'error': 'Feedback is spam'}, 400, {}
+    except psycopg.IntegrityError:
+        FEEDBACK_OUTCOMES.inc(('duplicate',))
+        return {'error': 'Feedback with this ID already exists'}, 409, {}
+    except LLMUnavailable as e:
+        # Provider overloaded or rate limited even after retries: ask the client to come back
+        FEEDBACK_OUTCOMES.inc(('unavailable',))
+        return {'error': str(e)}, 503, retry_after_headers(e)
+    except Exception as e:
+        FEEDBACK_OUTCOMES.inc(('error',))
+        return {'error': str(e)}, 500, {}
+
+# List feedbacks endpoint (keyset pagination: pass next_cursor back as ?cursor=)
+@routes.route('/feedbacks', methods=['GET'])
+async def list_feedbacks():
+    try:
+        limit = page_limit(request.args)
+        filters = parse_feedback_filters(request.args)
+        feedbacks, next_cursor = await get_feedbacks_page_async(
+            limit=limit, cursor=request.args.get('cursor'), **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': [serialize_feedback(row) for row in feedbacks],
+        'next_cursor': next_cursor
+    }), 200
+
+# Search feedbacks endpoint: best matches first, with highlighted excerpts (?fuzzy=1 tolerates typos)
+@routes.route('/feedbacks/search', methods=['GET'])
+async def find_feedbacks():
+    try:
+        q, fuzzy = parse_search_query(request.args)
+        results = await search_feedbacks_async(q, limit=page_limit(request.args), fuzzy=fuzzy,
+                                               **parse_feedback_filters(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'items': [serialize_feedback(row) for row in results]}), 200
+
+# Bulk import endpoint (JSONL, CSV or a JSON array of {id, feedback} objects), streaming the JSONL
+# report like api.py. The importer batches through the blocking stack, so it advances in a worker thread.
+@routes.route('/feedbacks/bulk', methods=['POST'])
+async def bulk_import_feedbacks():
+    if request.is_json:
+        items = await request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({'error': 'Invalid request data'}), 400
+    else:
+        body = io.StringIO(await request.get_data(as_text=True), newline='')
+        items = read_feedback_items(body, detect_format(request.content_type))
+
+    lines = stream_report(BulkImporter().run(items))
+
+    async def body():
+        while (line := await asyncio.to_thread(next, lines, None)) is not None:
+            yield line
+
+    return body(), 200, {'Content-Type': 'application/x-ndjson'}
+
+# Feedback analysis status endpoint
+@routes.route('/feedbacks/<feedback_id>', methods=['GET'])
+async def get_feedback(feedback_id):
+    feedback_status = await get_feedback_status_async(feedback_id)
+    if feedback_status is None:
+        return jsonify({'error': 'Feedback not found'}), 404
+    return jsonify(feedback_status), 200
+
+# Health check endpoint
+@routes.route('/health', methods=['GET'])
+async def health_check():
+    return jsonify({'status': 'ok'}), 200
+
+# Runtime statistics endpoint
+@routes.route('/stats', methods=['GET'])
+async def runtime_stats():
+    # Off the event loop: the pre-filter loads its training data from the database on first use
+    return jsonify(await asyncio.to_thread(collect_runtime_stats)), 200
+
+def collect_runtime_stats():
+    return {
+        'db_pool': peek_pool_stats(),
+        'async_db_pool': get_async_pool_stats(),
+        'llm_cache': get_cache_stats(),
+        'spam_prefilter': get_prefilter_stats(),
+        'llm_gateway': get_gateway_stats(),
+        'dashboard_cache': dashboard_cache.stats()
+    }
+
+# Prometheus metrics endpoint; the gauges are read in a worker thread, like /stats
+@routes.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    body = await asyncio.to_thread(render_prometheus, get_gateway().metrics())
+    return body, 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+# Render the dashboard data as compact JSON; its four queries run concurrently on separate connections
+async def render_dashboard_data(bucket=None, days=None):
+    if bucket is None or days is None:
+        bucket, days = parse_timeline_params({})
+    buckets = timeline_buckets(date.today(), days, bucket)
+
+    total_feedbacks, sentiment_data, top_features, timeline = await asyncio.gather(
+        get_total_feedback_count_async(),
+        get_sentiment_data_async(),
+        get_top_requested_features_async(),
+        get_feedback_timeline_async(bucket, buckets[0])
+    )
+    with stage('render'):
+        payload = dashboard_payload(total_feedbacks, sentiment_data, top_features, timeline, bucket, buckets)
+        return json.dumps(payload, separators=(',', ':'))
+
+# Dashboard endpoint: a static shell; its figures and table are fetched by the page
+@routes.route('/dashboard', methods=['GET'])
+async def dashboard():
+    response = await make_response(await render_template("dashboard.html"))
+    await response.add_etag()
+    # Let browsers keep the page but revalidate it on every load (answered with 304 when unchanged)
+    response.headers['Cache-Control'] = 'no-cache'
+    return await response.make_conditional(request)
+
+# Dashboard data endpoint (?bucket=day|week|month&days=N for the timeline)
+@routes.route('/dashboard/data', methods=['GET'])
+async def dashboard_data():
+    try:
+        timeline = parse_timeline_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The default view is cached; other timelines are cheap reads of the daily counters
+    if timeline == parse_timeline_params({}):
+        body, etag = await dashboard_cache.aget(render_dashboard_data)
+    else:
+        body = await render_dashboard_data(*timeline)
+        etag = dashboard_cache.make_etag(body)
+
+    response = await make_response(body)
+    response.mimetype = 'application/json'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return await response.make_conditional(request)
+
+# Weekly report preview (?start=YYYY-MM-DD), streamed like in api.py
+@routes.route('/reports/weekly', methods=['GET'])
+async def weekly_report_preview():
+    try:
+        start, end = parse_report_period(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # The report code (and its LLM client) is loaded on the first preview
+    from src.reporting.report import stream_weekly_report
+    chunks = await asyncio.to_thread(stream_weekly_report, start, end)
+
+    # Rendering queries the database and may call the LLM, so each chunk is produced in a worker thread
+    async def body():
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
+
+    return body(), 200, {'Content-Type': 'text/html; charset=utf-8'}
+
+# Graphical feedback endpoint
+@routes.route('/submit', methods=['GET'])
+async def submit_feedback_page():
+    return await render_template("submit_feedback.html")
+
+# Application factory (e.g. hypercorn "asgi:create_app()"); the schema is checked on the first
+# request and LangChain/OpenAI are imported by the first LLM call
+def create_app():
+    app = cors(Quart(__name__), allow_origin='*')
+    app.register_blueprint(routes)
+    return app
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,92 @@
+"""Per-request overhead of building LLM clients vs. reusing them from the registry.
+
+Runs spam_filter-style calls against a local fake OpenAI server, first the old way
+(new PromptTemplate + new ChatOpenAI per call) and then through src.utils.llm.get_llm
+with the module-level prompt. Prints a JSON summary.
+
+    python -m benchmarks.bench_llm_clients --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+from benchmarks.fake_openai import FakeOpenAIServer
+
+FEEDBACK = "Gosto muito do app, mas queria mais meditações guiadas para dormir."
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, connections):
+    return {
+        'requests': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'tcp_connections': connections
+    }
+
+
+def fresh_client_call(template_text):
+    prompt = PromptTemplate(template=template_text, input_variables=["feedback"])
+    llm = ChatOpenAI(model=os.environ['OPENAI_MODEL'], api_key=os.environ['OPENAI_API_KEY'],
+                     base_url=os.environ['OPENAI_BASE_URL'])
+    return llm.invoke(prompt.format(feedback=FEEDBACK)).content
+
+
+def registry_call():
+    from src.analysis.analysis import SPAM_PROMPT
+    from src.utils.llm import get_llm
+    return get_llm().invoke(SPAM_PROMPT.format(feedback=FEEDBACK)).content
+
+
+def run(label, server, call, requests, warmup):
+    for _ in range(warmup):
+        call()
+    connections_before = server.connections
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return label, summarize(samples, server.connections - connections_before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated LLM latency, in seconds')
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+        os.environ.setdefault('OPENAI_MODEL', 'gpt-3.5-turbo-0125')
+
+        from src.analysis.analysis import SPAM_PROMPT
+        results = dict([
+            run('fresh_client_per_request', server, lambda: fresh_client_call(SPAM_PROMPT.template),
+                args.requests, args.warmup),
+            run('client_registry', server, registry_call, args.requests, args.warmup),
+        ])
+
+    before, after = results['fresh_client_per_request'], results['client_registry']
+    results['overhead_saved_ms_per_request'] = round(before['mean_ms'] - after['mean_ms'], 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
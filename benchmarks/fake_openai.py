@@ -0,0 +1,159 @@
+"""Minimal OpenAI-compatible chat completions server for benchmarks and tests.
+
+Answers ``POST /v1/chat/completions`` (and ``/chat/completions``) over HTTP/1.1
+keep-alive with a canned response. Latency and error injection are configurable
+so client-side behaviour (connection reuse, retries, timeouts) can be measured
+without touching the real API.
+"""
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Default reply: a valid tool call when the request asks for structured output,
+# otherwise a plain "Y" (the answer spam_filter expects for valid feedback).
+def default_responder(body):
+    if body.get('tools'):
+        tool = body['tools'][0]['function']['name']
+        arguments = {
+            'is_spam': False,
+            'sentiment': 'POSITIVO',
+            'feature_code': 'MEDITACAO GUIADA',
+            'feature_reason': 'O usuário quer mais meditações guiadas'
+        }
+        return {
+            'role': 'assistant',
+            'content': None,
+            'tool_calls': [{
+                'id': 'call_' + uuid.uuid4().hex[:12],
+                'type': 'function',
+                'function': {'name': tool, 'arguments': json.dumps(arguments)}
+            }]
+        }
+    return {'role': 'assistant', 'content': 'Y'}
+
+
+class FakeOpenAIServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=429, fail_first=0, responder=default_responder):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # The first `fail_first` requests fail deterministically (for retry tests)
+        self.fail_first = fail_first
+        self.responder = responder
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d/v1' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                with fake._lock:
+                    fake.requests += 1
+                    forced_failure = fake.requests <= fake.fail_first
+
+                delay = fake.latency + (random.uniform(0, fake.jitter) if fake.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._send(404, {'error': {'message': 'Not found'}})
+                if forced_failure or (fake.error_rate and random.random() < fake.error_rate):
+                    return self._send(fake.error_status, {
+                        'error': {'message': 'Injected error', 'type': 'fake_error', 'code': fake.error_status}
+                    })
+
+                message = fake.responder(body)
+                prompt_tokens = sum(len(str(m.get('content') or '')) for m in body.get('messages', [])) // 4
+                completion_tokens = len(json.dumps(message)) // 4
+                self._send(200, {
+                    'id': 'chatcmpl-' + uuid.uuid4().hex,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake-model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': message,
+                        'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a fake OpenAI-compatible server')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', type=float, default=0.0, help='fixed delay per request, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=429)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, error_status=args.error_status)
+    print('Fake OpenAI server listening on %s' % server.base_url)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
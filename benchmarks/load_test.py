@@ -0,0 +1,402 @@
+"""End-to-end load test: the Flask app against a fake LLM and a seeded PostgreSQL.
+
+Starts a fake OpenAI-compatible server (with optional latency and error injection),
+a PostgreSQL database, and the API in a child process. For each seeded data size it
+drives POST /feedbacks, GET /dashboard/data, GET /feedbacks/search and weekly report generation at each
+concurrency level, then prints latency percentiles and throughput as JSON (also
+written to --output, with the git commit, so runs can be compared).
+
+    python -m benchmarks.load_test --rows 1000 100000 --concurrency 1 8 --requests 300
+    python -m benchmarks.load_test --postgres local --llm-latency 0.3 --output after.json --baseline before.json
+
+Postgres comes from --postgres:
+  env       an existing server configured with the DB_* variables (the default)
+  local     a throwaway cluster created with initdb/pg_ctl (from PATH or --pg-bin)
+  pgserver  a throwaway cluster from the optional `pgserver` pip package
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_llm_clients import percentile
+from benchmarks.fake_openai import FakeOpenAIServer
+
+SCENARIOS = ('post_feedback', 'dashboard', 'search', 'report')
+
+# Seed rows in the style of sql_scripts/populate.sql: (feedback, sentiment, feature_code, feature_reason)
+SAMPLES = (
+    ('Estou adorando o aplicativo! As meditações guiadas me ajudam a dormir melhor.',
+     'POSITIVO', 'MAIS_MEDITACOES', 'Usuário solicita mais opções de meditações para dormir'),
+    ('Tem um botão fantasma aparecendo na tela inicial que some quando tento clicar.',
+     'NEGATIVO', 'CORRIGIR_UI', 'Botão fantasma aparecendo e desaparecendo na interface'),
+    ('O app trava durante as sessões de meditação e perco todo o progresso.',
+     'NEGATIVO', 'ESTABILIDADE', 'App trava durante as sessões de meditação'),
+    ('Seria interessante ter uma opção para compartilhar o progresso com amigos.',
+     'POSITIVO', 'COMPARTILHAR', 'Adicionar função para compartilhar progresso com amigos'),
+    ('As sessões de terapia online são práticas. Sugiro lembretes personalizados.',
+     'POSITIVO', 'LEMBRETES', 'Implementar sistema de lembretes para sessões'),
+    ('Uso todos os dias. Seria legal ter mais vozes diferentes nas meditações.',
+     'POSITIVO', 'NOVAS_VOZES', 'Mais opções de vozes para as meditações guiadas'),
+    ('Não sei se o app ajuda ou não, ainda estou testando.',
+     'INCONCLUSIVO', None, None),
+    ('O modo escuro deixaria o app bem mais confortável à noite.',
+     'POSITIVO', 'MODO_ESCURO', 'Adicionar tema escuro ao aplicativo'),
+)
+
+SEED_BATCH = 100000
+
+# Search terms from common (every sample mentioning meditation) to rare (one sample) matches
+SEARCH_TERMS = ('meditação', 'botão fantasma', '"modo escuro"', 'lembretes', 'progresso amigos')
+
+
+# Throwaway PostgreSQL cluster: `initdb` + `pg_ctl` on a private Unix socket directory
+class LocalPostgres:
+    def __init__(self, bin_dir=None, dbname='alumind_bench'):
+        self.bin_dir = bin_dir or os.getenv('PG_BIN') or self._find_bin_dir()
+        self.dbname = dbname
+        self.datadir = None
+        self.port = None
+
+    @staticmethod
+    def _find_bin_dir():
+        pg_ctl = shutil.which('pg_ctl')
+        if pg_ctl:
+            return os.path.dirname(pg_ctl)
+        try:
+            return subprocess.check_output(['pg_config', '--bindir'], text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            raise SystemExit("initdb/pg_ctl not found: pass --pg-bin, or use --postgres env / pgserver")
+
+    def _run(self, *args):
+        subprocess.run([os.path.join(self.bin_dir, args[0])] + list(args[1:]), check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def start(self):
+        self.datadir = tempfile.mkdtemp(prefix='alumind-bench-pg-')
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self._run('initdb', '-D', self.datadir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8', '--no-sync')
+        # Durability is irrelevant for a benchmark database; keep it off the disk's critical path
+        options = "-k %s -p %d -c listen_addresses='' -c fsync=off -c synchronous_commit=off" % (self.datadir, self.port)
+        self._run('pg_ctl', '-D', self.datadir, '-o', options, '-l', os.path.join(self.datadir, 'server.log'), '-w', 'start')
+        self._run('createdb', '-h', self.datadir, '-p', str(self.port), '-U', 'postgres', self.dbname)
+        return {'DB_HOST': self.datadir, 'DB_PORT': str(self.port), 'DB_USER': 'postgres',
+                'DB_PASSWORD': '', 'DB_NAME': self.dbname}
+
+    def stop(self):
+        if self.datadir:
+            self._run('pg_ctl', '-D', self.datadir, '-m', 'fast', 'stop')
+            shutil.rmtree(self.datadir, ignore_errors=True)
+
+
+# Same, through the optional `pgserver` package (bundles the binaries and runs as non-root)
+class PgServerPostgres:
+    def __init__(self, dbname='alumind_bench'):
+        self.dbname = dbname
+        self.datadir = None
+        self._server = None
+
+    def start(self):
+        try:
+            import pgserver
+        except ImportError:
+            raise SystemExit("--postgres pgserver needs `pip install pgserver`")
+        self.datadir = tempfile.mkdtemp(prefix='alumind-bench-pg-')
+        self._server = pgserver.get_server(self.datadir, cleanup_mode='stop')
+        self._server.psql('CREATE DATABASE %s;' % self.dbname)
+        return {'DB_HOST': self.datadir, 'DB_PORT': '5432', 'DB_USER': 'postgres',
+                'DB_PASSWORD': '', 'DB_NAME': self.dbname}
+
+    def stop(self):
+        if self._server is not None:
+            self._server.cleanup()
+            shutil.rmtree(self.datadir, ignore_errors=True)
+
+
+class ExistingPostgres:
+    def start(self):
+        return {}
+
+    def stop(self):
+        pass
+
+POSTGRES = {
+    'env': lambda args: ExistingPostgres(),
+    'local': lambda args: LocalPostgres(args.pg_bin),
+    'pgserver': lambda args: PgServerPostgres(),
+}
+
+
+# Bring the feedbacks table up to `rows` generated rows spread over the last `days` days.
+# Rows are generated inside PostgreSQL, so a million of them take seconds, not minutes.
+def seed_feedbacks(rows, days=90):
+    from src.database.database import get_connection
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM feedbacks WHERE id LIKE 'seed-%'")
+        existing = cur.fetchone()[0]
+
+    columns = [list(column) for column in zip(*SAMPLES)]
+    for start in range(existing, rows, SEED_BATCH):
+        end = min(rows, start + SEED_BATCH)
+        with get_connection() as conn:
+            cur = conn.cursor()
+            # Seeded per batch, so every run generates the same data
+            cur.execute("SELECT setseed(%s)", ((start // SEED_BATCH) % 1000 / 1000.0,))
+            cur.execute("""
+                INSERT INTO feedbacks (id, feedback, sentiment, feature_code, feature_reason, created_at)
+                SELECT 'seed-' || i, (%(texts)s::text[])[k] || ' #' || i, (%(sentiments)s::text[])[k],
+                       (%(codes)s::text[])[k], (%(reasons)s::text[])[k],
+                       NOW() - random() * (%(days)s * INTERVAL '1 day')
+                FROM (
+                    SELECT i, 1 + floor(random() * %(samples)s)::int AS k
+                    FROM generate_series(%(start)s, %(end)s - 1) AS i
+                ) AS generated
+                ON CONFLICT DO NOTHING
+            """, {'texts': columns[0], 'sentiments': columns[1], 'codes': columns[2], 'reasons': columns[3],
+                  'days': days, 'samples': len(SAMPLES), 'start': start, 'end': end})
+        print('  seeded %d/%d rows' % (end, rows), file=sys.stderr)
+
+    with get_connection() as conn:
+        conn.cursor().execute("ANALYZE feedbacks")
+
+
+def summarize(samples, statuses, elapsed):
+    return {
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if not str(status).startswith('2')),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else None,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3) if samples else None,
+        'p95_ms': round(percentile(samples, 95) * 1000, 3) if samples else None,
+        'p99_ms': round(percentile(samples, 99) * 1000, 3) if samples else None,
+    }
+
+
+# Run `call(connection, i)` for i in [0, requests) from `concurrency` threads, each with
+# its own keep-alive connection; `call` returns a status code
+def drive(port, call, requests, concurrency, warmup=0):
+    for i in range(warmup):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        call(connection, -1 - i)
+        connection.close()
+
+    counter = itertools.count()
+    samples, statuses, lock = [], {}, threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        while True:
+            i = next(counter)
+            if i >= requests:
+                break
+            start = time.perf_counter()
+            try:
+                status = call(connection, i)
+            except Exception as e:
+                status = type(e).__name__
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, statuses, time.perf_counter() - start)
+
+
+def http_request(connection, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def post_feedback_call(run_id):
+    def call(connection, i):
+        text, *_ = SAMPLES[i % len(SAMPLES)]
+        # Unique text per request, so the LLM result cache does not hide the analysis cost
+        return http_request(connection, 'POST', '/feedbacks',
+                            {'id': 'bench-%s-%d' % (run_id, i), 'feedback': '%s (%s-%d)' % (text, run_id, i)})
+    return call
+
+# The dashboard page is a static shell; its figures come from /dashboard/data
+def dashboard_call(connection, i):
+    return http_request(connection, 'GET', '/dashboard/data')
+
+def search_call(connection, i):
+    query = urllib.parse.urlencode({'q': SEARCH_TERMS[i % len(SEARCH_TERMS)]})
+    return http_request(connection, 'GET', '/feedbacks/search?' + query)
+
+# Report generation is not an endpoint; it runs in this process against the same database
+def report_call(connection, i):
+    from src.reporting.report import generate_weekly_report
+    generate_weekly_report()
+    return 200
+
+
+# Start the API (see serve()) in a child process and return (process, port)
+def start_api(env):
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.load_test', '--serve'], env=env,
+                               cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('listening '):
+        process.kill()
+        raise SystemExit("API failed to start")
+    return process, int(line.split()[1])
+
+# Child process: the Flask app on a threaded HTTP/1.1 (keep-alive) server, on a free port
+def serve():
+    import logging
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from api import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print('listening %d' % server.server_port, flush=True)
+    server.serve_forever()
+
+
+# Percent change of each result's p95 and throughput against a previous run's JSON
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['rows'], r['scenario'], r['concurrency']): r for r in json.load(f)['results']}
+    changes = []
+    for result in results:
+        before = baseline.get((result['rows'], result['scenario'], result['concurrency']))
+        if not before:
+            continue
+        change = {'rows': result['rows'], 'scenario': result['scenario'], 'concurrency': result['concurrency']}
+        for metric in ('p95_ms', 'throughput_rps'):
+            if before.get(metric) and result.get(metric) is not None:
+                change['%s_change_pct' % metric] = round((result[metric] - before[metric]) * 100.0 / before[metric], 1)
+        changes.append(change)
+    return changes
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000], help='seeded data sizes, ascending')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and concurrency level')
+    parser.add_argument('--report-requests', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--days', type=int, default=90, help='spread of the seeded created_at values')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='fake LLM delay per request, in seconds')
+    parser.add_argument('--llm-jitter', type=float, default=0.0)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-error-status', type=int, default=429)
+    parser.add_argument('--dashboard-cache-ttl', type=float, default=0.0,
+                        help='0 measures every dashboard render; >0 measures the cached path')
+    parser.add_argument('--postgres', choices=sorted(POSTGRES), default='env')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl for --postgres local')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON from a previous run to compare against')
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve()
+
+    postgres = POSTGRES[args.postgres](args)
+    llm = FakeOpenAIServer(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                           error_status=args.llm_error_status).start()
+    api = None
+    try:
+        os.environ.update(postgres.start())
+        os.environ.update({
+            'OPENAI_BASE_URL': llm.base_url,
+            'DASHBOARD_CACHE_TTL': str(args.dashboard_cache_ttl),
+            'INGESTION_MODE': 'sync',
+        })
+        os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+        os.environ.setdefault('OPENAI_MODEL', 'gpt-4o-mini')
+        # Measure the app, not the production rate limits
+        os.environ.setdefault('LLM_REQUESTS_PER_MINUTE', '1000000')
+        os.environ.setdefault('LLM_TOKENS_PER_MINUTE', '1000000000')
+
+        from src.database.database import init_db
+        init_db()
+        api, port = start_api(dict(os.environ))
+
+        run_id = uuid.uuid4().hex[:8]
+        results = []
+        for rows in sorted(args.rows):
+            print('seeding %d rows' % rows, file=sys.stderr)
+            seed_feedbacks(rows, args.days)
+            for scenario in args.scenarios:
+                requests = args.report_requests if scenario == 'report' else args.requests
+                warmup = 1 if scenario == 'report' else args.warmup
+                for concurrency in args.concurrency:
+                    print('%s rows=%d concurrency=%d' % (scenario, rows, concurrency), file=sys.stderr)
+                    call = {'post_feedback': post_feedback_call('%s-%d-%d' % (run_id, rows, concurrency)),
+                            'dashboard': dashboard_call, 'search': search_call,
+                            'report': report_call}[scenario]
+                    result = drive(port, call, requests, concurrency, warmup)
+                    results.append(dict(rows=rows, scenario=scenario, concurrency=concurrency, **result))
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        llm.stop()
+        from src.database.database import close_pool
+        close_pool()
+        postgres.stop()
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('serve', 'output', 'baseline', 'pg_bin')},
+        'llm_requests': llm.requests,
+        'results': results,
+    }
+    if args.baseline:
+        output['comparison'] = compare(results, args.baseline)
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Startup cost: import time, loaded modules and RSS of the app and CLI entry points.
+
+Each entry point is imported in a fresh interpreter (--repeat times, after --warmup runs),
+timing the import and reading the peak RSS; one more run under `python -X importtime`
+gives the self time per top-level package. Heavy modules that should only load on first
+use (LangChain/OpenAI, smtplib) are listed when an import pulls them in. Prints JSON (also
+written to --output, with the git commit, so runs can be compared).
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --modules api asgi --repeat 10 --output after.json --baseline before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.load_test import git_commit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = ('api', 'asgi', 'src.reporting.scheduler', 'src.analysis.reanalysis', 'src.database.migrations')
+
+# Deferred to their first use; importing an entry point should not load them
+HEAVY_MODULES = ('langchain_core', 'langchain_openai', 'openai', 'smtplib', 'src.reporting.report')
+
+# Runs in the child: import the module, then report the import time, peak RSS (kB) and loaded modules.
+# VmHWM starts over at exec; ru_maxrss (the fallback off Linux) keeps the parent's peak from before it.
+CHILD = '''
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+try:
+    with open('/proc/self/status') as f:
+        max_rss = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss = max_rss // 1024 if sys.platform == 'darwin' else max_rss
+print(json.dumps({
+    'import_ms': elapsed * 1000,
+    'max_rss_kb': max_rss,
+    'modules': len(sys.modules),
+    'heavy_loaded': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+'''
+
+
+def child_env():
+    # No ingestion workers: importing api must not start threads that poll the database
+    return dict(os.environ, INGESTION_MODE='sync', PYTHONPATH=ROOT)
+
+
+def run_child(module, importtime=False):
+    flags = ['-X', 'importtime'] if importtime else []
+    result = subprocess.run([sys.executable, *flags, '-c', CHILD, module, *HEAVY_MODULES], cwd=ROOT,
+                            env=child_env(), capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError('importing %s failed:\n%s' % (module, result.stderr[-2000:]))
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+# Self time per top-level package from `-X importtime` output, largest first
+def package_times(importtime_output, top):
+    packages = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        package = packages.setdefault(name.strip().split('.')[0], {'self_ms': 0.0, 'modules': 0})
+        package['self_ms'] += int(self_us) / 1000.0
+        package['modules'] += 1
+    ordered = sorted(packages.items(), key=lambda item: -item[1]['self_ms'])
+    return {
+        'total_ms': round(sum(package['self_ms'] for package in packages.values()), 1),
+        'top_packages': [{'package': name, 'self_ms': round(package['self_ms'], 1), 'modules': package['modules']}
+                         for name, package in ordered[:top]],
+    }
+
+
+def measure(module, repeat, warmup, top):
+    for _ in range(warmup):
+        run_child(module)
+    samples = [run_child(module)[0] for _ in range(repeat)]
+    _, importtime_output = run_child(module, importtime=True)
+    times = [sample['import_ms'] for sample in samples]
+    return {
+        'module': module,
+        'import_ms': round(statistics.median(times), 1),
+        'import_ms_min': round(min(times), 1),
+        'max_rss_mb': round(statistics.median(sample['max_rss_kb'] for sample in samples) / 1024.0, 1),
+        'modules_loaded': samples[-1]['modules'],
+        'heavy_loaded': samples[-1]['heavy_loaded'],
+        'importtime': package_times(importtime_output, top),
+    }
+
+
+# Percent change of each module's import time and RSS against a previous run's JSON
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['module']: r for r in json.load(f)['results']}
+    changes = []
+    for result in results:
+        before = baseline.get(result['module'])
+        if not before:
+            continue
+        change = {'module': result['module']}
+        for metric in ('import_ms', 'max_rss_mb'):
+            if before.get(metric):
+                change['%s_change_pct' % metric] = round((result[metric] - before[metric]) * 100.0 / before[metric], 1)
+        changes.append(change)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', nargs='+', default=list(MODULES), help='entry points to import')
+    parser.add_argument('--repeat', type=int, default=5, help='timed imports per module (the median is reported)')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed imports first (fills the OS file cache)')
+    parser.add_argument('--top', type=int, default=10, help='packages listed in the importtime breakdown')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON from a previous run to compare against')
+    args = parser.parse_args()
+
+    results = [measure(module, args.repeat, args.warmup, args.top) for module in args.modules]
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'results': results,
+    }
+    if args.baseline:
+        output['comparison'] = compare(results, args.baseline)
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
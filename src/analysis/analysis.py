@@ -1,70 +1,313 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+import asyncio
 import json
-from src.utils.config import get_openai_key, get_openai_model
+from src.analysis.cache import cached_llm_call, acached_llm_call, get_cached_result, store_cached_result, prompt_version
+from src.analysis.prefilter import SPAM, VALID, check_spam_locally, record_llm_label, note_llm_call_avoided
+from src.utils.config import get_analysis_mode, get_openai_model
+from src.utils.gateway import invoke_llm, ainvoke_llm
+from src.utils.llm import PromptTemplate, get_llm, get_structured_llm
+from src.utils.metrics import stage
 
-# Function to analyze feedback using LangChain
-def analyze_feedback_langchain(feedback, id):
-    prompt_template = """
-    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental, 
+# Schema for the single-call analysis (spam verdict + sentiment + feature request)
+class FeedbackAnalysis(BaseModel):
+    is_spam: bool = Field(description="true se o feedback for spam, irrelevante ou inválido")
+    sentiment: Optional[Literal["POSITIVO", "NEGATIVO", "INCONCLUSIVO"]] = Field(
+        default=None, description="Sentimento do feedback; null quando for spam")
+    feature_code: Optional[str] = Field(
+        default=None, description="Código de até duas palavras em letras maiúsculas, ou null")
+    feature_reason: Optional[str] = Field(
+        default=None, description="Frase curta explicando o que o cliente deseja, ou null")
+
+# Schema for analyzing several feedbacks in one call
+class FeedbackBatchItem(FeedbackAnalysis):
+    index: int = Field(description="Número do feedback na lista recebida")
+
+class FeedbackBatchAnalysis(BaseModel):
+    results: List[FeedbackBatchItem]
+
+# Prompts are compiled once at import and shared by every request
+ANALYSIS_PROMPT = PromptTemplate(
+    template="""
+    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental,
     proporcionando aos usuários acesso a meditações guiadas, sessões de terapia, e conteúdos educativos sobre saúde mental.
 
     Você é um especialista em análise de feedback da AluMind e deve analisar o feedback do usuário e retornar a funcionalidade mais importante que o usuário está solicitando.
 
     Analise o seguinte feedback do aplicativo AluMind: "{feedback}"
-    
+
     Identifique o sentimento como "POSITIVO", "NEGATIVO" ou "INCONCLUSIVO" (quando não for possível determinar claramente) e extraia a funcionalidade mais importante solicitada (caso exista).
     "feature_code" consiste em um código de até duas palavras escrito em letras maiusculas, que representa o que o cliente mais deseja.
     "feature_reason" consiste em uma frase curta e direta explicando o que o cliente deseja no código associado.
-    
+
     Retorne a resposta no seguinte formato JSON:
-    
+
     {{
       "id": "{id}",
       "sentiment": "<POSITIVO, NEGATIVO ou INCONCLUSIVO>",
       "feature_code": "<Código ou null se não houver solicitação>",
       "feature_reason": "<Motivo ou null se não houver solicitação>"
     }}
-    """
-    prompt = PromptTemplate(template=prompt_template, input_variables=["feedback", "id"])
-    
-    llm = ChatOpenAI(
-        model=get_openai_model(),
-        api_key=get_openai_key()
-    )
-    
-    formatted_prompt = prompt.format(feedback=feedback, id=id)
-    chain_result = llm.invoke(formatted_prompt)
-    
+    """,
+    input_variables=["feedback", "id"]
+)
+
+SPAM_PROMPT = PromptTemplate(
+    template="""
+    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental,
+    proporcionando aos usuários acesso a meditações guiadas, sessões de terapia, e conteúdos educativos sobre saúde mental.
+
+    Você é um assistente de análise de feedbacks da AluMind. Sua tarefa é avaliar o seguinte feedback de usuário e determinar se ele é válido, ou seja, se é coerente, construtivo e relevante.
+
+    Se o feedback for válido, responda apenas com a letra "Y".
+    Se o feedback for considerado spam, irrelevante ou inválido, responda apenas com a letra "N".
+
+    Feedback: "{feedback}"
+    """,
+    input_variables=["feedback"]
+)
+
+COMBINED_PROMPT = PromptTemplate(
+    template="""
+    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental,
+    proporcionando aos usuários acesso a meditações guiadas, sessões de terapia, e conteúdos educativos sobre saúde mental.
+
+    Você é um especialista em análise de feedback da AluMind. Analise o seguinte feedback do aplicativo AluMind: "{feedback}"
+
+    1. Determine se o feedback é spam, irrelevante ou inválido ("is_spam": true) ou se é coerente, construtivo e relevante ("is_spam": false).
+    2. Se não for spam, identifique o sentimento como "POSITIVO", "NEGATIVO" ou "INCONCLUSIVO" (quando não for possível determinar claramente).
+    3. Se não for spam, extraia a funcionalidade mais importante solicitada (caso exista).
+    "feature_code" consiste em um código de até duas palavras escrito em letras maiusculas, que representa o que o cliente mais deseja.
+    "feature_reason" consiste em uma frase curta e direta explicando o que o cliente deseja no código associado.
+    Use null para os campos que não se aplicam.
+    """,
+    input_variables=["feedback"]
+)
+
+BATCH_PROMPT = PromptTemplate(
+    template="""
+    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental,
+    proporcionando aos usuários acesso a meditações guiadas, sessões de terapia, e conteúdos educativos sobre saúde mental.
+
+    Você é um especialista em análise de feedback da AluMind. Analise CADA um dos feedbacks numerados abaixo de forma independente:
+
+    {feedbacks}
+
+    Para cada feedback, retorne um item em "results" com o mesmo "index" do feedback e:
+    1. "is_spam": true se o feedback for spam, irrelevante ou inválido; false se for coerente, construtivo e relevante.
+    2. Se não for spam, "sentiment" como "POSITIVO", "NEGATIVO" ou "INCONCLUSIVO" (quando não for possível determinar claramente).
+    3. Se não for spam, a funcionalidade mais importante solicitada (caso exista).
+    "feature_code" consiste em um código de até duas palavras escrito em letras maiusculas, que representa o que o cliente mais deseja.
+    "feature_reason" consiste em uma frase curta e direta explicando o que o cliente deseja no código associado.
+    Use null para os campos que não se aplicam.
+    """,
+    input_variables=["feedbacks"]
+)
+
+# Cache versions; any edit to a prompt (or the output schema) invalidates its cached results
+ANALYSIS_PROMPT_VERSION = prompt_version(ANALYSIS_PROMPT.template)
+SPAM_PROMPT_VERSION = prompt_version(SPAM_PROMPT.template)
+# The single and batch prompts produce the same labels, so they share one cache version
+COMBINED_PROMPT_VERSION = prompt_version(COMBINED_PROMPT.template, BATCH_PROMPT.template,
+                                         json.dumps(FeedbackAnalysis.model_json_schema(), sort_keys=True))
+
+# Model and prompt version stamped on stored labels; the re-analysis job skips feedbacks whose
+# stamp matches the current ones
+def analysis_provenance(mode=None):
+    mode = mode or get_analysis_mode()
+    version = ANALYSIS_PROMPT_VERSION if mode == 'two_call' else COMBINED_PROMPT_VERSION
+    return {'analysis_model': get_openai_model(), 'analysis_prompt_version': version}
+
+# The prompt echoes the id back, so it is run with a neutral one and the result kept id-free
+def _analysis_prompt(feedback):
+    return ANALYSIS_PROMPT.format(feedback=feedback, id="")
+
+def _parse_analysis(message):
     # Extract content from AIMessage before parsing JSON
-    result = json.loads(chain_result.content)
+    result = json.loads(message.content)
+    result.pop('id', None)
     return result
 
+def _parse_spam_verdict(message):
+    # Extract the content from the AIMessage object
+    return {'valid': message.content.strip().upper() == "Y"}
+
+# The structured output is validated against FeedbackAnalysis by the parser
+def _check_combined(analysis):
+    if not analysis.is_spam and analysis.sentiment is None:
+        raise ValueError("LLM analysis is missing the sentiment for a valid feedback")
+    return analysis.model_dump()
+
+def _combined_result(id, result):
+    return {
+        'id': id,
+        'is_spam': result['is_spam'],
+        'sentiment': result['sentiment'],
+        'feature_code': result['feature_code'],
+        'feature_reason': result['feature_reason']
+    }
+
+# Function to analyze feedback using LangChain
+def analyze_feedback_langchain(feedback, id):
+    def analyze():
+        return _parse_analysis(invoke_llm('analysis', get_llm(), _analysis_prompt(feedback)))
+
+    result = dict(cached_llm_call('analysis', feedback, ANALYSIS_PROMPT_VERSION, analyze))
+    return {'id': id, **result}
+
 # Function to filter spam feedback
 def spam_filter(feedback: str) -> bool:
-    prompt_template = """
-    A AluMind é uma startup que oferece um aplicativo focado em bem-estar e saúde mental, 
-    proporcionando aos usuários acesso a meditações guiadas, sessões de terapia, e conteúdos educativos sobre saúde mental.
+    def classify():
+        return _parse_spam_verdict(invoke_llm('spam', get_llm(), SPAM_PROMPT.format(feedback=feedback)))
 
-    Você é um assistente de análise de feedbacks da AluMind. Sua tarefa é avaliar o seguinte feedback de usuário e determinar se ele é válido, ou seja, se é coerente, construtivo e relevante. 
-    
-    Se o feedback for válido, responda apenas com a letra "Y". 
-    Se o feedback for considerado spam, irrelevante ou inválido, responda apenas com a letra "N".
-    
-    Feedback: "{feedback}"
-    """
-    prompt = PromptTemplate(template=prompt_template, input_variables=["feedback"])
-    
-    llm = ChatOpenAI(
-        model=get_openai_model(),
-        api_key=get_openai_key()
+    return cached_llm_call('spam', feedback, SPAM_PROMPT_VERSION, classify)['valid']
+
+def _analyze_combined(feedback):
+    llm = get_structured_llm(FeedbackAnalysis, include_raw=True)
+    return _check_combined(invoke_llm('combined', llm, COMBINED_PROMPT.format(feedback=feedback)))
+
+# Function to validate and analyze feedback in a single structured-output call
+def analyze_feedback_combined(feedback, id):
+    return _combined_result(id, cached_llm_call('combined', feedback, COMBINED_PROMPT_VERSION,
+                                                lambda: _analyze_combined(feedback)))
+
+# Async variants of the three calls above, for the ASGI app (same prompts, cache and gateway)
+async def analyze_feedback_langchain_async(feedback, id):
+    async def analyze():
+        return _parse_analysis(await ainvoke_llm('analysis', get_llm(), _analysis_prompt(feedback)))
+
+    result = dict(await acached_llm_call('analysis', feedback, ANALYSIS_PROMPT_VERSION, analyze))
+    return {'id': id, **result}
+
+async def spam_filter_async(feedback: str) -> bool:
+    async def classify():
+        return _parse_spam_verdict(await ainvoke_llm('spam', get_llm(), SPAM_PROMPT.format(feedback=feedback)))
+
+    return (await acached_llm_call('spam', feedback, SPAM_PROMPT_VERSION, classify))['valid']
+
+async def analyze_feedback_combined_async(feedback, id):
+    async def analyze():
+        llm = get_structured_llm(FeedbackAnalysis, include_raw=True)
+        return _check_combined(await ainvoke_llm('combined', llm, COMBINED_PROMPT.format(feedback=feedback)))
+
+    return _combined_result(id, await acached_llm_call('combined', feedback, COMBINED_PROMPT_VERSION, analyze))
+
+# Combined result for feedbacks the local pre-filter rejected without asking the LLM
+LOCAL_SPAM_RESULT = {'is_spam': True, 'sentiment': None, 'feature_code': None, 'feature_reason': None}
+
+# Function to analyze several feedbacks with one structured-output call.
+# Returns one combined result (without id) per feedback, in input order.
+def analyze_feedback_batch(feedbacks):
+    verdicts = [check_spam_locally(text) for text in feedbacks]
+    results = []
+    for text, verdict in zip(feedbacks, verdicts):
+        if verdict['label'] == SPAM and not verdict['audit']:
+            note_llm_call_avoided()
+            results.append(dict(LOCAL_SPAM_RESULT))
+        else:
+            results.append(get_cached_result('combined', text, COMBINED_PROMPT_VERSION))
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if pending:
+        _analyze_pending(feedbacks, pending, results)
+
+    for text, verdict, result in zip(feedbacks, verdicts, results):
+        if not (verdict['label'] == SPAM and not verdict['audit']):
+            record_llm_label(text, verdict, result['is_spam'])
+    return results
+
+# analyze_feedback_batch() straight from the model, for shadow re-analysis: no pre-filter, no
+# cached labels and nothing recorded as live traffic (cache entries, pre-filter training samples)
+def classify_feedback_batch(feedbacks):
+    results = [None] * len(feedbacks)
+    _analyze_pending(feedbacks, list(range(len(feedbacks))), results, cache=False)
+    return results
+
+def _analyze_pending(feedbacks, pending, results, cache=True):
+    numbered = "\n".join(
+        '%d. "%s"' % (position, feedbacks[index].replace('"', "'"))
+        for position, index in enumerate(pending, 1)
     )
-    
-    result = llm.invoke(prompt.format(feedback=feedback))
-    # Extract the content from the AIMessage object
-    result_text = result.content.strip()
-    
-    if result_text.upper() == "Y":
-        return True
+    batch = invoke_llm('batch', get_structured_llm(FeedbackBatchAnalysis, include_raw=True), BATCH_PROMPT.format(feedbacks=numbered))
+    items = {item.index: item for item in batch.results}
+
+    for position, index in enumerate(pending, 1):
+        item = items.get(position)
+        if item is None or (not item.is_spam and item.sentiment is None):
+            # The model skipped or mangled this entry; analyze it on its own
+            if cache:
+                result = analyze_feedback_combined(feedbacks[index], None)
+                result.pop('id')
+            else:
+                result = _analyze_combined(feedbacks[index])
+        else:
+            result = item.model_dump(exclude={'index'})
+            if cache:
+                store_cached_result('combined', feedbacks[index], COMBINED_PROMPT_VERSION, result)
+        results[index] = result
+
+# Function to run the configured analysis pipeline.
+# Returns (is_valid, analysis_result); analysis_result is None for spam.
+def analyze_feedback(feedback, id):
+    # Obvious spam is rejected locally; audited samples still go to the LLM to measure the tier
+    with stage('prefilter'):
+        verdict = check_spam_locally(feedback)
+    if verdict['label'] == SPAM and not verdict['audit']:
+        note_llm_call_avoided()
+        return False, None
+
+    if get_analysis_mode() == 'two_call':
+        if verdict['label'] == VALID and not verdict['audit']:
+            note_llm_call_avoided()
+        else:
+            with stage('spam_check'):
+                is_valid = spam_filter(feedback)
+            record_llm_label(feedback, verdict, not is_valid)
+            if not is_valid:
+                return False, None
+        with stage('analysis'):
+            return True, analyze_feedback_langchain(feedback, id)
+
+    # One call answers both questions, so it is timed as a single stage
+    with stage('analysis'):
+        analysis_result = analyze_feedback_combined(feedback, id)
+    is_spam = analysis_result.pop('is_spam')
+    record_llm_label(feedback, verdict, is_spam)
+    if is_spam:
+        return False, None
+    return True, analysis_result
+
+# Async counterpart of analyze_feedback, with the same results
+async def analyze_feedback_async(feedback, id):
+    with stage('prefilter'):
+        verdict = check_spam_locally(feedback)
+    if verdict['label'] == SPAM and not verdict['audit']:
+        note_llm_call_avoided()
+        return False, None
+
+    if get_analysis_mode() == 'two_call':
+        if verdict['label'] == VALID and not verdict['audit']:
+            note_llm_call_avoided()
+        else:
+            with stage('spam_check'):
+                is_valid = await spam_filter_async(feedback)
+            await _record_llm_label_async(feedback, verdict, not is_valid)
+            if not is_valid:
+                return False, None
+        with stage('analysis'):
+            return True, await analyze_feedback_langchain_async(feedback, id)
+
+    with stage('analysis'):
+        analysis_result = await analyze_feedback_combined_async(feedback, id)
+    is_spam = analysis_result.pop('is_spam')
+    await _record_llm_label_async(feedback, verdict, is_spam)
+    if is_spam:
+        return False, None
+    return True, analysis_result
+
+# Spam labels are stored as training samples (a blocking insert), so those go to a thread
+async def _record_llm_label_async(feedback, verdict, is_spam):
+    if is_spam:
+        await asyncio.to_thread(record_llm_label, feedback, verdict, is_spam)
     else:
-        return False
\ No newline at end of file
+        record_llm_label(feedback, verdict, is_spam)
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from src.database.database import get_llm_cache_entry, put_llm_cache_entry
+from src.utils.metrics import stats_gauge
+from src.utils.config import (
+    get_openai_model, get_llm_cache_enabled, get_llm_cache_size,
+    get_llm_cache_ttl, get_llm_cache_persistent
+)
+
+logger = logging.getLogger(__name__)
+
+# Lowercase, strip accents and punctuation and collapse whitespace, so that
+# "App crasha no login!!" and "app crasha  no LOGIN" share a cache entry
+def normalize_text(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^\w]+', ' ', text.lower())
+    return ' '.join(text.split())
+
+# Short stable hash of a prompt (and anything else shaping the output, e.g. a schema).
+# Editing a prompt changes its version and therefore every cache key built from it.
+def prompt_version(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:12]
+
+def cache_key(kind, text, version, model=None):
+    model = model or get_openai_model()
+    raw = '\0'.join([kind, model, version, normalize_text(text)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# In-process LRU cache with per-entry TTL
+class LRUCache:
+    def __init__(self, maxsize=10000, ttl=604800):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = None
+_memory_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'errors': 0}
+
+
+def _get_memory_cache():
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = LRUCache(get_llm_cache_size(), get_llm_cache_ttl())
+    return _memory
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+# Look up a cached result; returns None (and counts a miss) when there is none
+def get_cached_result(kind, text, version):
+    if not get_llm_cache_enabled():
+        return None
+
+    key = cache_key(kind, text, version)
+    memory = _get_memory_cache()
+
+    value = memory.get(key)
+    if value is not None:
+        _count('memory_hits')
+        return value
+
+    if get_llm_cache_persistent():
+        try:
+            value = get_llm_cache_entry(key)
+        except Exception:
+            _count('errors')
+            logger.exception("Persistent LLM cache lookup failed")
+        if value is not None:
+            _count('persistent_hits')
+            memory.set(key, value)
+            return value
+
+    _count('misses')
+    return None
+
+# Store a result in every enabled cache tier.
+# Values must be JSON-serializable so they can live in the persistent tier.
+def store_cached_result(kind, text, version, value):
+    if not get_llm_cache_enabled():
+        return
+
+    key = cache_key(kind, text, version)
+    _get_memory_cache().set(key, value)
+
+    if get_llm_cache_persistent():
+        try:
+            put_llm_cache_entry(key, kind, value, get_llm_cache_ttl())
+        except Exception:
+            _count('errors')
+            logger.exception("Persistent LLM cache write failed")
+
+# Return the cached result for (kind, text, prompt version, model) or compute and store it
+def cached_llm_call(kind, text, version, compute):
+    value = get_cached_result(kind, text, version)
+    if value is None:
+        value = compute()
+        store_cached_result(kind, text, version, value)
+    return value
+
+# Async variant of cached_llm_call; `compute` is a coroutine function. The persistent tier
+# is a blocking query, so when it is enabled lookups and writes run in a worker thread.
+async def acached_llm_call(kind, text, version, compute):
+    offload = get_llm_cache_enabled() and get_llm_cache_persistent()
+    if offload:
+        value = await asyncio.to_thread(get_cached_result, kind, text, version)
+    else:
+        value = get_cached_result(kind, text, version)
+    if value is None:
+        value = await compute()
+        if offload:
+            await asyncio.to_thread(store_cached_result, kind, text, version, value)
+        else:
+            store_cached_result(kind, text, version, value)
+    return value
+
+# Hit/miss counters for the LLM result cache
+def get_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+    stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+    stats['memory_entries'] = len(_memory) if _memory is not None else 0
+    return stats
+
+stats_gauge('alumind_llm_cache', 'LLM result cache statistics', get_cache_stats, register=True)
+
+def clear_cache():
+    global _memory
+    with _memory_lock:
+        _memory = None
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
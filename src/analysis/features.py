@@ -0,0 +1,220 @@
+import argparse
+import logging
+import threading
+import zlib
+import numpy as np
+from src.analysis.cache import normalize_text
+from src.database.database import (
+    get_feature_clusters, create_feature_cluster, get_unclustered_feature_codes, set_feature_cluster
+)
+from src.utils.config import (
+    load_config, get_openai_key, get_openai_base_url, get_feature_clustering_enabled, get_feature_embedder,
+    get_feature_embedding_model, get_feature_cluster_threshold, get_feature_reason_weight
+)
+from src.utils.gateway import get_gateway, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Filler words the LLM adds around the actual feature ("MAIS_MEDITACAO", "NOVAS_MEDITACOES")
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'no', 'na', 'para', 'com', 'por',
+    'mais', 'novo', 'nova', 'novos', 'novas', 'melhor', 'melhorar', 'melhoria', 'adicionar'
+}
+
+# Crude Portuguese plural folding: MEDITACOES -> MEDITACAO, LEMBRETES -> LEMBRETE
+_PLURALS = (('coes', 'cao'), ('oes', 'ao'), ('aes', 'ao'), ('ns', 'm'), ('is', 'l'))
+
+def _stem(word):
+    for suffix, replacement in _PLURALS:
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            return word[:-len(suffix)] + replacement
+    if word.endswith('s') and len(word) > 3:
+        return word[:-1]
+    return word
+
+def feature_tokens(text):
+    words = normalize_text(text).replace('_', ' ').split()
+    return [_stem(word) for word in words if word not in STOPWORDS] or words
+
+
+# Local embedder: signed feature hashing of character 3- and 4-grams of the stemmed words.
+# Deterministic and offline, so it also serves as the embedder in tests.
+class HashingEmbedder:
+    def __init__(self, dim=512, ngrams=(3, 4)):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.name = 'hashing-%d' % dim
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in feature_tokens(text):
+                word = ' %s ' % word
+                for n in self.ngrams:
+                    for start in range(len(word) - n + 1):
+                        h = zlib.crc32(word[start:start + n].encode('utf-8'))
+                        vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize_rows(vectors)
+
+
+# OpenAI embeddings, sharing the keep-alive HTTP client of the chat models
+class OpenAIEmbedder:
+    def __init__(self, model=None):
+        from langchain_openai import OpenAIEmbeddings
+        from src.utils.llm import get_http_client
+
+        self.model = model or get_feature_embedding_model()
+        self.name = 'openai:%s' % self.model
+        self._client = OpenAIEmbeddings(
+            model=self.model,
+            api_key=get_openai_key(),
+            base_url=get_openai_base_url(),
+            http_client=get_http_client(),
+            max_retries=0
+        )
+
+    def embed(self, texts):
+        texts = list(texts)
+        vectors = get_gateway().call('embedding', lambda: self._client.embed_documents(texts),
+                                     sum(estimate_tokens(text) for text in texts))
+        return _normalize_rows(np.array(vectors, dtype=np.float32))
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+EMBEDDERS = {
+    'hashing': HashingEmbedder,
+    'openai': OpenAIEmbedder,
+}
+
+
+# Brute-force cosine index over unit vectors (one per cluster). Feature codes number in the
+# hundreds, so a matrix-vector product beats any ANN structure at this size.
+class FeatureIndex:
+    def __init__(self, dim):
+        self.dim = dim
+        self._ids = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, cluster_id):
+        return cluster_id in self._ids
+
+    def add(self, cluster_id, vector):
+        self._ids.append(cluster_id)
+        self._matrix = np.vstack([self._matrix, vector.reshape(1, -1).astype(np.float32)])
+
+    # (cluster_id, similarity) of the closest cluster, or (None, 0.0) when empty
+    def nearest(self, vector):
+        if not self._ids:
+            return None, 0.0
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self._ids[best], float(scores[best])
+
+
+# Maps free-text feature codes to canonical clusters stored in the feature_clusters table
+class FeatureClusterer:
+    def __init__(self, embedder=None, threshold=None, reason_weight=None):
+        self.embedder = embedder or EMBEDDERS[get_feature_embedder()]()
+        self.threshold = get_feature_cluster_threshold() if threshold is None else threshold
+        self.reason_weight = get_feature_reason_weight() if reason_weight is None else reason_weight
+        self._index = None
+        self._codes = {}  # normalized code -> cluster id
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def embed(self, feature_code, feature_reason=None):
+        texts = [feature_code] + ([feature_reason] if feature_reason and self.reason_weight else [])
+        vectors = self.embedder.embed(texts)
+        vector = vectors[0] + (self.reason_weight * vectors[1] if len(vectors) > 1 else 0)
+        return _normalize_rows(vector.reshape(1, -1))[0]
+
+    # Cluster id for a feature code, creating a new cluster when nothing is similar enough
+    def assign(self, feature_code, feature_reason=None):
+        key = ' '.join(feature_tokens(feature_code))
+        cluster_id = self._codes.get(key)
+        if cluster_id is not None:
+            return cluster_id
+
+        vector = self.embed(feature_code, feature_reason)
+        with self._lock:
+            if self._index is None:
+                self._index = FeatureIndex(len(vector))
+            cluster_id, score = self._index.nearest(vector)
+            if score < self.threshold:
+                # Pick up clusters created by other processes before creating a new one
+                self._sync()
+                cluster_id, score = self._index.nearest(vector)
+            if score < self.threshold:
+                cluster_id = create_feature_cluster(feature_code.strip(), vector.tolist(), self.embedder.name)
+                if cluster_id not in self._index:
+                    self._index.add(cluster_id, vector)
+            self._codes[key] = cluster_id
+        return cluster_id
+
+    def _sync(self):
+        clusters = get_feature_clusters(self._last_id)
+        for cluster in clusters:
+            self._last_id = max(self._last_id, cluster['id'])
+            if cluster['id'] in self._index:
+                continue
+            vector = np.array(cluster['embedding'], dtype=np.float32)
+            if cluster['embedder'] != self.embedder.name or len(vector) != self._index.dim:
+                # Stored by another embedder; re-embed the canonical code with ours
+                vector = self.embed(cluster['canonical_code'])
+            self._index.add(cluster['id'], vector)
+
+
+_clusterer = None
+_clusterer_lock = threading.Lock()
+
+def get_feature_clusterer():
+    global _clusterer
+    if _clusterer is None:
+        with _clusterer_lock:
+            if _clusterer is None:
+                _clusterer = FeatureClusterer()
+    return _clusterer
+
+# Swap the process-wide clusterer (e.g. to plug in another embedder); None resets it
+def set_feature_clusterer(clusterer):
+    global _clusterer
+    with _clusterer_lock:
+        _clusterer = clusterer
+
+# Cluster id for an analyzed feedback's feature code; None when there is no code,
+# clustering is disabled or the embedder fails (the feedback is still stored)
+def assign_feature_cluster(feature_code, feature_reason=None):
+    if not feature_code or not get_feature_clustering_enabled():
+        return None
+    try:
+        return get_feature_clusterer().assign(feature_code, feature_reason)
+    except Exception:
+        logger.exception("Could not cluster feature code %r", feature_code)
+        return None
+
+# Assign clusters to stored feedbacks that have a feature code but no cluster yet
+def backfill_feature_clusters():
+    assigned = 0
+    for row in get_unclustered_feature_codes():
+        cluster_id = assign_feature_cluster(row['feature_code'], row['feature_reason'])
+        if cluster_id is not None:
+            assigned += set_feature_cluster(row['feature_code'], cluster_id)
+    return assigned
+
+
+if __name__ == '__main__':
+    # python -m src.analysis.features backfill
+    parser = argparse.ArgumentParser(description='Cluster stored feature codes')
+    parser.add_argument('command', choices=['backfill'])
+    parser.parse_args()
+
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+    print('Clustered %d feedbacks' % backfill_feature_clusters())
@@ -0,0 +1,303 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter
+import numpy as np
+from src.analysis.cache import normalize_text
+from src.database.database import insert_spam_sample, get_spam_training_data
+from src.utils.metrics import stats_gauge
+from src.utils.config import (
+    load_config, get_prefilter_enabled, get_prefilter_threshold, get_prefilter_audit_rate,
+    get_prefilter_min_samples, get_prefilter_training_rows, get_prefilter_retrain_interval
+)
+
+logger = logging.getLogger(__name__)
+
+SPAM = 'spam'
+VALID = 'valid'
+
+# Phrases that only show up in spam (matched on normalize_text output)
+SPAM_PHRASES = (
+    'compre agora', 'clique aqui', 'acesse o link', 'ganhe dinheiro', 'dinheiro facil', 'renda extra',
+    'promocao imperdivel', 'bitcoin', 'cassino', 'apostas online', 'viagra', 'click here', 'buy now'
+)
+
+_URL = re.compile(r'(https?://|www\.)\S+', re.IGNORECASE)
+
+# Obvious junk that needs neither the model nor the LLM; returns the matching rule or None
+def heuristic_rule(text):
+    text = text or ''
+    if not any(ch.isalnum() for ch in text):
+        return 'empty'
+
+    without_urls = _URL.sub(' ', text)
+    if without_urls != text and not any(ch.isalpha() for ch in without_urls):
+        return 'url_only'
+
+    if sum(1 for ch in text if ch.isalpha()) < 3:
+        return 'too_short'
+
+    compact = ''.join(text.lower().split())
+    if len(compact) >= 6 and (len(set(compact)) <= 2 or max(Counter(compact).values()) > 0.7 * len(compact)):
+        return 'repeated_characters'
+
+    normalized = ' %s ' % normalize_text(text)
+    for phrase in SPAM_PHRASES:
+        if ' %s ' % phrase in normalized:
+            return 'spam_phrase'
+    return None
+
+
+# Naive Bayes over hashed character n-grams (binary features). Trains in one pass over
+# a few thousand rows, so it is rebuilt from the database instead of being persisted.
+class NgramSpamModel:
+    def __init__(self, dim=2 ** 18, ngrams=(2, 3, 4), smoothing=1.0):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.smoothing = smoothing
+        self.valid_samples = 0
+        self.spam_samples = 0
+        self._log_ratio = None
+        self._prior = 0.0
+
+    # Unique hashed n-grams of the accent-stripped, lowercased text (punctuation and digits kept)
+    def features(self, text):
+        text = unicodedata.normalize('NFKD', text or '')
+        text = ' %s ' % ' '.join(''.join(ch for ch in text if not unicodedata.combining(ch)).lower().split())
+        hashes = {
+            zlib.crc32(text[start:start + n].encode('utf-8')) % self.dim
+            for n in self.ngrams for start in range(len(text) - n + 1)
+        }
+        return np.fromiter(hashes, dtype=np.int64, count=len(hashes))
+
+    def _counts(self, texts):
+        features = [self.features(text) for text in texts]
+        if not features:
+            return np.zeros(self.dim)
+        return np.bincount(np.concatenate(features), minlength=self.dim).astype(np.float64)
+
+    def fit(self, valid, spam):
+        valid_counts, spam_counts = self._counts(valid), self._counts(spam)
+        a = self.smoothing
+        self._log_ratio = (
+            np.log((spam_counts + a) / (spam_counts.sum() + a * self.dim))
+            - np.log((valid_counts + a) / (valid_counts.sum() + a * self.dim))
+        ).astype(np.float32)
+        self._prior = math.log(len(spam) / len(valid))
+        self.valid_samples, self.spam_samples = len(valid), len(spam)
+        return self
+
+    def spam_probability(self, text):
+        score = self._prior + float(self._log_ratio[self.features(text)].sum())
+        return 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, score))))
+
+
+# Cheap tier in front of the LLM spam check: heuristics first, then the n-gram model.
+# Only inputs the model is unsure about (or sampled for auditing) reach the LLM.
+class SpamPrefilter:
+    def __init__(self, model=None, threshold=None, audit_rate=None):
+        self.model = model
+        self.threshold = get_prefilter_threshold() if threshold is None else threshold
+        self.audit_rate = get_prefilter_audit_rate() if audit_rate is None else audit_rate
+        self._auto_train = model is None
+        self._trained_at = None
+        self._training = False
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._checked = 0
+        self._labels = Counter()
+        self._rules = Counter()
+        self._audited = 0
+        self._avoided = 0
+        # Local verdict vs LLM label, for inputs that have both
+        self._confusion = Counter()
+
+    # Returns {'label': 'spam' | 'valid' | None, 'score', 'rule', 'audit'}; None means uncertain
+    def check(self, text):
+        rule = heuristic_rule(text)
+        if rule:
+            label, score = SPAM, 1.0
+        else:
+            self._ensure_model()
+            model = self.model
+            score = model.spam_probability(text) if model is not None else None
+            if score is None:
+                label = None
+            elif score >= self.threshold:
+                label = SPAM
+            elif score <= 1.0 - self.threshold:
+                label = VALID
+            else:
+                label = None
+
+        # Audit a stable sample of local decisions (the same text is always audited or never)
+        audit = label is not None and zlib.crc32(normalize_text(text).encode('utf-8')) % 10000 < self.audit_rate * 10000
+        with self._lock:
+            self._checked += 1
+            self._labels[label or 'uncertain'] += 1
+            if rule:
+                self._rules[rule] += 1
+            if audit:
+                self._audited += 1
+        return {'label': label, 'score': score, 'rule': rule, 'audit': audit}
+
+    def note_llm_call_avoided(self):
+        with self._lock:
+            self._avoided += 1
+
+    # Record the LLM's verdict for an input that was also checked locally
+    def record_llm_label(self, text, verdict, is_spam):
+        with self._lock:
+            self._confusion[(verdict['label'] or 'uncertain', SPAM if is_spam else VALID)] += 1
+        if is_spam:
+            try:
+                insert_spam_sample(hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest(), text)
+            except Exception:
+                logger.exception("Could not store spam sample")
+
+    def _ensure_model(self):
+        if not self._auto_train:
+            return
+        with self._lock:
+            stale = self._trained_at is None or time.monotonic() - self._trained_at > get_prefilter_retrain_interval()
+            if not stale or self._training:
+                return
+            self._training = True
+        # Train in the background; until then every non-obvious input goes to the LLM
+        threading.Thread(target=self.train, name='spam-prefilter-training', daemon=True).start()
+
+    def train(self):
+        try:
+            valid, spam = get_spam_training_data(get_prefilter_training_rows())
+            minimum = get_prefilter_min_samples()
+            if len(valid) >= minimum and len(spam) >= minimum:
+                self.model = NgramSpamModel().fit(valid, spam)
+                logger.info("Spam pre-filter trained on %d valid and %d spam samples", len(valid), len(spam))
+            else:
+                logger.info("Spam pre-filter needs %d samples per class (have %d valid, %d spam)",
+                            minimum, len(valid), len(spam))
+        except Exception:
+            logger.exception("Could not train the spam pre-filter")
+        finally:
+            with self._lock:
+                self._trained_at = time.monotonic()
+                self._training = False
+
+    def stats(self):
+        with self._lock:
+            confusion = dict(self._confusion)
+            labels = dict(self._labels)
+            checked, audited, avoided = self._checked, self._audited, self._avoided
+            rules = dict(self._rules)
+
+        true_spam = confusion.get((SPAM, SPAM), 0)
+        false_spam = confusion.get((SPAM, VALID), 0)
+        precision = true_spam / (true_spam + false_spam) if true_spam + false_spam else None
+
+        # Local spam verdicts only get an LLM label when audited, so recall is estimated:
+        # spam caught locally (scaled by precision) against LLM spam that got past the tier.
+        missed = confusion.get((VALID, SPAM), 0) + confusion.get(('uncertain', SPAM), 0)
+        caught = labels.get(SPAM, 0) * (precision if precision is not None else 1.0)
+        recall = caught / (caught + missed) if caught + missed else None
+
+        model = self.model
+        return {
+            'checked': checked,
+            'local_spam': labels.get(SPAM, 0),
+            'local_valid': labels.get(VALID, 0),
+            'escalated': labels.get('uncertain', 0),
+            'rules': rules,
+            'audited': audited,
+            'llm_calls_avoided': avoided,
+            'avoided_fraction': round(avoided / checked, 4) if checked else None,
+            'precision': round(precision, 4) if precision is not None else None,
+            'recall': round(recall, 4) if recall is not None else None,
+            'threshold': self.threshold,
+            'model': {'valid_samples': model.valid_samples, 'spam_samples': model.spam_samples} if model else None
+        }
+
+
+_prefilter = None
+_prefilter_lock = threading.Lock()
+
+def get_prefilter():
+    global _prefilter
+    if _prefilter is None:
+        with _prefilter_lock:
+            if _prefilter is None:
+                _prefilter = SpamPrefilter()
+    return _prefilter
+
+# Swap the process-wide pre-filter (e.g. in tests); None resets it
+def set_prefilter(prefilter):
+    global _prefilter
+    with _prefilter_lock:
+        _prefilter = prefilter
+
+# Local verdict for a feedback; always uncertain when the pre-filter is disabled
+def check_spam_locally(text):
+    if not get_prefilter_enabled():
+        return {'label': None, 'score': None, 'rule': None, 'audit': False}
+    return get_prefilter().check(text)
+
+def record_llm_label(text, verdict, is_spam):
+    if get_prefilter_enabled():
+        get_prefilter().record_llm_label(text, verdict, is_spam)
+
+def note_llm_call_avoided():
+    if get_prefilter_enabled():
+        get_prefilter().note_llm_call_avoided()
+
+def get_prefilter_stats():
+    return get_prefilter().stats() if get_prefilter_enabled() else {'enabled': False}
+
+stats_gauge('alumind_spam_prefilter', 'Spam pre-filter statistics', get_prefilter_stats, register=True)
+
+
+# Offline evaluation on the stored labels: train on part of them, score the rest
+def evaluate(thresholds, holdout=0.2, seed=42):
+    valid, spam = get_spam_training_data(get_prefilter_training_rows())
+    if not valid or not spam:
+        raise ValueError("Evaluation needs stored feedbacks and spam samples")
+    samples = [(text, False) for text in valid] + [(text, True) for text in spam]
+    random.Random(seed).shuffle(samples)
+    split = int(len(samples) * (1 - holdout))
+    train, test = samples[:split], samples[split:]
+    model = NgramSpamModel().fit([t for t, s in train if not s], [t for t, s in train if s])
+
+    report = []
+    for threshold in thresholds:
+        prefilter = SpamPrefilter(model=model, threshold=threshold, audit_rate=0)
+        verdicts = [(prefilter.check(text)['label'], is_spam) for text, is_spam in test]
+        true_spam = sum(1 for label, is_spam in verdicts if label == SPAM and is_spam)
+        flagged = sum(1 for label, _ in verdicts if label == SPAM)
+        actual = sum(1 for _, is_spam in verdicts if is_spam)
+        report.append({
+            'threshold': threshold,
+            'precision': round(true_spam / flagged, 4) if flagged else None,
+            'recall': round(true_spam / actual, 4) if actual else None,
+            'spam_decided_locally': round(flagged / len(test), 4) if test else None,
+            'decided_locally': round(sum(1 for label, _ in verdicts if label) / len(test), 4) if test else None
+        })
+    return {'train': len(train), 'test': len(test), 'results': report}
+
+
+if __name__ == '__main__':
+    # python -m src.analysis.prefilter evaluate --thresholds 0.9 0.95 0.98 0.99
+    parser = argparse.ArgumentParser(description='Evaluate the local spam pre-filter on stored labels')
+    parser.add_argument('command', choices=['evaluate'])
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.9, 0.95, 0.98, 0.99])
+    parser.add_argument('--holdout', type=float, default=0.2)
+    args = parser.parse_args()
+
+    load_config()
+    print(json.dumps(evaluate(args.thresholds, args.holdout), indent=2))
@@ -0,0 +1,179 @@
+import argparse
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from src.analysis.analysis import analysis_provenance, classify_feedback_batch
+from src.analysis.features import assign_feature_cluster
+from src.database.database import (
+    get_reanalysis_run, start_reanalysis_run, get_reanalysis_chunk, save_reanalysis_chunk, finish_reanalysis_scan,
+    get_reanalysis_agreement, swap_reanalysis_run, discard_reanalysis_run
+)
+from src.utils.config import (
+    load_config, get_reanalysis_concurrency, get_reanalysis_batch_size, get_reanalysis_chunk_size,
+    get_reanalysis_rate_limit
+)
+from src.utils.ratelimit import TokenBucket
+
+# Re-label stored feedbacks after OPENAI_MODEL or the prompts change. A run scans feedbacks in
+# keyset order and writes the new labels to shadow columns, committing a checkpoint with every
+# chunk, so it can be stopped and resumed. Nothing readers see changes until `swap` replaces the
+# labels of the whole table in one transaction, after the agreement with the old labels is reviewed.
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('RUNNING', 'ANALYZED')
+
+
+class Reanalyzer:
+    def __init__(self, concurrency=None, batch_size=None, chunk_size=None, rate_limit=None):
+        self.concurrency = concurrency or get_reanalysis_concurrency()
+        self.batch_size = batch_size or get_reanalysis_batch_size()
+        self.chunk_size = chunk_size or get_reanalysis_chunk_size()
+        self.limiter = TokenBucket.per_minute(rate_limit or get_reanalysis_rate_limit(), capacity=self.concurrency)
+
+    # Analyze every feedback past the run's checkpoint, yielding the run after each committed chunk
+    def run(self, run):
+        after = (run['last_created_at'], run['last_id']) if run['last_id'] is not None else None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                rows = get_reanalysis_chunk(after, run['model'], run['prompt_version'], self.chunk_size)
+                if not rows:
+                    break
+                results, failed = self._analyze_chunk(rows, executor)
+                after = (rows[-1]['created_at'], rows[-1]['id'])
+                run = save_reanalysis_chunk(run['id'], results, after, failed)
+                yield run
+
+    def _analyze_chunk(self, rows, executor):
+        batches = [rows[start:start + self.batch_size] for start in range(0, len(rows), self.batch_size)]
+        analyses = executor.map(lambda batch: self._analyze_batch([row['feedback'] for row in batch]), batches)
+
+        results, failed = [], 0
+        for batch, analysis in zip(batches, analyses):
+            for row, result in zip(batch, analysis):
+                if isinstance(result, Exception):
+                    failed += 1
+                    continue
+                result = dict(result, id=row['id'], created_at=row['created_at'])
+                if not result['is_spam']:
+                    result['feature_cluster_id'] = assign_feature_cluster(
+                        result.get('feature_code'), result.get('feature_reason'))
+                results.append(result)
+        return results, failed
+
+    def _analyze_batch(self, feedbacks):
+        self.limiter.acquire()
+        try:
+            return classify_feedback_batch(feedbacks)
+        except Exception as e:
+            logger.warning("Re-analysis of %d feedbacks failed: %s", len(feedbacks), e)
+            return [e] * len(feedbacks)
+
+
+# Agreement between the current labels and a run's labels, from get_reanalysis_agreement rows.
+# Rates are over the feedbacks the new analysis did not call spam.
+def agreement_stats(rows):
+    analyzed = sum(row['count'] for row in rows)
+    labeled = [row for row in rows if not row['shadow_is_spam']]
+    total = sum(row['count'] for row in labeled)
+
+    def rate(matches):
+        return round(sum(row['count'] for row in labeled if matches(row)) / total, 4) if total else None
+
+    changes = {}
+    for row in labeled:
+        if row['sentiment'] != row['shadow_sentiment']:
+            change = '%s -> %s' % (row['sentiment'] or '-', row['shadow_sentiment'] or '-')
+            changes[change] = changes.get(change, 0) + row['count']
+
+    return {
+        'analyzed': analyzed,
+        'now_spam': analyzed - total,
+        'sentiment_agreement': rate(lambda row: row['sentiment'] == row['shadow_sentiment']),
+        'feature_agreement': rate(lambda row: row['same_feature']),
+        'cluster_agreement': rate(lambda row: row['same_cluster']),
+        'sentiment_changes': dict(sorted(changes.items(), key=lambda item: -item[1]))
+    }
+
+# The run to continue: the active one if it uses the current model and prompts, else a new one
+def resume_or_start(model, prompt_version):
+    run = get_reanalysis_run()
+    if run is None or run['status'] not in ACTIVE_STATUSES:
+        return start_reanalysis_run(model, prompt_version)
+    if (run['model'], run['prompt_version']) != (model, prompt_version):
+        raise ValueError("Run %d was started with model %s and prompt version %s; swap or discard it first"
+                         % (run['id'], run['model'], run['prompt_version']))
+    return run
+
+def _active_run():
+    run = get_reanalysis_run()
+    if run is None or run['status'] not in ACTIVE_STATUSES:
+        sys.exit('No re-analysis run in progress')
+    return run
+
+def _print_run(run, stats=None):
+    fields = ('id', 'status', 'model', 'prompt_version', 'analyzed', 'failed', 'last_created_at', 'last_id')
+    summary = {field: run[field] for field in fields}
+    summary['stats'] = stats if stats is not None else run['stats']
+    print(json.dumps(summary, default=str, ensure_ascii=False, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-analyze stored feedbacks with the current model and prompts')
+    parser.add_argument('command', choices=['run', 'status', 'swap', 'discard'],
+                        help='run (or resume) the analysis, show progress and agreement, swap the labels in, '
+                             'or discard the run')
+    parser.add_argument('--concurrency', type=int, help='parallel LLM calls')
+    parser.add_argument('--batch-size', type=int, help='feedbacks per LLM prompt')
+    parser.add_argument('--chunk-size', type=int, help='feedbacks per checkpoint')
+    parser.add_argument('--rate-limit', type=float, help='LLM requests per minute')
+    parser.add_argument('--min-agreement', type=float, default=0.0,
+                        help='refuse to swap below this sentiment agreement (0 to 1)')
+    args = parser.parse_args(argv)
+
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'run':
+        try:
+            # The job labels with the combined prompt, so rows labeled that way by the current model are current
+            provenance = analysis_provenance('combined')
+            run = resume_or_start(provenance['analysis_model'], provenance['analysis_prompt_version'])
+        except ValueError as e:
+            sys.exit(str(e))
+        reanalyzer = Reanalyzer(args.concurrency, args.batch_size, args.chunk_size, args.rate_limit)
+        if run['status'] == 'RUNNING':
+            for run in reanalyzer.run(run):
+                logger.info("Run %d: %d analyzed, %d failed, up to %s", run['id'], run['analyzed'], run['failed'],
+                            run['last_created_at'])
+            finish_reanalysis_scan(run['id'])
+        run = get_reanalysis_run(run['id'])
+        _print_run(run, agreement_stats(get_reanalysis_agreement(run['id'])))
+    elif args.command == 'status':
+        run = get_reanalysis_run()
+        if run is None:
+            sys.exit('No re-analysis runs yet')
+        stats = agreement_stats(get_reanalysis_agreement(run['id'])) if run['status'] in ACTIVE_STATUSES else None
+        _print_run(run, stats)
+    elif args.command == 'swap':
+        run = _active_run()
+        stats = agreement_stats(get_reanalysis_agreement(run['id']))
+        if (stats['sentiment_agreement'] or 0.0) < args.min_agreement:
+            sys.exit('Sentiment agreement %s is below --min-agreement %s' % (stats['sentiment_agreement'],
+                                                                            args.min_agreement))
+        try:
+            swapped = swap_reanalysis_run(run['id'], stats)
+        except ValueError as e:
+            sys.exit(str(e))
+        print('Relabeled %d feedbacks' % swapped)
+        _print_run(get_reanalysis_run(run['id']))
+    else:
+        run = _active_run()
+        discard_reanalysis_run(run['id'])
+        print('Discarded run %d' % run['id'])
+
+
+if __name__ == '__main__':
+    # python -m src.analysis.reanalysis run|status|swap|discard
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+from src.database.database import (
+    INSERT_FEEDBACK_SQL, TOTAL_FEEDBACK_COUNT_SQL, SENTIMENT_DATA_SQL, TOP_FEATURES_SQL, FEEDBACK_TIMELINE_SQL,
+    ENQUEUE_FEEDBACK_SQL, FEEDBACK_DONE_SQL, FEEDBACK_QUEUE_STATUS_SQL, RESERVE_SUBMISSION_SQL,
+    COMPLETE_SUBMISSION_SQL, RELEASE_SUBMISSION_SQL, submission_params, feedback_row_params, feedbacks_page_query,
+    feedbacks_page_result, feedbacks_search_query, feedbacks_search_result, trigram_search_available, timed_query,
+    _notify_feedbacks_changed
+)
+from src.utils.config import get_db_pool_min_size, get_db_pool_max_size, get_db_pool_timeout
+from src.utils.metrics import stats_gauge
+
+# asyncio counterparts of the queries the ASGI app serves, on a psycopg 3 connection pool.
+# The SQL is shared with database.py; schema management and background jobs stay there.
+
+_pool = None
+
+def _conninfo():
+    return make_conninfo(
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD') or None,
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+# Open the process-wide pool; call it from the serving event loop (e.g. at startup)
+async def open_async_pool():
+    global _pool
+    if _pool is None:
+        pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=get_db_pool_min_size(),
+            max_size=get_db_pool_max_size(),
+            timeout=get_db_pool_timeout(),
+            kwargs={'row_factory': dict_row},
+            open=False
+        )
+        await pool.open()
+        _pool = pool
+    return _pool
+
+async def close_async_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+# Pooled connection for an `async with` block, committed on success and rolled back on error
+@asynccontextmanager
+async def get_async_connection():
+    pool = _pool or await open_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+def get_async_pool_stats():
+    return _pool.get_stats() if _pool is not None else {}
+
+stats_gauge('alumind_async_db_pool', 'Async connection pool statistics', get_async_pool_stats, register=True)
+
+
+@timed_query
+async def insert_feedback_async(feedback_data):
+    async with get_async_connection() as conn:
+        await conn.execute(INSERT_FEEDBACK_SQL, feedback_row_params(feedback_data))
+    _notify_feedbacks_changed()
+
+# Returns False when the id is already queued or stored
+@timed_query
+async def enqueue_feedback_async(feedback_id, feedback):
+    async with get_async_connection() as conn:
+        cur = await conn.execute(ENQUEUE_FEEDBACK_SQL, (feedback_id, feedback, feedback_id))
+        return await cur.fetchone() is not None
+
+@timed_query
+async def reserve_submission_async(feedback_id, idempotency_key, request_hash, lease_seconds, ttl_seconds):
+    async with get_async_connection() as conn:
+        cur = await conn.execute(RESERVE_SUBMISSION_SQL,
+                                 submission_params(feedback_id, idempotency_key, request_hash, lease_seconds, ttl_seconds))
+        return await cur.fetchone()
+
+@timed_query
+async def finish_submission_async(feedback_id, status_code=None, response=None):
+    async with get_async_connection() as conn:
+        if response is None:
+            await conn.execute(RELEASE_SUBMISSION_SQL, (feedback_id,))
+        else:
+            await conn.execute(COMPLETE_SUBMISSION_SQL, (status_code, Jsonb(response), feedback_id))
+
+@timed_query
+async def get_total_feedback_count_async():
+    async with get_async_connection() as conn:
+        cur = await conn.execute(TOTAL_FEEDBACK_COUNT_SQL)
+        return (await cur.fetchone())['total']
+
+@timed_query
+async def get_sentiment_data_async():
+    async with get_async_connection() as conn:
+        cur = await conn.execute(SENTIMENT_DATA_SQL)
+        return await cur.fetchall()
+
+@timed_query
+async def get_top_requested_features_async():
+    async with get_async_connection() as conn:
+        cur = await conn.execute(TOP_FEATURES_SQL)
+        return await cur.fetchall()
+
+@timed_query
+async def get_feedback_timeline_async(bucket, since):
+    async with get_async_connection() as conn:
+        cur = await conn.execute(FEEDBACK_TIMELINE_SQL, {'bucket': bucket, 'since': since})
+        return await cur.fetchall()
+
+@timed_query
+async def get_feedbacks_page_async(limit=50, cursor=None, sentiment=None, feature_code=None, start=None, end=None):
+    sql, params = feedbacks_page_query(limit, cursor, sentiment, feature_code, start, end)
+    async with get_async_connection() as conn:
+        cur = await conn.execute(sql, params)
+        feedbacks = await cur.fetchall()
+    return feedbacks_page_result(feedbacks, limit)
+
+@timed_query
+async def get_feedback_status_async(feedback_id):
+    async with get_async_connection() as conn:
+        cur = await conn.execute(FEEDBACK_DONE_SQL, (feedback_id,))
+        row = await cur.fetchone()
+        if row is None:
+            cur = await conn.execute(FEEDBACK_QUEUE_STATUS_SQL, (feedback_id,))
+            row = await cur.fetchone()
+    return dict(row) if row else None
+
+@timed_query
+async def search_feedbacks_async(q, limit=50, fuzzy=False, sentiment=None, feature_code=None, start=None, end=None):
+    # The extension check runs once per process, on the blocking pool
+    if fuzzy and not await asyncio.to_thread(trigram_search_available):
+        raise ValueError("Fuzzy search is not available")
+    sql, params = feedbacks_search_query(q, limit, fuzzy, sentiment, feature_code, start, end)
+    async with get_async_connection() as conn:
+        cur = await conn.execute(sql, params)
+        rows = await cur.fetchall()
+    return feedbacks_search_result(rows)
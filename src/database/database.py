@@ -1,8 +1,40 @@
+import base64
+import html
+import json
 import os
+import threading
+from datetime import datetime
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, Json, execute_values
+from src.database.pool import ConnectionPool
+from src.database.stats import rebuild_stats
+from src.database.partitions import (
+    create_partitioned_feedbacks, create_partitions, copy_legacy_feedbacks, is_partitioned, list_partitions,
+    expired_partitions, archive_partition
+)
+from src.database.migrations import SchemaOutdated, apply_migrations, apply_all_in_transaction, pending_migrations
+from src.utils.config import (
+    get_db_pool_min_size, get_db_pool_max_size, get_db_pool_timeout, get_db_pool_ping_interval,
+    get_search_max_candidates, get_partition_premake_months, get_feedbacks_retention_months,
+    get_feedbacks_archive_dir, get_schema_startup
+)
+from src.utils.metrics import FAST_BUCKETS, LabeledHistogram, stats_gauge, timed
 
-# Database connection    
+_pool = None
+_pool_lock = threading.Lock()
+_change_listeners = []
+_trigram_available = None
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Duration of each query function below, connection checkout included
+DB_QUERY_SECONDS = LabeledHistogram(
+    'alumind_db_query_duration_seconds', 'Duration of database functions', ('function',),
+    buckets=FAST_BUCKETS, register=True)
+timed_query = timed(DB_QUERY_SECONDS, prefix='db.')
+
+# Database connection
 def get_db_connection():
     conn = psycopg2.connect(
         dbname=os.getenv('DB_NAME'),
@@ -13,128 +45,1144 @@ def get_db_connection():
     )
     return conn
 
-# Initialize the database
-def init_db():
+# Process-wide connection pool, created on first use (and re-created after a fork)
+def get_pool():
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                # Looked up at call time so the connection factory can be swapped (e.g. in tests)
+                lambda: get_db_connection(),
+                minconn=get_db_pool_min_size(),
+                maxconn=get_db_pool_max_size(),
+                timeout=get_db_pool_timeout(),
+                ping_interval=get_db_pool_ping_interval()
+            )
+        return _pool
+
+# Close every pooled connection; the next call to get_pool() starts a fresh pool
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+
+# Pooled connection for a `with` block, committed on success and rolled back on error
+@contextmanager
+def get_connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+# Register a callback run after every committed write to the feedbacks table
+def on_feedbacks_changed(callback):
+    _change_listeners.append(callback)
+
+def _notify_feedbacks_changed():
+    for callback in _change_listeners:
+        callback()
+
+# Pool saturation and wait-time metrics, without opening the pool (empty until the first query
+# creates it), so /stats and metrics scrapes never connect to the database
+def peek_pool_stats():
+    pool = _pool
+    return pool.stats() if pool is not None else {}
+
+stats_gauge('alumind_db_pool', 'Connection pool statistics', peek_pool_stats, register=True)
+
+# Bring the schema up to date (see migrations.py) and create the upcoming feedback partitions.
+# Returns the migration versions applied.
+@timed_query
+def init_db(target=None):
+    # Migrations switch autocommit on and off, so they get their own connection instead of a pooled one
     conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Create feedbacks table
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS feedbacks (
-        id TEXT PRIMARY KEY,
-        feedback TEXT NOT NULL,
-        sentiment TEXT CHECK (sentiment IN ('POSITIVO', 'NEGATIVO', 'INCONCLUSIVO')),
-        feature_code TEXT,
-        feature_reason TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    try:
+        applied = apply_migrations(conn, target)
+    finally:
+        conn.close()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if is_partitioned(cur):
+            create_partitions(cur, get_partition_premake_months())
+        cur.close()
+    return applied
+
+# Schema handling at startup (SCHEMA_STARTUP): 'check' only verifies that every migration was
+# applied (one cheap query), 'migrate' applies the pending ones, 'off' does nothing
+def ensure_schema():
+    mode = get_schema_startup()
+    if mode == 'migrate':
+        init_db()
+    elif mode == 'check':
+        with get_connection() as conn:
+            cur = conn.cursor()
+            pending = pending_migrations(cur)
+            cur.close()
+        if pending:
+            raise SchemaOutdated("Database schema is missing migrations %s; run python -m src.database.migrations"
+                                 % ', '.join(map(str, pending)))
+
+# ensure_schema() deferred to the first request that needs the database, once per process; after a
+# failure the next caller tries again
+def ensure_schema_once():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            ensure_schema()
+            _schema_ready = True
+
+def schema_ready():
+    return _schema_ready
+
+# Function to convert a plain feedbacks table to monthly partitions in one transaction (writes
+# wait while the rows are copied). Returns the number of rows copied.
+@timed_query
+def convert_feedbacks_to_partitions():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        create_partitioned_feedbacks(cur, migrate=True)
+        # Recreate columns, indexes and triggers on the new table
+        apply_all_in_transaction(cur)
+        create_partitions(cur, get_partition_premake_months())
+        copied = copy_legacy_feedbacks(cur)
+        cur.close()
+    _notify_feedbacks_changed()
+    return copied
+
+# Function to create upcoming monthly partitions and archive the ones past the retention window.
+# Returns (created partition names, archive paths); does nothing when feedbacks is not partitioned.
+@timed_query
+def maintain_feedback_partitions(now=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if not is_partitioned(cur):
+            cur.close()
+            return [], []
+        created = create_partitions(cur, get_partition_premake_months(), now)
+        expired = expired_partitions(list_partitions(cur), now or datetime.now(), get_feedbacks_retention_months())
+        cur.close()
+
+    # One transaction per archived partition, so a failure keeps the ones already done
+    archived = []
+    for name in expired:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            archived.append(archive_partition(cur, name, get_feedbacks_archive_dir()))
+            cur.close()
+    if archived:
+        _notify_feedbacks_changed()
+    return created, archived
+
+# Statements shared with the asyncio driver in async_database.py (both use %s placeholders)
+INSERT_FEEDBACK_SQL = '''
+    INSERT INTO feedbacks (id, feedback, sentiment, feature_code, feature_reason, feature_cluster_id, analysis_model,
+                           analysis_prompt_version)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+'''
+
+TOTAL_FEEDBACK_COUNT_SQL = "SELECT COALESCE(SUM(count), 0) as total FROM feedback_stats_sentiment;"
+
+SENTIMENT_DATA_SQL = """
+    SELECT
+        NULLIF(sentiment, '') as sentiment,
+        count,
+        CAST((count::float * 100 / NULLIF(SUM(count) OVER (), 0)) AS DECIMAL(5,1)) as percentage
+    FROM feedback_stats_sentiment
+    WHERE count > 0;
+"""
+
+TOP_FEATURES_SQL = """
+    SELECT
+        feature_code,
+        count as count_value
+    FROM feedback_stats_feature
+    WHERE count > 0
+    ORDER BY count DESC
+    LIMIT 3;
+"""
+
+# Feedbacks per sentiment and bucket (date_trunc unit: day, week or month) since a day
+FEEDBACK_TIMELINE_SQL = """
+    SELECT date_trunc(%(bucket)s, day::timestamp)::date AS bucket, sentiment, SUM(count) AS count
+    FROM feedback_stats_daily
+    WHERE day >= %(since)s AND sentiment <> ''
+    GROUP BY 1, 2
+    HAVING SUM(count) > 0
+    ORDER BY 1, 2;
+"""
+
+ENQUEUE_FEEDBACK_SQL = """
+    INSERT INTO feedback_queue (id, feedback)
+    SELECT %s, %s
+    WHERE NOT EXISTS (SELECT 1 FROM feedbacks WHERE id = %s)
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id;
+"""
+
+FEEDBACK_DONE_SQL = """
+    SELECT id, 'DONE' AS status, sentiment, feature_code, feature_reason, created_at
+    FROM feedbacks
+    WHERE id = %s;
+"""
+
+FEEDBACK_QUEUE_STATUS_SQL = """
+    SELECT id, status, attempts, last_error, next_attempt_at, created_at
+    FROM feedback_queue
+    WHERE id = %s;
+"""
+
+# Reserve a feedback id before any analysis, in one round trip. Returns whether the id is already
+# stored, whether the Idempotency-Key already names another feedback, whether the reservation was
+# taken (a new id, an expired reservation, a lease abandoned by a crashed request, or a kept response
+# of another key) and the state of the existing reservation.
+RESERVE_SUBMISSION_SQL = """
+    WITH stored AS (
+        SELECT EXISTS (SELECT 1 FROM feedbacks WHERE id = %(feedback_id)s) AS stored
+    ), reused AS (
+        SELECT EXISTS (
+            SELECT 1 FROM feedback_submissions
+            WHERE idempotency_key = %(idempotency_key)s AND feedback_id <> %(feedback_id)s
+              AND expires_at > CURRENT_TIMESTAMP
+        ) AS reused
+    ), claimed AS (
+        INSERT INTO feedback_submissions AS s (feedback_id, idempotency_key, request_hash, locked_until, expires_at)
+        SELECT %(feedback_id)s, %(idempotency_key)s, %(request_hash)s,
+               CURRENT_TIMESTAMP + %(lease)s * INTERVAL '1 second', CURRENT_TIMESTAMP + %(ttl)s * INTERVAL '1 second'
+        WHERE NOT (SELECT stored FROM stored) AND NOT (SELECT reused FROM reused)
+        ON CONFLICT (feedback_id) DO UPDATE
+        SET idempotency_key = EXCLUDED.idempotency_key, request_hash = EXCLUDED.request_hash, status_code = NULL,
+            response = NULL, locked_until = EXCLUDED.locked_until, created_at = CURRENT_TIMESTAMP,
+            expires_at = EXCLUDED.expires_at
+        WHERE s.expires_at <= CURRENT_TIMESTAMP
+           OR (s.status_code IS NULL AND s.locked_until <= CURRENT_TIMESTAMP)
+           OR (s.status_code IS NOT NULL AND s.idempotency_key IS DISTINCT FROM EXCLUDED.idempotency_key)
+        RETURNING 1
     )
-    ''')
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    SELECT (SELECT stored FROM stored) AS stored, (SELECT reused FROM reused) AS reused,
+           EXISTS (SELECT 1 FROM claimed) AS claimed, s.feedback_id IS NOT NULL AS reserved, s.idempotency_key,
+           s.request_hash, s.status_code, s.response, COALESCE(s.locked_until > CURRENT_TIMESTAMP, FALSE) AS in_progress
+    FROM (SELECT 1) AS one
+    LEFT JOIN feedback_submissions s ON s.feedback_id = %(feedback_id)s AND s.expires_at > CURRENT_TIMESTAMP;
+"""
+
+COMPLETE_SUBMISSION_SQL = """
+    UPDATE feedback_submissions
+    SET status_code = %s, response = %s, locked_until = NULL
+    WHERE feedback_id = %s;
+"""
+
+RELEASE_SUBMISSION_SQL = "DELETE FROM feedback_submissions WHERE feedback_id = %s;"
+
+def submission_params(feedback_id, idempotency_key, request_hash, lease_seconds, ttl_seconds):
+    return {'feedback_id': feedback_id, 'idempotency_key': idempotency_key, 'request_hash': request_hash,
+            'lease': lease_seconds, 'ttl': ttl_seconds}
+
+def feedback_row_params(feedback_data):
+    return (
+        feedback_data['id'],
+        feedback_data['feedback'],
+        feedback_data['sentiment'],
+        feedback_data.get('feature_code'),
+        feedback_data.get('feature_reason'),
+        feedback_data.get('feature_cluster_id'),
+        # Which model and prompt produced the labels (see analysis_provenance)
+        feedback_data.get('analysis_model'),
+        feedback_data.get('analysis_prompt_version')
+    )
+
+def _insert_feedback_row(cur, feedback_data):
+    cur.execute(INSERT_FEEDBACK_SQL, feedback_row_params(feedback_data))
 
 # Function to insert feedback
+@timed_query
 def insert_feedback(feedback_data):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute(
-        'INSERT INTO feedbacks (id, feedback, sentiment, feature_code, feature_reason) VALUES (%s, %s, %s, %s, %s)',
-        (
-            feedback_data['id'],
-            feedback_data['feedback'],
-            feedback_data['sentiment'],
-            feedback_data.get('feature_code'),
-            feedback_data.get('feature_reason')
-        )
-    )
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        _insert_feedback_row(cur, feedback_data)
+        cur.close()
+    _notify_feedbacks_changed()
+
+# Function to insert many analyzed feedbacks in one transaction.
+# Ids that already exist are skipped; returns the set of ids actually inserted.
+@timed_query
+def insert_feedbacks_bulk(feedback_rows):
+    if not feedback_rows:
+        return set()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        # Ids are checked explicitly because a partitioned feedbacks has no unique index on id
+        # for ON CONFLICT to use (its feedback_ids trigger still rejects concurrent duplicates)
+        inserted = execute_values(cur, """
+            INSERT INTO feedbacks (id, feedback, sentiment, feature_code, feature_reason, feature_cluster_id,
+                                   analysis_model, analysis_prompt_version)
+            SELECT DISTINCT ON (v.id) v.id, v.feedback, v.sentiment, v.feature_code, v.feature_reason,
+                   v.feature_cluster_id::integer, v.analysis_model, v.analysis_prompt_version
+            FROM (VALUES %s) AS v (id, feedback, sentiment, feature_code, feature_reason, feature_cluster_id,
+                                   analysis_model, analysis_prompt_version)
+            WHERE NOT EXISTS (SELECT 1 FROM feedbacks f WHERE f.id = v.id)
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        """, [feedback_row_params(row) for row in feedback_rows], page_size=len(feedback_rows), fetch=True)
+
+        cur.close()
+    if inserted:
+        _notify_feedbacks_changed()
+    return {row[0] for row in inserted}
+
+# Function to find which of the given ids are already stored
+@timed_query
+def get_existing_feedback_ids(feedback_ids):
+    if not feedback_ids:
+        return set()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("SELECT id FROM feedbacks WHERE id = ANY(%s);", (list(feedback_ids),))
+        existing = {row[0] for row in cur.fetchall()}
+
+        cur.close()
+    return existing
+
+# Function to recompute the aggregate tables from the feedbacks table
+@timed_query
+def rebuild_feedback_stats():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        rebuild_stats(cur)
+        cur.close()
+    _notify_feedbacks_changed()
 
 # Function to get total feedback count
+@timed_query
 def get_total_feedback_count():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    cur.execute("SELECT COUNT(*) as total FROM feedbacks;")
-    total_feedbacks = cur.fetchone()['total']
-    
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(TOTAL_FEEDBACK_COUNT_SQL)
+        total_feedbacks = cur.fetchone()['total']
+
+        cur.close()
     return total_feedbacks
 
 # Function to get sentiment data
+@timed_query
 def get_sentiment_data():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    cur.execute("""
-        SELECT 
-            sentiment, 
-            COUNT(*) as count,
-            CAST((COUNT(*)::float * 100 / NULLIF((SELECT COUNT(*) FROM feedbacks), 0)) AS DECIMAL(5,1)) as percentage
-        FROM feedbacks 
-        GROUP BY sentiment;
-    """)
-    sentiment_data = cur.fetchall()
-    
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(SENTIMENT_DATA_SQL)
+        sentiment_data = cur.fetchall()
+
+        cur.close()
     return sentiment_data
 
 # Function to get top requested features
+@timed_query
 def get_top_requested_features():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    cur.execute("""
-        SELECT 
-            feature_code,
-            COUNT(*) as count_value
-        FROM feedbacks 
-        WHERE feature_code IS NOT NULL
-        GROUP BY feature_code
-        ORDER BY count_value DESC
-        LIMIT 3;
-    """)
-    top_features = cur.fetchall()
-    
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(TOP_FEATURES_SQL)
+        top_features = cur.fetchall()
+
+        cur.close()
     return top_features
 
-# Function to get detailed feedbacks
-def get_detailed_feedbacks():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    cur.execute("""
-        SELECT id, feedback, sentiment, feature_code, feature_reason, created_at 
-        FROM feedbacks 
-        ORDER BY created_at DESC;
-    """)
-    feedbacks = cur.fetchall()
-    
-    cur.close()
-    conn.close()
-    return feedbacks
-
-# Function to get feature reason by feature code
-def get_feature_reason(feature_code):
+# Function to get the feedback counts per sentiment and bucket since `since` (from the daily counters)
+@timed_query
+def get_feedback_timeline(bucket, since):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(FEEDBACK_TIMELINE_SQL, {'bucket': bucket, 'since': since})
+        timeline = cur.fetchall()
+
+        cur.close()
+    return timeline
+
+# Opaque pagination cursor pointing at the last (created_at, id) returned
+def encode_cursor(created_at, feedback_id):
+    raw = json.dumps([created_at.isoformat(), feedback_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, feedback_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), feedback_id
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+# WHERE conditions and params for the listing and search filters
+def _feedback_filters(sentiment=None, feature_code=None, start=None, end=None):
+    conditions = []
+    params = []
+
+    if sentiment:
+        conditions.append("sentiment = %s")
+        params.append(sentiment)
+    if feature_code:
+        conditions.append("feature_code = %s")
+        params.append(feature_code)
+    if start:
+        conditions.append("created_at >= %s")
+        params.append(start)
+    if end:
+        conditions.append("created_at < %s")
+        params.append(end)
+    return conditions, params
+
+# Keyset pagination on (created_at, id), newest first: returns (sql, params) for one page.
+# One extra row is fetched to know whether there is a next page (see feedbacks_page_result).
+def feedbacks_page_query(limit=50, cursor=None, sentiment=None, feature_code=None, start=None, end=None):
+    conditions, params = _feedback_filters(sentiment, feature_code, start, end)
+    if cursor:
+        conditions.insert(0, "(created_at, id) < (%s, %s)")
+        params[:0] = decode_cursor(cursor)
+
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    sql = """
+        SELECT id, feedback, sentiment, feature_code, feature_reason, created_at
+        FROM feedbacks
+        %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %%s;
+    """ % where
+    return sql, params + [limit + 1]
+
+# (feedbacks, next_cursor) from the rows of feedbacks_page_query; next_cursor is None on the last page
+def feedbacks_page_result(feedbacks, limit):
+    next_cursor = None
+    if len(feedbacks) > limit:
+        feedbacks = feedbacks[:limit]
+        next_cursor = encode_cursor(feedbacks[-1]['created_at'], feedbacks[-1]['id'])
+    return feedbacks, next_cursor
+
+# Function to get one page of feedbacks, newest first.
+# Returns (feedbacks, next_cursor); next_cursor is None on the last page.
+@timed_query
+def get_feedbacks_page(limit=50, cursor=None, sentiment=None, feature_code=None, start=None, end=None):
+    sql, params = feedbacks_page_query(limit, cursor, sentiment, feature_code, start, end)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(sql, params)
+        feedbacks = cur.fetchall()
+
+        cur.close()
+    return feedbacks_page_result(feedbacks, limit)
+
+# Matched terms are wrapped in these control characters by ts_headline, then turned into <mark>
+# tags once the rest of the text is HTML-escaped (see feedbacks_search_result)
+HEADLINE_OPTIONS = 'StartSel=\x02, StopSel=\x03, MaxFragments=2, MaxWords=30, MinWords=10'
+
+# Ranked search: returns (sql, params). Matches come from the GIN index on search_vector (or on
+# the trigram index with fuzzy=True); only the most recent `candidates` of them are ranked, so a
+# term found in millions of rows costs no more than a rare one. Highlights are computed for the
+# returned rows only.
+def feedbacks_search_query(q, limit=50, fuzzy=False, sentiment=None, feature_code=None, start=None, end=None,
+                           candidates=None):
+    conditions, params = _feedback_filters(sentiment, feature_code, start, end)
+    if fuzzy:
+        match = "%s <%% feedback"
+        rank = "word_similarity(%s, feedback)"
+    else:
+        match = "search_vector @@ websearch_to_tsquery('portuguese', %s)"
+        rank = "ts_rank_cd(search_vector, websearch_to_tsquery('portuguese', %s))"
+
+    sql = """
+        SELECT id, feedback, sentiment, feature_code, feature_reason, created_at, rank,
+               ts_headline('portuguese', feedback, websearch_to_tsquery('portuguese', %%s), %%s) AS highlight
+        FROM (
+            SELECT id, feedback, sentiment, feature_code, feature_reason, created_at, %s AS rank
+            FROM (
+                SELECT id, feedback, sentiment, feature_code, feature_reason, created_at, search_vector
+                FROM feedbacks
+                WHERE %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT %%s
+            ) AS recent
+            ORDER BY rank DESC, created_at DESC, id DESC
+            LIMIT %%s
+        ) AS ranked
+        ORDER BY rank DESC, created_at DESC, id DESC;
+    """ % (rank, " AND ".join([match] + conditions))
+    candidates = max(candidates or get_search_max_candidates(), limit)
+    return sql, [q, HEADLINE_OPTIONS, q, q] + params + [candidates, limit]
+
+# Search rows as dicts, with `highlight` as HTML safe to render (only <mark> tags are unescaped)
+def feedbacks_search_result(rows):
+    results = []
+    for row in rows:
+        result = dict(row)
+        result['rank'] = float(result['rank'])
+        result['highlight'] = html.escape(result['highlight']).replace('\x02', '<mark>').replace('\x03', '</mark>')
+        results.append(result)
+    return results
+
+# Whether fuzzy search can be used (pg_trgm installed); checked once per process
+def trigram_search_available():
+    global _trigram_available
+    if _trigram_available is None:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            _trigram_available = cur.fetchone()[0]
+            cur.close()
+    return _trigram_available
+
+# Function to search feedbacks by text, best match first
+@timed_query
+def search_feedbacks(q, limit=50, fuzzy=False, sentiment=None, feature_code=None, start=None, end=None):
+    if fuzzy and not trigram_search_available():
+        raise ValueError("Fuzzy search is not available")
+    sql, params = feedbacks_search_query(q, limit, fuzzy, sentiment, feature_code, start, end)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+        cur.close()
+    return feedbacks_search_result(rows)
+
+# Function to get the report figures for [start, end) and the equally long period before it.
+# One statement scans the feedbacks once (range scan on created_at) and returns the sentiment
+# counts, the top features (grouped by feature cluster) and one representative reason per
+# feature (the most recent one).
+@timed_query
+def get_report_data(start, end, top_features=5):
+    previous_start = start - (end - start)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            WITH period AS MATERIALIZED (
+                SELECT f.sentiment, COALESCE(c.canonical_code, f.feature_code) AS feature_code,
+                       f.feature_reason, f.created_at, f.created_at >= %(start)s AS is_current
+                FROM feedbacks f
+                LEFT JOIN feature_clusters c ON c.id = f.feature_cluster_id
+                WHERE f.created_at >= %(previous_start)s AND f.created_at < %(end)s
+            ),
+            sentiments AS (
+                SELECT sentiment,
+                       COUNT(*) FILTER (WHERE is_current) AS count,
+                       COUNT(*) FILTER (WHERE NOT is_current) AS previous_count
+                FROM period
+                GROUP BY sentiment
+            ),
+            features AS (
+                SELECT feature_code,
+                       COUNT(*) FILTER (WHERE is_current) AS count,
+                       COUNT(*) FILTER (WHERE NOT is_current) AS previous_count
+                FROM period
+                WHERE feature_code IS NOT NULL
+                GROUP BY feature_code
+                HAVING COUNT(*) FILTER (WHERE is_current) > 0
+                ORDER BY count DESC, feature_code
+                LIMIT %(top_features)s
+            ),
+            reasons AS (
+                SELECT DISTINCT ON (feature_code) feature_code, feature_reason
+                FROM period
+                WHERE is_current AND feature_code IS NOT NULL AND feature_reason IS NOT NULL
+                ORDER BY feature_code, created_at DESC
+            )
+            SELECT
+                (SELECT COUNT(*) FROM period WHERE is_current) AS total,
+                (SELECT COUNT(*) FROM period WHERE NOT is_current) AS previous_total,
+                (SELECT COALESCE(json_agg(s ORDER BY s.count DESC, s.sentiment), '[]')
+                   FROM sentiments s) AS sentiments,
+                (SELECT COALESCE(json_agg(json_build_object(
+                            'feature_code', f.feature_code,
+                            'count', f.count,
+                            'previous_count', f.previous_count,
+                            'feature_reason', r.feature_reason
+                        ) ORDER BY f.count DESC, f.feature_code), '[]')
+                   FROM features f LEFT JOIN reasons r USING (feature_code)) AS features;
+        """, {'start': start, 'end': end, 'previous_start': previous_start, 'top_features': top_features})
+        report_data = dict(cur.fetchone())
+
+        cur.close()
+    report_data.update(start=start, end=end, previous_start=previous_start)
+    return report_data
+
+# Function to get a non-expired LLM cache entry
+@timed_query
+def get_llm_cache_entry(cache_key):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT value
+            FROM llm_cache
+            WHERE cache_key = %s AND expires_at > CURRENT_TIMESTAMP;
+        """, (cache_key,))
+        row = cur.fetchone()
+
+        cur.close()
+    return row[0] if row else None
+
+# Function to store an LLM cache entry, replacing any previous value
+@timed_query
+def put_llm_cache_entry(cache_key, kind, value, ttl_seconds):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO llm_cache (cache_key, kind, value, expires_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+            ON CONFLICT (cache_key) DO UPDATE
+            SET value = EXCLUDED.value, created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at;
+        """, (cache_key, kind, Json(value), ttl_seconds))
+
+        cur.close()
+
+# Function to delete expired LLM cache entries
+@timed_query
+def purge_expired_llm_cache():
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("DELETE FROM llm_cache WHERE expires_at <= CURRENT_TIMESTAMP;")
+        deleted = cur.rowcount
+
+        cur.close()
+    return deleted
+
+# Function to reserve a feedback submission (see RESERVE_SUBMISSION_SQL)
+@timed_query
+def reserve_submission(feedback_id, idempotency_key, request_hash, lease_seconds, ttl_seconds):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(RESERVE_SUBMISSION_SQL,
+                    submission_params(feedback_id, idempotency_key, request_hash, lease_seconds, ttl_seconds))
+        reservation = dict(cur.fetchone())
+
+        cur.close()
+    return reservation
+
+# Function to end a reservation: keep the response for replays, or release the id (response None)
+@timed_query
+def finish_submission(feedback_id, status_code=None, response=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        if response is None:
+            cur.execute(RELEASE_SUBMISSION_SQL, (feedback_id,))
+        else:
+            cur.execute(COMPLETE_SUBMISSION_SQL, (status_code, Json(response), feedback_id))
+
+        cur.close()
+
+# Function to delete expired submission reservations and the responses kept for replays
+@timed_query
+def purge_expired_submissions():
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("DELETE FROM feedback_submissions WHERE expires_at <= CURRENT_TIMESTAMP;")
+        deleted = cur.rowcount
+
+        cur.close()
+    return deleted
+
+# Function to queue raw feedback for asynchronous analysis.
+# Returns False when the id is already queued or stored.
+@timed_query
+def enqueue_feedback(feedback_id, feedback):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute(ENQUEUE_FEEDBACK_SQL, (feedback_id, feedback, feedback_id))
+        queued = cur.fetchone() is not None
+
+        cur.close()
+    return queued
+
+# Function to claim due queue jobs (and jobs whose worker lease expired) for processing
+@timed_query
+def claim_feedback_jobs(limit, lease_seconds):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            UPDATE feedback_queue
+            SET status = 'PROCESSING',
+                attempts = attempts + 1,
+                locked_until = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id
+                FROM feedback_queue
+                WHERE (status = 'PENDING' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                   OR (status = 'PROCESSING' AND locked_until < CURRENT_TIMESTAMP)
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, feedback, attempts;
+        """, (lease_seconds, limit))
+        jobs = cur.fetchall()
+
+        cur.close()
+    return jobs
+
+# Function to store the analyzed feedback and close its queue job in one transaction
+@timed_query
+def complete_feedback_job(feedback_data):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        _insert_feedback_row(cur, feedback_data)
+        cur.execute("""
+            UPDATE feedback_queue
+            SET status = 'DONE', locked_until = NULL, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s;
+        """, (feedback_data['id'],))
+
+        cur.close()
+    _notify_feedbacks_changed()
+
+# Function to close a queue job with a terminal status (SPAM or FAILED)
+@timed_query
+def finish_feedback_job(feedback_id, status, error=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE feedback_queue
+            SET status = %s, locked_until = NULL, last_error = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s;
+        """, (status, error, feedback_id))
+
+        cur.close()
+
+# Function to put a failed queue job back for another attempt after a delay
+@timed_query
+def retry_feedback_job(feedback_id, error, delay_seconds):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE feedback_queue
+            SET status = 'PENDING',
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                locked_until = NULL,
+                last_error = %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s;
+        """, (delay_seconds, error, feedback_id))
+
+        cur.close()
+
+# Function to get the analysis (or queue status) of a feedback by id
+@timed_query
+def get_feedback_status(feedback_id):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(FEEDBACK_DONE_SQL, (feedback_id,))
+        row = cur.fetchone()
+
+        if row is None:
+            cur.execute(FEEDBACK_QUEUE_STATUS_SQL, (feedback_id,))
+            row = cur.fetchone()
+
+        cur.close()
+    return dict(row) if row else None
+
+# Advisory lock key shared by every report scheduler process
+REPORT_LOCK_KEY = 0x414C5552  # "ALUR"
+
+# Hold a session-level advisory lock on a dedicated connection (not a pooled one, so the
+# lock cannot leak to another caller). Yields False when another node already holds it.
+@contextmanager
+def report_lock():
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    cur.execute("""
-        SELECT feature_reason 
-        FROM feedbacks 
-        WHERE feature_code = %s 
-        LIMIT 1;
-    """, (feature_code,))
-    feature_reason_row = cur.fetchone()
-    
-    cur.close()
-    conn.close()
-    return feature_reason_row['feature_reason'] if feature_reason_row else None
\ No newline at end of file
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (REPORT_LOCK_KEY,))
+        acquired = cur.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (REPORT_LOCK_KEY,))
+            cur.close()
+    finally:
+        conn.close()
+
+# Function to get the report runs whose period starts at or after `since`
+@timed_query
+def get_report_runs(since):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            SELECT period_start, period_end, status, attempts, last_error, started_at, finished_at
+            FROM report_runs
+            WHERE period_start >= %s
+            ORDER BY period_start;
+        """, (since,))
+        runs = cur.fetchall()
+
+        cur.close()
+    return runs
+
+# Function to mark a report period as running (creating its row on the first attempt)
+@timed_query
+def start_report_run(period_start, period_end):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO report_runs (period_start, period_end, status, attempts, started_at)
+            VALUES (%s, %s, 'RUNNING', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (period_start, period_end) DO UPDATE
+            SET status = 'RUNNING', attempts = report_runs.attempts + 1,
+                started_at = CURRENT_TIMESTAMP, finished_at = NULL;
+        """, (period_start, period_end))
+
+        cur.close()
+
+# Function to record the outcome of a report run ('DONE' or 'FAILED')
+@timed_query
+def finish_report_run(period_start, period_end, status, error=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE report_runs
+            SET status = %s, last_error = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE period_start = %s AND period_end = %s;
+        """, (status, error, period_start, period_end))
+
+        cur.close()
+
+# Function to get the cached report narrative of a period, if it was built from `version`
+@timed_query
+def get_report_narrative(period_start, period_end, version):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT narrative
+            FROM report_narratives
+            WHERE period_start = %s AND period_end = %s AND version = %s;
+        """, (period_start, period_end, version))
+        row = cur.fetchone()
+
+        cur.close()
+    return row[0] if row else None
+
+# Function to store the report narrative of a period, replacing an outdated one
+@timed_query
+def put_report_narrative(period_start, period_end, version, narrative):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO report_narratives (period_start, period_end, version, narrative)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (period_start, period_end) DO UPDATE
+            SET version = EXCLUDED.version, narrative = EXCLUDED.narrative, created_at = CURRENT_TIMESTAMP;
+        """, (period_start, period_end, version, Json(narrative)))
+
+        cur.close()
+
+# Function to get the feature clusters created after `after_id`
+@timed_query
+def get_feature_clusters(after_id=0):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            SELECT id, canonical_code, embedding, embedder
+            FROM feature_clusters
+            WHERE id > %s
+            ORDER BY id;
+        """, (after_id,))
+        clusters = cur.fetchall()
+
+        cur.close()
+    return clusters
+
+# Function to create a feature cluster; returns the existing id if the canonical code is taken
+@timed_query
+def create_feature_cluster(canonical_code, embedding, embedder):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO feature_clusters (canonical_code, embedding, embedder)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (canonical_code) DO UPDATE SET canonical_code = EXCLUDED.canonical_code
+            RETURNING id;
+        """, (canonical_code, embedding, embedder))
+        cluster_id = cur.fetchone()[0]
+
+        cur.close()
+    return cluster_id
+
+# Function to list the feature codes (with one reason each) of feedbacks without a cluster
+@timed_query
+def get_unclustered_feature_codes():
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            SELECT DISTINCT ON (feature_code) feature_code, feature_reason
+            FROM feedbacks
+            WHERE feature_code IS NOT NULL AND feature_cluster_id IS NULL
+            ORDER BY feature_code, created_at DESC;
+        """)
+        codes = cur.fetchall()
+
+        cur.close()
+    return codes
+
+# Function to attach every unclustered feedback with this feature code to a cluster
+@timed_query
+def set_feature_cluster(feature_code, cluster_id):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE feedbacks SET feature_cluster_id = %s
+            WHERE feature_code = %s AND feature_cluster_id IS NULL;
+        """, (cluster_id, feature_code))
+        updated = cur.rowcount
+
+        cur.close()
+    if updated:
+        _notify_feedbacks_changed()
+    return updated
+
+# Function to remember a text the LLM labeled as spam
+@timed_query
+def insert_spam_sample(text_hash, feedback):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO spam_samples (text_hash, feedback) VALUES (%s, %s)
+            ON CONFLICT (text_hash) DO NOTHING;
+        """, (text_hash, feedback))
+
+        cur.close()
+
+# Function to get labeled texts for the spam pre-filter: (valid feedbacks, spam samples), newest first
+@timed_query
+def get_spam_training_data(limit):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("SELECT feedback FROM feedbacks ORDER BY created_at DESC LIMIT %s;", (limit,))
+        valid = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT feedback FROM spam_samples ORDER BY created_at DESC LIMIT %s;", (limit,))
+        spam = [row[0] for row in cur.fetchall()]
+
+        cur.close()
+    return valid, spam
+
+# Shadow columns filled by a re-analysis run (see src/analysis/reanalysis.py)
+CLEAR_SHADOW_COLUMNS = '''
+    shadow_run_id = NULL, shadow_is_spam = NULL, shadow_sentiment = NULL, shadow_feature_code = NULL,
+    shadow_feature_reason = NULL, shadow_feature_cluster_id = NULL
+'''
+
+# Function to get a re-analysis run by id, or the latest one
+@timed_query
+def get_reanalysis_run(run_id=None):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        if run_id is None:
+            cur.execute("SELECT * FROM reanalysis_runs ORDER BY id DESC LIMIT 1;")
+        else:
+            cur.execute("SELECT * FROM reanalysis_runs WHERE id = %s;", (run_id,))
+        row = cur.fetchone()
+
+        cur.close()
+    return dict(row) if row else None
+
+# Function to start a re-analysis run; fails while another run is RUNNING or ANALYZED
+@timed_query
+def start_reanalysis_run(model, prompt_version):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            INSERT INTO reanalysis_runs (model, prompt_version) VALUES (%s, %s)
+            RETURNING *;
+        """, (model, prompt_version))
+        run = dict(cur.fetchone())
+
+        cur.close()
+    return run
+
+def reanalysis_chunk_query(after, model, prompt_version, limit):
+    # Keyset order (created_at, id), served by idx_feedbacks_created_at_id; rows already labeled
+    # by this model and prompt are skipped
+    conditions = ["(analysis_model, analysis_prompt_version) IS DISTINCT FROM (%s, %s)"]
+    params = [model, prompt_version]
+    if after is not None:
+        conditions.append("(created_at, id) > (%s, %s)")
+        params.extend(after)
+    sql = """
+        SELECT id, feedback, created_at
+        FROM feedbacks
+        WHERE %s
+        ORDER BY created_at, id
+        LIMIT %%s;
+    """ % " AND ".join(conditions)
+    return sql, params + [limit]
+
+# Function to get the next feedbacks to re-analyze after the (created_at, id) checkpoint `after`
+@timed_query
+def get_reanalysis_chunk(after, model, prompt_version, limit):
+    sql, params = reanalysis_chunk_query(after, model, prompt_version, limit)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute(sql, params)
+        rows = [dict(row) for row in cur.fetchall()]
+
+        cur.close()
+    return rows
+
+# Function to store the shadow labels of one chunk and move the run's checkpoint past it, in one
+# transaction, so a resumed run neither skips nor repeats feedbacks. Returns the updated run.
+@timed_query
+def save_reanalysis_chunk(run_id, results, checkpoint, failed):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        if results:
+            execute_values(cur, """
+                UPDATE feedbacks f
+                SET shadow_run_id = v.run_id, shadow_is_spam = v.is_spam, shadow_sentiment = v.sentiment,
+                    shadow_feature_code = v.feature_code, shadow_feature_reason = v.feature_reason,
+                    shadow_feature_cluster_id = v.feature_cluster_id::integer
+                FROM (VALUES %s) AS v (id, created_at, run_id, is_spam, sentiment, feature_code, feature_reason,
+                                       feature_cluster_id)
+                WHERE f.id = v.id AND f.created_at = v.created_at
+            """, [
+                (result['id'], result['created_at'], run_id, result['is_spam'], result.get('sentiment'),
+                 result.get('feature_code'), result.get('feature_reason'), result.get('feature_cluster_id'))
+                for result in results
+            ], page_size=len(results))
+
+        cur.execute("""
+            UPDATE reanalysis_runs
+            SET last_created_at = %s, last_id = %s, analyzed = analyzed + %s, failed = failed + %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'RUNNING'
+            RETURNING *;
+        """, (checkpoint[0], checkpoint[1], len(results), failed, run_id))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Re-analysis run %s is no longer running" % run_id)
+        run = dict(row)
+
+        cur.close()
+    return run
+
+# Function to mark a run whose scan reached the end of feedbacks as ready to swap
+@timed_query
+def finish_reanalysis_scan(run_id):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE reanalysis_runs SET status = 'ANALYZED', updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'RUNNING';
+        """, (run_id,))
+
+        cur.close()
+
+# Function to compare the current labels with a run's shadow labels, grouped for agreement statistics
+@timed_query
+def get_reanalysis_agreement(run_id):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=DictCursor)
+
+        cur.execute("""
+            SELECT sentiment, shadow_sentiment, shadow_is_spam,
+                   feature_code IS NOT DISTINCT FROM shadow_feature_code AS same_feature,
+                   feature_cluster_id IS NOT DISTINCT FROM shadow_feature_cluster_id AS same_cluster,
+                   COUNT(*) AS count
+            FROM feedbacks
+            WHERE shadow_run_id = %s
+            GROUP BY 1, 2, 3, 4, 5;
+        """, (run_id,))
+        rows = [dict(row) for row in cur.fetchall()]
+
+        cur.close()
+    return rows
+
+# Function to replace the current labels with an analyzed run's shadow labels in one transaction
+# (the stats triggers move the counters along). Feedbacks the new analysis calls spam keep their
+# labels. Returns the number of feedbacks relabeled.
+@timed_query
+def swap_reanalysis_run(run_id, stats):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT model, prompt_version FROM reanalysis_runs
+            WHERE id = %s AND status = 'ANALYZED'
+            FOR UPDATE;
+        """, (run_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError("Re-analysis run %s is not ready to swap" % run_id)
+
+        cur.execute("""
+            UPDATE feedbacks
+            SET sentiment = shadow_sentiment, feature_code = shadow_feature_code,
+                feature_reason = shadow_feature_reason, feature_cluster_id = shadow_feature_cluster_id,
+                analysis_model = %%s, analysis_prompt_version = %%s, %s
+            WHERE shadow_run_id = %%s AND NOT shadow_is_spam;
+        """ % CLEAR_SHADOW_COLUMNS, (row[0], row[1], run_id))
+        swapped = cur.rowcount
+        cur.execute("UPDATE feedbacks SET %s WHERE shadow_run_id = %%s;" % CLEAR_SHADOW_COLUMNS, (run_id,))
+        cur.execute("""
+            UPDATE reanalysis_runs
+            SET status = 'SWAPPED', stats = %s, updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s;
+        """, (Json(stats), run_id))
+
+        cur.close()
+    _notify_feedbacks_changed()
+    return swapped
+
+# Function to abandon a run and clear its shadow labels
+@timed_query
+def discard_reanalysis_run(run_id):
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE reanalysis_runs
+            SET status = 'DISCARDED', updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status IN ('RUNNING', 'ANALYZED');
+        """, (run_id,))
+        discarded = cur.rowcount == 1
+        cur.execute("UPDATE feedbacks SET %s WHERE shadow_run_id = %%s;" % CLEAR_SHADOW_COLUMNS, (run_id,))
+
+        cur.close()
+    return discarded
@@ -0,0 +1,421 @@
+import argparse
+import logging
+import psycopg2
+from src.database.stats import create_stats_schema
+from src.database.partitions import create_partitioned_feedbacks, is_partitioned, list_partitions
+from src.utils.config import get_feedbacks_partitioned, get_search_trigram_enabled
+
+# Versioned schema changes. Each migration is applied once, in order, and recorded in
+# schema_migrations; `python -m src.database.migrations` applies the pending ones. Index
+# migrations are built with CREATE INDEX CONCURRENTLY, so they never block writes.
+
+logger = logging.getLogger(__name__)
+
+# Serializes migration runs across processes (pg_advisory_lock key)
+MIGRATION_LOCK_ID = 72119020
+
+SCHEMA_MIGRATIONS = '''
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+
+class Migration:
+    # `apply(cur)` runs in one transaction; `indexes` are (name, table, definition, extension)
+    # tuples built concurrently after it, each skipped when the extension it needs is not installed
+    def __init__(self, version, name, apply=None, indexes=()):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.indexes = indexes
+
+
+# The feedbacks table as the application created it before versioned migrations (idempotent, so
+# existing databases record it without changes). Everything added since has its own migration.
+def create_baseline_schema(cur):
+    # Create feedbacks table; a new database gets it partitioned by month on created_at when enabled
+    if get_feedbacks_partitioned():
+        create_partitioned_feedbacks(cur)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS feedbacks (
+        id TEXT PRIMARY KEY,
+        feedback TEXT NOT NULL,
+        sentiment TEXT CHECK (sentiment IN ('POSITIVO', 'NEGATIVO', 'INCONCLUSIVO')),
+        feature_code TEXT,
+        feature_reason TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Document the feedbacks columns
+    cur.execute('''
+    COMMENT ON TABLE feedbacks IS 'Stores user feedback and sentiment analysis results';
+    COMMENT ON COLUMN feedbacks.id IS 'Unique identifier for the feedback';
+    COMMENT ON COLUMN feedbacks.feedback IS 'The actual feedback text from the user';
+    COMMENT ON COLUMN feedbacks.sentiment IS 'Sentiment analysis result (POSITIVO, NEGATIVO or INCONCLUSIVO)';
+    COMMENT ON COLUMN feedbacks.feature_code IS 'Code representing the main feature request';
+    COMMENT ON COLUMN feedbacks.feature_reason IS 'Description of the feature request';
+    COMMENT ON COLUMN feedbacks.created_at IS 'Timestamp when the feedback was created';
+    ''')
+
+# Create persistent tier of the LLM result cache
+def create_llm_cache(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        value JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )
+    ''')
+
+# Create durable queue for asynchronous ingestion
+def create_feedback_queue(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS feedback_queue (
+        id TEXT PRIMARY KEY,
+        feedback TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'PENDING' CHECK (status IN ('PENDING', 'PROCESSING', 'DONE', 'SPAM', 'FAILED')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        locked_until TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+# Create history of scheduled report runs, one row per reported period
+def create_report_runs(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS report_runs (
+        period_start TIMESTAMP NOT NULL,
+        period_end TIMESTAMP NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('RUNNING', 'DONE', 'FAILED')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        PRIMARY KEY (period_start, period_end)
+    )
+    ''')
+
+# Create canonical feature clusters; feedbacks point at the cluster of their feature_code
+def create_feature_clusters(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS feature_clusters (
+        id SERIAL PRIMARY KEY,
+        canonical_code TEXT NOT NULL UNIQUE,
+        embedding REAL[] NOT NULL,
+        embedder TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cur.execute('ALTER TABLE feedbacks ADD COLUMN IF NOT EXISTS feature_cluster_id INTEGER REFERENCES feature_clusters(id)')
+
+# Create store of texts the LLM labeled as spam (training data for the local pre-filter)
+def create_spam_samples(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS spam_samples (
+        text_hash TEXT PRIMARY KEY,
+        feedback TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+# Full-text search: PostgreSQL computes the Portuguese tsvector on every insert (adding the column
+# rewrites feedbacks once)
+def create_search_columns(cur):
+    cur.execute('''
+    ALTER TABLE feedbacks ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('portuguese', feedback)) STORED
+    ''')
+    if get_search_trigram_enabled():
+        _create_trigram_extension(cur)
+
+# Create cache of the weekly report narrative, one row per reported period. `version` hashes the
+# prompt (figures included), so a period whose figures changed gets a new narrative.
+def create_report_narratives(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS report_narratives (
+        period_start TIMESTAMP NOT NULL,
+        period_end TIMESTAMP NOT NULL,
+        version TEXT NOT NULL,
+        narrative JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (period_start, period_end)
+    )
+    ''')
+
+# Create reservations of feedback submissions, one per feedback id: held while the feedback is analyzed,
+# then released, or kept with the response for replays when the client sent an Idempotency-Key
+def create_feedback_submissions(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS feedback_submissions (
+        feedback_id TEXT PRIMARY KEY,
+        idempotency_key TEXT,
+        request_hash TEXT NOT NULL,
+        status_code INTEGER,
+        response JSONB,
+        locked_until TIMESTAMP,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )
+    ''')
+
+# Record which model and prompt labeled each feedback, and add the shadow columns a re-analysis run
+# (see src/analysis/reanalysis.py) fills before its labels replace the current ones. All of them are
+# nullable without a default, so adding them does not rewrite the table; the shadow columns are not
+# indexed, so filling them keeps updates HOT.
+def create_reanalysis_schema(cur):
+    cur.execute('''
+    ALTER TABLE feedbacks
+        ADD COLUMN IF NOT EXISTS analysis_model TEXT,
+        ADD COLUMN IF NOT EXISTS analysis_prompt_version TEXT,
+        ADD COLUMN IF NOT EXISTS shadow_run_id INTEGER,
+        ADD COLUMN IF NOT EXISTS shadow_is_spam BOOLEAN,
+        ADD COLUMN IF NOT EXISTS shadow_sentiment TEXT,
+        ADD COLUMN IF NOT EXISTS shadow_feature_code TEXT,
+        ADD COLUMN IF NOT EXISTS shadow_feature_reason TEXT,
+        ADD COLUMN IF NOT EXISTS shadow_feature_cluster_id INTEGER;
+
+    CREATE TABLE IF NOT EXISTS reanalysis_runs (
+        id SERIAL PRIMARY KEY,
+        model TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'RUNNING' CHECK (status IN ('RUNNING', 'ANALYZED', 'SWAPPED', 'DISCARDED')),
+        last_created_at TIMESTAMP,
+        last_id TEXT,
+        analyzed INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        stats JSONB,
+        started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+
+    -- The shadow columns hold one run at a time
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_reanalysis_runs_active ON reanalysis_runs ((TRUE))
+    WHERE status IN ('RUNNING', 'ANALYZED')
+    ''')
+
+# Fuzzy search needs pg_trgm; without the privilege to create it, search stays full-text only
+def _create_trigram_extension(cur):
+    cur.execute('SAVEPOINT create_trigram_extension')
+    try:
+        cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except psycopg2.Error as e:
+        cur.execute('ROLLBACK TO SAVEPOINT create_trigram_extension')
+        logger.warning("Fuzzy search disabled, could not set up pg_trgm: %s", e)
+    cur.execute('RELEASE SAVEPOINT create_trigram_extension')
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline schema', apply=create_baseline_schema),
+    Migration(2, 'query indexes', indexes=(
+        ('idx_feedbacks_sentiment', 'feedbacks', '(sentiment)', None),
+        ('idx_feedbacks_created_at', 'feedbacks', '(created_at)', None),
+        ('idx_feedbacks_feature_code', 'feedbacks', '(feature_code)', None),
+        # Keyset pagination walks this index in (created_at, id) order
+        ('idx_feedbacks_created_at_id', 'feedbacks', '(created_at DESC, id DESC)', None),
+    )),
+    Migration(3, 'llm result cache', apply=create_llm_cache, indexes=(
+        ('idx_llm_cache_expires_at', 'llm_cache', '(expires_at)', None),
+    )),
+    Migration(4, 'ingestion queue', apply=create_feedback_queue, indexes=(
+        ('idx_feedback_queue_ready', 'feedback_queue',
+         "(next_attempt_at) WHERE status IN ('PENDING', 'PROCESSING')", None),
+    )),
+    Migration(5, 'feature clusters', apply=create_feature_clusters, indexes=(
+        ('idx_feedbacks_feature_cluster_id', 'feedbacks', '(feature_cluster_id)', None),
+    )),
+    # The counters group clustered feedbacks under the canonical code, so they come after the clusters
+    Migration(6, 'feedback statistics', apply=create_stats_schema),
+    Migration(7, 'report run history', apply=create_report_runs),
+    Migration(8, 'spam samples', apply=create_spam_samples),
+    Migration(9, 'full-text search', apply=create_search_columns, indexes=(
+        ('idx_feedbacks_search_vector', 'feedbacks', 'USING GIN (search_vector)', None),
+        ('idx_feedbacks_feedback_trgm', 'feedbacks', 'USING GIN (feedback gin_trgm_ops)', 'pg_trgm'),
+    )),
+    Migration(10, 'report narrative cache', apply=create_report_narratives),
+    Migration(11, 'feedback submissions', apply=create_feedback_submissions, indexes=(
+        ('idx_feedback_submissions_idempotency_key', 'feedback_submissions', '(idempotency_key)', None),
+        ('idx_feedback_submissions_expires_at', 'feedback_submissions', '(expires_at)', None),
+    )),
+    Migration(12, 'reanalysis shadow columns', apply=create_reanalysis_schema),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _has_extension(cur, extension):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = %s)", (extension,))
+    return cur.fetchone()[0]
+
+def _index_is_valid(cur, name):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND indisvalid)", (name,))
+    return cur.fetchone()[0]
+
+def _drop_invalid_index(cur, name):
+    # A CREATE INDEX CONCURRENTLY that failed leaves an invalid index behind
+    cur.execute('''
+        SELECT EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid)
+    ''', (name,))
+    if cur.fetchone()[0]:
+        cur.execute('DROP INDEX CONCURRENTLY %s' % name)
+
+# Build one index without blocking writes; `cur` must be in autocommit mode. Partitioned tables
+# cannot be indexed concurrently, so each partition is, and the parent index just attaches them.
+def create_index_concurrently(cur, name, table, definition):
+    if table == 'feedbacks' and is_partitioned(cur):
+        if _index_is_valid(cur, name):
+            return
+        cur.execute('CREATE INDEX IF NOT EXISTS %s ON ONLY %s %s' % (name, table, definition))
+        for partition in list_partitions(cur) + ['feedbacks_default']:
+            partition_index = ('%s_%s' % (partition, name))[:63]
+            _drop_invalid_index(cur, partition_index)
+            cur.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s %s' % (partition_index, partition, definition))
+            cur.execute('ALTER INDEX %s ATTACH PARTITION %s' % (name, partition_index))
+        return
+    _drop_invalid_index(cur, name)
+    cur.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s %s' % (name, table, definition))
+
+def _create_indexes(cur, migration, concurrently):
+    for name, table, definition, extension in migration.indexes:
+        if extension and not _has_extension(cur, extension):
+            logger.info("Skipping index %s: extension %s is not installed", name, extension)
+            continue
+        if concurrently:
+            create_index_concurrently(cur, name, table, definition)
+        else:
+            cur.execute('CREATE INDEX IF NOT EXISTS %s ON %s %s' % (name, table, definition))
+
+# Indexes of the migrations up to `version` that were skipped because their extension was not
+# installed (or whose build failed), as (version, name, extension) tuples
+def skipped_indexes(cur, version):
+    skipped = []
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            break
+        for name, _, _, extension in migration.indexes:
+            if extension and not _index_is_valid(cur, name):
+                skipped.append((migration.version, name, extension))
+    return skipped
+
+# Build the skipped indexes whose extension has been installed since (e.g. CREATE EXTENSION pg_trgm
+# by a superuser); the migration that declared them is already recorded, so it will not run again
+def _retry_skipped_indexes(cur, version):
+    tables = {name: (table, definition) for migration in MIGRATIONS for name, table, definition, _ in migration.indexes}
+    for migration_version, name, extension in skipped_indexes(cur, version):
+        if _has_extension(cur, extension):
+            logger.info("Building index %s skipped by migration %d", name, migration_version)
+            create_index_concurrently(cur, name, *tables[name])
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+def schema_version(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+    return cur.fetchone()[0]
+
+# Versions not applied yet, oldest first
+def pending_migrations(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return [migration.version for migration in MIGRATIONS]
+    cur.execute('''
+        SELECT v FROM unnest(%s::integer[]) AS v
+        WHERE v NOT IN (SELECT version FROM schema_migrations)
+        ORDER BY v
+    ''', ([migration.version for migration in MIGRATIONS],))
+    return [row[0] for row in cur.fetchall()]
+
+# Apply the pending migrations up to `target` on a dedicated connection (its autocommit mode is
+# changed). Returns the versions applied.
+def apply_migrations(conn, target=None):
+    target = LATEST_VERSION if target is None else target
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        cur.execute(SCHEMA_MIGRATIONS)
+        current = schema_version(cur)
+        _retry_skipped_indexes(cur, min(current, target))
+        applied = []
+        for migration in MIGRATIONS:
+            if migration.version <= current or migration.version > target:
+                continue
+            logger.info("Applying migration %d: %s", migration.version, migration.name)
+            if migration.apply:
+                conn.autocommit = False
+                migration.apply(cur)
+                conn.commit()
+                conn.autocommit = True
+            # Recorded once its indexes are built; if one fails, the (idempotent) migration runs again
+            if migration.indexes:
+                _create_indexes(cur, migration, concurrently=True)
+            cur.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                        (migration.version, migration.name))
+            applied.append(migration.version)
+        return applied
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+            conn.autocommit = True
+        raise
+    finally:
+        cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        cur.close()
+
+# Run every migration's changes inside the caller's transaction (indexes built normally), e.g. to
+# recreate the schema around a table being converted to partitions
+def apply_all_in_transaction(cur):
+    for migration in MIGRATIONS:
+        if migration.apply:
+            migration.apply(cur)
+        if migration.indexes:
+            _create_indexes(cur, migration, concurrently=False)
+
+
+def main(argv=None):
+    from src.database.database import get_db_connection, init_db
+    from src.utils.config import load_config
+
+    parser = argparse.ArgumentParser(description='Apply database schema migrations')
+    parser.add_argument('command', nargs='?', choices=('migrate', 'status'), default='migrate')
+    parser.add_argument('--target', type=int, help='stop at this version')
+    args = parser.parse_args(argv)
+
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'status':
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            version = schema_version(cur)
+            skipped = skipped_indexes(cur, version)
+        finally:
+            conn.close()
+        pending = [m for m in MIGRATIONS if m.version > version]
+        print('Schema version %d (latest %d)' % (version, LATEST_VERSION))
+        for migration in pending:
+            print('  pending %d: %s' % (migration.version, migration.name))
+        for migration_version, name, extension in skipped:
+            print('  skipped index %s (migration %d, needs extension %s)' % (name, migration_version, extension))
+        return
+
+    applied = init_db(target=args.target)
+    print('Applied migrations: %s' % (', '.join(map(str, applied)) or 'none'))
+
+
+if __name__ == '__main__':
+    # python -m src.database.migrations [migrate|status] [--target N]
+    main()
@@ -0,0 +1,229 @@
+import gzip
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from src.database.stats import subtract_stats
+
+# Monthly range partitions of `feedbacks` on created_at. A partitioned table cannot have a
+# primary key on id alone, so ids are registered in feedback_ids by a trigger: inserting an
+# existing id fails with a unique violation, exactly like the primary key of the plain table.
+# Rows outside every monthly partition land in feedbacks_default.
+
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = 'feedbacks_unpartitioned'
+
+PARTITIONED_FEEDBACKS = '''
+CREATE TABLE IF NOT EXISTS feedbacks (
+    id TEXT NOT NULL,
+    feedback TEXT NOT NULL,
+    sentiment TEXT CHECK (sentiment IN ('POSITIVO', 'NEGATIVO', 'INCONCLUSIVO')),
+    feature_code TEXT,
+    feature_reason TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS feedbacks_default PARTITION OF feedbacks DEFAULT;
+
+CREATE TABLE IF NOT EXISTS feedback_ids (
+    id TEXT PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION feedback_ids_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO feedback_ids (id, created_at) VALUES (NEW.id, NEW.created_at);
+        RETURN NEW;
+    END IF;
+    DELETE FROM feedback_ids WHERE id = OLD.id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS feedback_ids_on_insert ON feedbacks;
+CREATE TRIGGER feedback_ids_on_insert BEFORE INSERT ON feedbacks
+FOR EACH ROW EXECUTE FUNCTION feedback_ids_sync();
+
+DROP TRIGGER IF EXISTS feedback_ids_on_delete ON feedbacks;
+CREATE TRIGGER feedback_ids_on_delete AFTER DELETE ON feedbacks
+FOR EACH ROW EXECUTE FUNCTION feedback_ids_sync();
+'''
+
+# Columns copied when rows move between tables (search_vector is generated; the shadow columns of
+# an unfinished re-analysis are not kept, so moved rows keep their current labels)
+COLUMNS = ('id, feedback, sentiment, feature_code, feature_reason, created_at, feature_cluster_id, analysis_model, '
+           'analysis_prompt_version')
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return 'feedbacks_p%04d_%02d' % (month.year, month.month)
+
+def partition_month(name):
+    return datetime.strptime(name, 'feedbacks_p%Y_%m')
+
+# First days of the months from `first` (inclusive) to `ahead` months after `now`
+def partition_months(now, ahead, first=None):
+    month = month_start(first or now)
+    last = add_months(month_start(now), ahead)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+# Partitions entirely older than the retention window, oldest first
+def expired_partitions(names, now, retention_months):
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(now), -retention_months)
+    return sorted(name for name in names if add_months(partition_month(name), 1) <= cutoff)
+
+
+def _table_kind(cur, table):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def is_partitioned(cur):
+    return _table_kind(cur, 'feedbacks') == 'p'
+
+# Create the partitioned layout (idempotent). An existing plain feedbacks table is kept as is,
+# unless `migrate` is set: then it is renamed to LEGACY_TABLE, to be copied by copy_legacy_feedbacks.
+def create_partitioned_feedbacks(cur, migrate=False):
+    if _table_kind(cur, 'feedbacks') == 'r':
+        if not migrate:
+            logger.warning("feedbacks is not partitioned; run python -m src.database.partitions migrate")
+            return False
+        cur.execute('LOCK TABLE feedbacks IN ACCESS EXCLUSIVE MODE')
+        cur.execute('ALTER TABLE feedbacks RENAME TO %s' % LEGACY_TABLE)
+        # Free the index names (the primary key constraint follows its index) for the new table
+        cur.execute("SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass", (LEGACY_TABLE,))
+        for (index,) in cur.fetchall():
+            cur.execute('ALTER INDEX %s RENAME TO %s' % (index, (LEGACY_TABLE + '_' + index)[:63]))
+    cur.execute(PARTITIONED_FEEDBACKS)
+    return True
+
+def _partition_exists(cur, name):
+    return _table_kind(cur, name) is not None
+
+# Create the monthly partition starting at `month`. Rows already in the default partition for
+# that month are moved into it; no trigger fires, so counters and the id registry stay as they are.
+def create_partition(cur, month):
+    name = partition_name(month)
+    if _partition_exists(cur, name):
+        return False
+    bounds = (month, add_months(month, 1))
+
+    cur.execute("SELECT EXISTS (SELECT 1 FROM feedbacks_default WHERE created_at >= %s AND created_at < %s)", bounds)
+    if not cur.fetchone()[0]:
+        cur.execute("CREATE TABLE %s PARTITION OF feedbacks FOR VALUES FROM (%%s) TO (%%s)" % name, bounds)
+        return True
+
+    cur.execute('ALTER TABLE feedbacks DETACH PARTITION feedbacks_default')
+    cur.execute('CREATE TABLE %s (LIKE feedbacks INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)' % name)
+    cur.execute('''
+        WITH moved AS (
+            DELETE FROM feedbacks_default WHERE created_at >= %%s AND created_at < %%s
+            RETURNING %(columns)s
+        )
+        INSERT INTO %(name)s (%(columns)s) SELECT %(columns)s FROM moved
+    ''' % {'name': name, 'columns': COLUMNS}, bounds)
+    cur.execute("ALTER TABLE feedbacks ATTACH PARTITION %s FOR VALUES FROM (%%s) TO (%%s)" % name, bounds)
+    cur.execute('ALTER TABLE feedbacks ATTACH PARTITION feedbacks_default DEFAULT')
+    return True
+
+# Make sure partitions exist from the current month (or the oldest legacy row) to `ahead` months out
+def create_partitions(cur, ahead, now=None):
+    first = None
+    if _table_kind(cur, LEGACY_TABLE) is not None:
+        cur.execute('SELECT MIN(created_at) FROM %s' % LEGACY_TABLE)
+        first = cur.fetchone()[0]
+    created = [month for month in partition_months(now or datetime.now(), ahead, first) if create_partition(cur, month)]
+    return [partition_name(month) for month in created]
+
+# Copy the rows of a table renamed by create_partitioned_feedbacks, then drop it. The counters are
+# recounted by the insert trigger and the ids registered by feedback_ids_on_insert.
+def copy_legacy_feedbacks(cur):
+    if _table_kind(cur, LEGACY_TABLE) is None:
+        return 0
+    cur.execute('TRUNCATE feedback_stats_sentiment, feedback_stats_feature, feedback_stats_daily')
+    cur.execute('''
+        INSERT INTO feedbacks (%(columns)s)
+        SELECT id, feedback, sentiment, feature_code, feature_reason, COALESCE(created_at, CURRENT_TIMESTAMP),
+               feature_cluster_id, analysis_model, analysis_prompt_version
+        FROM %(legacy)s
+    ''' % {'columns': COLUMNS, 'legacy': LEGACY_TABLE})
+    copied = cur.rowcount
+    cur.execute('DROP TABLE %s' % LEGACY_TABLE)
+    return copied
+
+def list_partitions(cur):
+    cur.execute('''
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'feedbacks'::regclass AND c.relname LIKE 'feedbacks\\_p%'
+    ''')
+    return [row[0] for row in cur.fetchall()]
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+# Write rows (dicts) as gzipped JSON lines; the file only appears once it is complete
+def write_archive(rows, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = path + '.partial'
+    count = 0
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(row, default=_json_value, ensure_ascii=False) + '\n')
+            count += 1
+    os.replace(partial, path)
+    return count
+
+# Archive one partition to `archive_dir` and drop it. Runs in the caller's transaction; the
+# counters lose its rows, while its ids stay registered so they are never reused.
+def archive_partition(cur, name, archive_dir):
+    cur.execute('LOCK TABLE %s IN SHARE MODE' % name)
+    # Server-side cursor: the partition is streamed to the file, not loaded in memory
+    rows = cur.connection.cursor('archive_%s' % name)
+    rows.itersize = 10000
+    rows.execute('SELECT %s FROM %s ORDER BY created_at, id' % (COLUMNS, name))
+    path = os.path.join(archive_dir, '%s.jsonl.gz' % name)
+    count = write_archive((dict(zip(COLUMNS.split(', '), row)) for row in rows), path)
+    rows.close()
+
+    subtract_stats(cur, name)
+    cur.execute('ALTER TABLE feedbacks DETACH PARTITION %s' % name)
+    cur.execute('DROP TABLE %s' % name)
+    logger.info("Archived %d feedbacks from %s to %s", count, name, path)
+    return path
+
+
+if __name__ == '__main__':
+    # python -m src.database.partitions migrate|maintain
+    from src.database.database import init_db, convert_feedbacks_to_partitions, maintain_feedback_partitions
+    from src.utils.config import load_config, get_feedbacks_partitioned
+
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1:]
+    if command == ['migrate']:
+        if not get_feedbacks_partitioned():
+            sys.exit('Set FEEDBACKS_PARTITIONED=true before migrating')
+        init_db()
+        print('feedbacks is partitioned by month (%d rows copied)' % convert_feedbacks_to_partitions())
+    elif command == ['maintain']:
+        created, archived = maintain_feedback_partitions()
+        print('Created %d partitions, archived %d' % (len(created), len(archived)))
+    else:
+        sys.exit('usage: python -m src.database.partitions migrate|maintain')
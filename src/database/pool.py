@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+# Thread-safe pool of PostgreSQL connections
+class ConnectionPool:
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=30.0, ping_interval=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (minconn, maxconn))
+
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._in_use = set()
+        self._pending = 0  # slots reserved by threads currently opening a connection
+        self._closed = False
+        self.pid = os.getpid()
+
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    # Check out a connection, waiting up to `timeout` seconds when the pool is saturated
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    # Keep its slot reserved while it is checked outside the lock
+                    self._pending += 1
+                    break
+
+                if self.size < self.maxconn:
+                    conn, last_used = None, None
+                    # Reserve the slot before connecting outside the lock
+                    self._pending += 1
+                    break
+
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout("Timed out after %.1fs waiting for a database connection" % timeout)
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            # Give the slot back and wake a waiter, which may connect in its place
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify()
+            raise
+
+        wait = time.monotonic() - start
+        with self._cond:
+            # The reserved slot becomes the checked-out connection in one step
+            self._pending -= 1
+            self._in_use.add(conn)
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    # Return a connection to the pool, resetting any open transaction
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or self._closed or len(self._idle) >= self.maxconn:
+                self._discarded += 1 if discard else 0
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    # Check out a connection for the duration of a `with` block.
+    # Commits on success, rolls back on error and always returns the connection.
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            broken = bool(conn.closed)
+            if not broken:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.putconn(conn, discard=broken)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            in_use = len(self._in_use)
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self.size,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'saturation': round(in_use / self.maxconn, 3),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_time_total': round(self._total_wait, 6),
+                'wait_time_avg': round(self._total_wait / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_time_max': round(self._max_wait, 6),
+            }
+
+    # Cheap liveness check; only pings connections that sat idle for a while
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,115 @@
+import sys
+
+# Running counters kept in step with `feedbacks` by statement-level triggers.
+# NULL sentiments are stored as '' because they are part of the primary key.
+STATS_TABLES = '''
+CREATE TABLE IF NOT EXISTS feedback_stats_sentiment (
+    sentiment TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS feedback_stats_feature (
+    feature_code TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_stats_feature_count ON feedback_stats_feature(count DESC);
+
+CREATE TABLE IF NOT EXISTS feedback_stats_daily (
+    day DATE NOT NULL,
+    sentiment TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, sentiment)
+);
+'''
+
+# Apply the per-row deltas produced by `source` (columns: sentiment, feature_code, created_at, delta)
+_APPLY_DELTAS = '''
+    INSERT INTO feedback_stats_sentiment (sentiment, count)
+    SELECT COALESCE(sentiment, ''), SUM(delta) FROM ({source}) d GROUP BY 1 HAVING SUM(delta) <> 0
+    ON CONFLICT (sentiment) DO UPDATE SET count = feedback_stats_sentiment.count + EXCLUDED.count;
+
+    INSERT INTO feedback_stats_feature (feature_code, count)
+    SELECT feature_code, SUM(delta) FROM ({source}) d WHERE feature_code IS NOT NULL GROUP BY 1 HAVING SUM(delta) <> 0
+    ON CONFLICT (feature_code) DO UPDATE SET count = feedback_stats_feature.count + EXCLUDED.count;
+
+    INSERT INTO feedback_stats_daily (day, sentiment, count)
+    SELECT created_at::date, COALESCE(sentiment, ''), SUM(delta) FROM ({source}) d GROUP BY 1, 2 HAVING SUM(delta) <> 0
+    ON CONFLICT (day, sentiment) DO UPDATE SET count = feedback_stats_daily.count + EXCLUDED.count;
+'''
+
+# Clustered feedbacks are counted under their cluster's canonical code (see src/analysis/features.py)
+FEATURE_KEY = "COALESCE((SELECT canonical_code FROM feature_clusters c WHERE c.id = r.feature_cluster_id), r.feature_code)"
+
+_NEW_ROWS = "SELECT r.sentiment, %s AS feature_code, r.created_at, 1 AS delta FROM new_rows r" % FEATURE_KEY
+_OLD_ROWS = "SELECT r.sentiment, %s AS feature_code, r.created_at, -1 AS delta FROM old_rows r" % FEATURE_KEY
+
+# Transition tables only allow one event per trigger, hence one function per operation
+_TRIGGERS = {
+    'INSERT': ("REFERENCING NEW TABLE AS new_rows", _NEW_ROWS),
+    'DELETE': ("REFERENCING OLD TABLE AS old_rows", _OLD_ROWS),
+    'UPDATE': ("REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows", _OLD_ROWS + " UNION ALL " + _NEW_ROWS),
+}
+
+# Create the stats tables and triggers (idempotent); `cur` belongs to the caller's transaction
+def create_stats_schema(cur):
+    cur.execute(STATS_TABLES)
+
+    for operation, (referencing, source) in _TRIGGERS.items():
+        name = 'feedback_stats_on_%s' % operation.lower()
+        cur.execute('''
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+        %s
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''' % (name, _APPLY_DELTAS.format(source=source)))
+        cur.execute('DROP TRIGGER IF EXISTS %s ON feedbacks' % name)
+        cur.execute('''
+        CREATE TRIGGER %s AFTER %s ON feedbacks
+        %s
+        FOR EACH STATEMENT EXECUTE FUNCTION %s()
+        ''' % (name, operation, referencing, name))
+
+    # Backfill counters the first time they are created over existing data
+    cur.execute('''
+        SELECT NOT EXISTS (SELECT 1 FROM feedback_stats_sentiment)
+           AND EXISTS (SELECT 1 FROM feedbacks)
+    ''')
+    if cur.fetchone()[0]:
+        rebuild_stats(cur)
+
+# Take the rows of `table` (e.g. a partition about to be detached) out of the counters
+def subtract_stats(cur, table):
+    source = "SELECT r.sentiment, %s AS feature_code, r.created_at, -1 AS delta FROM %s r" % (FEATURE_KEY, table)
+    cur.execute(_APPLY_DELTAS.format(source=source))
+
+# Recompute every counter from scratch inside the caller's transaction
+def rebuild_stats(cur):
+    # Block concurrent writes so the recount matches the table exactly
+    cur.execute('LOCK TABLE feedbacks IN SHARE MODE')
+    cur.execute('TRUNCATE feedback_stats_sentiment, feedback_stats_feature, feedback_stats_daily')
+    cur.execute('''
+        INSERT INTO feedback_stats_sentiment (sentiment, count)
+        SELECT COALESCE(sentiment, ''), COUNT(*) FROM feedbacks GROUP BY 1
+    ''')
+    cur.execute('''
+        INSERT INTO feedback_stats_feature (feature_code, count)
+        SELECT %s, COUNT(*) FROM feedbacks r WHERE r.feature_code IS NOT NULL GROUP BY 1
+    ''' % FEATURE_KEY)
+    cur.execute('''
+        INSERT INTO feedback_stats_daily (day, sentiment, count)
+        SELECT created_at::date, COALESCE(sentiment, ''), COUNT(*) FROM feedbacks GROUP BY 1, 2
+    ''')
+
+
+if __name__ == '__main__':
+    # python -m src.database.stats rebuild
+    from src.database.database import rebuild_feedback_stats
+    from src.utils.config import load_config
+
+    load_config()
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python -m src.database.stats rebuild')
+    rebuild_feedback_stats()
+    print('Feedback statistics rebuilt')
@@ -0,0 +1,197 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from src.analysis.analysis import analysis_provenance, analyze_feedback_batch
+from src.analysis.features import assign_feature_cluster
+from src.database.database import get_existing_feedback_ids, insert_feedbacks_bulk
+from src.utils.config import (
+    load_config, get_bulk_concurrency, get_bulk_batch_size, get_bulk_chunk_size, get_bulk_rate_limit
+)
+from src.utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+INSERTED = 'inserted'
+DUPLICATE = 'duplicate'
+SPAM = 'spam'
+FAILED = 'failed'
+
+
+# Stream {'id', 'feedback'} items from a JSONL or CSV text stream
+def read_feedback_items(stream, fmt='jsonl'):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {'_error': 'Invalid JSON on line %d' % line_number}
+
+# Guess the input format from a file name or content type
+def detect_format(name_or_type):
+    return 'csv' if name_or_type and 'csv' in name_or_type.lower() else 'jsonl'
+
+
+class BulkImporter:
+    def __init__(self, concurrency=None, batch_size=None, chunk_size=None, rate_limit=None):
+        self.concurrency = concurrency or get_bulk_concurrency()
+        self.batch_size = batch_size or get_bulk_batch_size()
+        self.chunk_size = chunk_size or get_bulk_chunk_size()
+        self.limiter = TokenBucket.per_minute(rate_limit or get_bulk_rate_limit(), capacity=self.concurrency)
+
+    # Import every item, yielding one {'id', 'status'[, 'error']} result per item in input order
+    def run(self, items):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            items = iter(items)
+            while True:
+                chunk = list(itertools.islice(items, self.chunk_size))
+                if not chunk:
+                    break
+                for result in self._import_chunk(chunk, executor):
+                    yield result
+
+    def _import_chunk(self, chunk, executor):
+        results = [None] * len(chunk)
+        ids = [None] * len(chunk)
+        to_check = {}
+
+        # Validate and drop repeated ids inside the chunk before anything else
+        for index, item in enumerate(chunk):
+            feedback_id = item.get('id') if isinstance(item, dict) else None
+            feedback = item.get('feedback') if isinstance(item, dict) else None
+            if isinstance(feedback_id, int) and not isinstance(feedback_id, bool):
+                # Ids are text; JSON numbers are stored as their digits, like the same id sent as a string
+                feedback_id = str(feedback_id)
+            ids[index] = feedback_id
+            if isinstance(item, dict) and item.get('_error'):
+                results[index] = {'id': None, 'status': FAILED, 'error': item['_error']}
+            elif not feedback_id or not feedback:
+                results[index] = {'id': feedback_id, 'status': FAILED, 'error': 'Missing id or feedback'}
+            elif not isinstance(feedback_id, str) or not isinstance(feedback, str):
+                results[index] = {'id': feedback_id, 'status': FAILED, 'error': 'id and feedback must be strings'}
+            elif feedback_id in to_check:
+                results[index] = {'id': feedback_id, 'status': DUPLICATE}
+            else:
+                to_check[feedback_id] = index
+
+        # Skip ids that are already stored, so they cost no LLM calls
+        existing = get_existing_feedback_ids(list(to_check))
+        pending = []
+        for feedback_id, index in to_check.items():
+            if feedback_id in existing:
+                results[index] = {'id': feedback_id, 'status': DUPLICATE}
+            else:
+                pending.append(index)
+
+        batches = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+        analyses = executor.map(lambda batch: self._analyze_batch([chunk[i]['feedback'] for i in batch]), batches)
+
+        rows = []
+        # Batches always use the combined prompt
+        provenance = analysis_provenance('combined')
+        for batch, analysis in zip(batches, analyses):
+            for index, result in zip(batch, analysis):
+                feedback_id = ids[index]
+                if isinstance(result, Exception):
+                    results[index] = {'id': feedback_id, 'status': FAILED, 'error': str(result)}
+                elif result['is_spam']:
+                    results[index] = {'id': feedback_id, 'status': SPAM}
+                else:
+                    rows.append({
+                        'id': feedback_id,
+                        'feedback': chunk[index]['feedback'],
+                        'sentiment': result['sentiment'],
+                        'feature_code': result.get('feature_code'),
+                        'feature_reason': result.get('feature_reason'),
+                        'feature_cluster_id': assign_feature_cluster(result.get('feature_code'), result.get('feature_reason')),
+                        **provenance
+                    })
+                    results[index] = {'id': feedback_id, 'status': INSERTED}
+
+        try:
+            inserted = insert_feedbacks_bulk(rows)
+            for row in rows:
+                if row['id'] not in inserted:
+                    results[to_check[row['id']]] = {'id': row['id'], 'status': DUPLICATE}
+        except Exception as e:
+            logger.exception("Bulk insert of %d feedbacks failed", len(rows))
+            for row in rows:
+                results[to_check[row['id']]] = {'id': row['id'], 'status': FAILED, 'error': str(e)}
+
+        return results
+
+    def _analyze_batch(self, feedbacks):
+        self.limiter.acquire()
+        try:
+            return analyze_feedback_batch(feedbacks)
+        except Exception as e:
+            logger.warning("Batch analysis of %d feedbacks failed: %s", len(feedbacks), e)
+            return [e] * len(feedbacks)
+
+
+# Count results per status
+def summarize(results):
+    summary = {INSERTED: 0, DUPLICATE: 0, SPAM: 0, FAILED: 0}
+    for result in results:
+        summary[result['status']] += 1
+    summary['total'] = sum(summary.values())
+    return summary
+
+# JSONL report sent while the import runs: one line per item, then {"summary": {...}}. Once the first
+# line is out the status code is sent, so a failure ends the report with an "error" line instead.
+def stream_report(results):
+    summary = summarize([])
+    try:
+        for result in results:
+            summary[result['status']] += 1
+            summary['total'] += 1
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+    except Exception as e:
+        logger.exception("Bulk import stopped after %d items", summary['total'])
+        yield json.dumps({'error': str(e), 'summary': summary}) + '\n'
+        return
+    yield json.dumps({'summary': summary}) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import feedbacks from a JSONL or CSV file')
+    parser.add_argument('input', help='path to a .jsonl or .csv file, or - for stdin')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from file extension)')
+    parser.add_argument('--report', help='write the per-item JSONL report here instead of stdout')
+    parser.add_argument('--concurrency', type=int, help='parallel LLM calls')
+    parser.add_argument('--batch-size', type=int, help='feedbacks per LLM prompt')
+    parser.add_argument('--chunk-size', type=int, help='rows per database transaction')
+    parser.add_argument('--rate-limit', type=float, help='LLM requests per minute')
+    args = parser.parse_args(argv)
+
+    load_config()
+    fmt = args.format or detect_format(args.input)
+    source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8') if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    report = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+
+    importer = BulkImporter(args.concurrency, args.batch_size, args.chunk_size, args.rate_limit)
+    summary = summarize([])
+    with source:
+        for result in importer.run(read_feedback_items(source, fmt)):
+            summary[result['status']] += 1
+            summary['total'] += 1
+            report.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    if report is not sys.stdout:
+        report.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from src.database.database import reserve_submission, finish_submission
+from src.utils.api_helpers import FEEDBACK_OUTCOMES
+from src.utils.config import get_submission_lease_seconds, get_submission_wait_seconds, get_idempotency_key_ttl
+
+# At most one analysis per feedback id: POST /feedbacks reserves the id in feedback_submissions
+# before calling the LLM. A stored id is answered right away, a duplicate that arrives while the
+# first submission runs waits for its outcome, and a retry with the same Idempotency-Key gets the
+# first response back.
+
+logger = logging.getLogger(__name__)
+
+RUN = 'run'
+WAIT = 'wait'
+
+# Seconds between reservation checks while another submission of the same id runs
+POLL_INTERVAL = 0.25
+
+# Responses kept for Idempotency-Key replays; failures worth retrying (500, 503) release the id
+REPLAYABLE_STATUSES = (201, 202, 400, 409)
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+# The Idempotency-Key header, or None; raises ValueError when it is unusable
+def parse_idempotency_key(headers):
+    key = headers.get('Idempotency-Key')
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError("Idempotency-Key must have 1 to %d characters" % MAX_IDEMPOTENCY_KEY_LENGTH)
+    return key
+
+# Identifies the payload sent with an Idempotency-Key; reservations without one match any payload
+def request_hash(feedback_data, idempotency_key=None):
+    if idempotency_key is None:
+        return ''
+    return hashlib.sha256(json.dumps(feedback_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def duplicate_response():
+    FEEDBACK_OUTCOMES.inc(('duplicate',))
+    return {'error': 'Feedback with this ID already exists'}, 409, {}
+
+def key_reused_response():
+    FEEDBACK_OUTCOMES.inc(('invalid',))
+    return {'error': 'Idempotency-Key was already used with a different request'}, 422, {}
+
+def in_progress_response():
+    FEEDBACK_OUTCOMES.inc(('in_progress',))
+    return {'error': 'Feedback with this ID is still being processed'}, 409, {'Retry-After': '1'}
+
+# What to do with a reservation: RUN the submission, WAIT for the one in progress, or answer
+# with the returned (body, status, headers)
+def reservation_outcome(reservation, idempotency_key, expected_hash):
+    if reservation['reused']:
+        return key_reused_response()
+    if reservation['claimed']:
+        return RUN
+    if reservation['reserved']:
+        if reservation['in_progress']:
+            return WAIT
+        if reservation['status_code'] is not None and reservation['idempotency_key'] == idempotency_key:
+            if reservation['request_hash'] != expected_hash:
+                return key_reused_response()
+            FEEDBACK_OUTCOMES.inc(('replayed',))
+            response = reservation['response']
+            return response['body'], reservation['status_code'], dict(response['headers'], **{'Idempotent-Replayed': 'true'})
+    if reservation['stored']:
+        return duplicate_response()
+    # Reserved by a submission that committed after the query started
+    return WAIT
+
+# What the reservation keeps once the submission ran: the response when it may be replayed
+def kept_response(idempotency_key, body, status_code, headers):
+    if idempotency_key is None or status_code not in REPLAYABLE_STATUSES:
+        return None
+    return {'body': body, 'headers': dict(headers)}
+
+def _reserve_args(feedback_data, idempotency_key, expected_hash):
+    return (feedback_data['id'], idempotency_key, expected_hash, get_submission_lease_seconds(),
+            get_idempotency_key_ttl())
+
+# Run `submit()` -> (body, status, headers) unless the feedback id is stored or being submitted
+# already; the outcome of a submission with an Idempotency-Key is kept for its retries
+def submit_once(feedback_data, idempotency_key, submit):
+    expected_hash = request_hash(feedback_data, idempotency_key)
+    deadline = time.monotonic() + get_submission_wait_seconds()
+    while True:
+        reservation = reserve_submission(*_reserve_args(feedback_data, idempotency_key, expected_hash))
+        outcome = reservation_outcome(reservation, idempotency_key, expected_hash)
+        if outcome is RUN:
+            break
+        if outcome is not WAIT:
+            return outcome
+        if time.monotonic() >= deadline:
+            return in_progress_response()
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        body, status_code, headers = submit()
+    except BaseException:
+        _release(feedback_data['id'])
+        raise
+    finish_submission(feedback_data['id'], status_code, kept_response(idempotency_key, body, status_code, headers))
+    return body, status_code, headers
+
+# submit_once() for the ASGI app: `submit` is a coroutine function, `reserve` and `finish` the
+# async counterparts of reserve_submission and finish_submission
+async def asubmit_once(feedback_data, idempotency_key, submit, reserve, finish):
+    expected_hash = request_hash(feedback_data, idempotency_key)
+    deadline = time.monotonic() + get_submission_wait_seconds()
+    while True:
+        reservation = await reserve(*_reserve_args(feedback_data, idempotency_key, expected_hash))
+        outcome = reservation_outcome(reservation, idempotency_key, expected_hash)
+        if outcome is RUN:
+            break
+        if outcome is not WAIT:
+            return outcome
+        if time.monotonic() >= deadline:
+            return in_progress_response()
+        await asyncio.sleep(POLL_INTERVAL)
+
+    try:
+        body, status_code, headers = await submit()
+    except BaseException:
+        await finish(feedback_data['id'])
+        raise
+    await finish(feedback_data['id'], status_code, kept_response(idempotency_key, body, status_code, headers))
+    return body, status_code, headers
+
+# Give the id back after a failed submission; if this fails too, the lease expires on its own
+def _release(feedback_id):
+    try:
+        finish_submission(feedback_id)
+    except Exception:
+        logger.exception("Could not release the reservation of feedback %s", feedback_id)
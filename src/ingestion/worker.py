@@ -0,0 +1,138 @@
+import logging
+import random
+import threading
+import psycopg2
+from src.analysis.analysis import analysis_provenance, analyze_feedback
+from src.analysis.features import assign_feature_cluster
+from src.database.database import (
+    claim_feedback_jobs, complete_feedback_job, finish_feedback_job, retry_feedback_job
+)
+from src.utils.config import (
+    load_config, get_ingestion_workers, get_ingestion_max_attempts, get_ingestion_backoff_base,
+    get_ingestion_backoff_max, get_ingestion_lease_seconds, get_ingestion_poll_interval
+)
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Exponential backoff with full jitter: attempt 1 waits up to base, attempt 2 up to 2*base, ...
+def backoff_delay(attempts, base=None, cap=None):
+    base = get_ingestion_backoff_base() if base is None else base
+    cap = get_ingestion_backoff_max() if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** (attempts - 1))))
+
+# Analyze one claimed queue job and record the outcome
+def process_feedback_job(job):
+    feedback_id, feedback, attempts = job['id'], job['feedback'], job['attempts']
+
+    try:
+        is_valid, analysis_result = analyze_feedback(feedback, feedback_id)
+        if not is_valid:
+            finish_feedback_job(feedback_id, 'SPAM')
+            return 'SPAM'
+
+        feature_code, feature_reason = analysis_result.get('feature_code'), analysis_result.get('feature_reason')
+        complete_feedback_job({
+            'id': feedback_id,
+            'feedback': feedback,
+            'sentiment': analysis_result['sentiment'],
+            'feature_code': feature_code,
+            'feature_reason': feature_reason,
+            'feature_cluster_id': assign_feature_cluster(feature_code, feature_reason),
+            **analysis_provenance()
+        })
+        return 'DONE'
+    except psycopg2.IntegrityError:
+        finish_feedback_job(feedback_id, 'FAILED', 'Feedback with this ID already exists')
+        return 'FAILED'
+    except Exception as e:
+        if attempts >= get_ingestion_max_attempts():
+            logger.exception("Giving up on feedback %s after %d attempts", feedback_id, attempts)
+            finish_feedback_job(feedback_id, 'FAILED', str(e))
+            return 'FAILED'
+
+        logger.warning("Analysis of feedback %s failed (attempt %d): %s", feedback_id, attempts, e)
+        retry_feedback_job(feedback_id, str(e), backoff_delay(attempts))
+        return 'PENDING'
+
+
+# Bounded pool of threads draining the feedback_queue table
+class IngestionWorkerPool:
+    def __init__(self, workers=None, poll_interval=None, lease_seconds=None):
+        self.workers = workers or get_ingestion_workers()
+        self.poll_interval = get_ingestion_poll_interval() if poll_interval is None else poll_interval
+        self.lease_seconds = lease_seconds or get_ingestion_lease_seconds()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name='ingestion-worker-%d' % index, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    # Wake idle workers right away instead of waiting for the next poll
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                jobs = claim_feedback_jobs(1, self.lease_seconds)
+            except Exception:
+                logger.exception("Could not claim feedback jobs")
+                jobs = []
+
+            if jobs:
+                try:
+                    process_feedback_job(jobs[0])
+                except Exception:
+                    # Recording the outcome failed too (e.g. the database is down); the job's lease
+                    # expires and it is claimed again, so keep this worker alive and back off
+                    logger.exception("Could not process feedback job %s", jobs[0]['id'])
+                    self._stopping.wait(self.poll_interval)
+                continue
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+# Start (once per process) the background workers used by the async ingestion mode
+def start_ingestion_workers():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = IngestionWorkerPool().start()
+    return _pool
+
+def notify_ingestion_workers():
+    start_ingestion_workers().notify()
+
+def stop_ingestion_workers(timeout=None):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop(timeout)
+        _pool = None
+
+
+if __name__ == '__main__':
+    # Standalone worker process: python -m src.ingestion.worker
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+    pool = start_ingestion_workers()
+    try:
+        for thread in pool._threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop_ingestion_workers(timeout=10)
@@ -1,210 +1,187 @@
 from datetime import datetime, timedelta
-from src.database.database import get_db_connection, get_total_feedback_count, get_sentiment_data, get_top_requested_features, get_feature_reason
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from src.utils.config import get_openai_key, get_openai_model
-from psycopg2.extras import DictCursor
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import List
+from jinja2 import Environment, FileSystemLoader
+from pydantic import BaseModel, Field
+from src.database.database import get_report_data, get_report_narrative, put_report_narrative
+from src.analysis.cache import prompt_version
+from src.utils.config import get_openai_model
+from src.utils.gateway import invoke_llm
+from src.utils.llm import PromptTemplate, get_llm
 import json
-import schedule
-import time
+import logging
 import os
-import smtplib
 
-# Function to generate e-mail weekly report
-def generate_weekly_report():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=DictCursor)
-    
-    # Get data from the last 7 days
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    
-    # Get sentiment summary
-    sentiment_data = get_sentiment_data()  # Use the new function
-    
-    # Get feature requests summary
-    feature_data = get_top_requested_features()  # Use the new function
-    
-    # Get total feedback count
-    total_feedbacks = get_total_feedback_count()  # Use the new function
-    
-    # Prepare data for LLM
-    sentiment_data_serializable = []
-    for row in sentiment_data:
-        row_dict = dict(row)
-        # Convert Decimal to float for the percentage and count
-        if 'percentage' in row_dict and row_dict['percentage'] is not None:
-            row_dict['percentage'] = float(row_dict['percentage'])
-        if 'count' in row_dict:
-            row_dict['count'] = float(row_dict['count'])
-        sentiment_data_serializable.append(row_dict)
-    
-    # Prepare feature requests with both code and reason
-    feature_data_serializable = []
-    for row in feature_data:
-        row_dict = dict(row)
-        # Convert count to float
-        if 'count_value' in row_dict:
-            row_dict['count'] = float(row_dict['count_value'])
-        
-        # Fetch the feature reason for the feature_code
-        row_dict['feature_reason'] = get_feature_reason(row_dict['feature_code'])
-        
-        feature_data_serializable.append(row_dict)
-    
-    # Prepare data for LLM with serializable values
-    report_data = {
-        'start_date': seven_days_ago.date().isoformat(),
-        'end_date': datetime.now().date().isoformat(),
-        'total_feedbacks': float(total_feedbacks),  # Convert to float
-        'sentiment_summary': sentiment_data_serializable,
-        'feature_requests': feature_data_serializable
-    }
-    
-    cur.close()
-    conn.close()
-    
-    prompt_template = """
+logger = logging.getLogger(__name__)
+
+# Narrative sections of the weekly report; the figures, tables and charts are rendered locally
+class ReportNarrative(BaseModel):
+    general_analysis: str = Field(description="Parágrafo com a análise geral do período")
+    sentiment_analysis: str = Field(description="Análise detalhada da distribuição de sentimentos")
+    feature_analysis: str = Field(description="Breve análise das funcionalidades mais solicitadas")
+    recommendations: List[str] = Field(description="De 3 a 5 recomendações baseadas nos dados")
+    conclusion: str = Field(description="Parágrafo de conclusão com as principais ações sugeridas")
+
+# Narrative prompt, compiled once at import
+NARRATIVE_PROMPT = PromptTemplate(
+    template="""
     Você é um analista especializado em feedback de usuários da AluMind, uma startup que oferece um aplicativo focado em bem-estar e saúde mental.
     
-    Analise os seguintes dados e preencha o template HTML abaixo com suas análises:
+    Analise os seguintes dados do relatório semanal. As tabelas e gráficos já são gerados a partir deles; escreva apenas os textos de análise.
     
     Período: {start_date} até {end_date}
-    Total de feedbacks: {total_feedbacks}
+    Total de feedbacks: {total_feedbacks} (semana anterior: {previous_total_feedbacks})
     
-    Resumo de sentimentos:
+    Resumo de sentimentos (com a variação em relação à semana anterior):
     {sentiment_summary}
     
-    Funcionalidades solicitadas:
+    Funcionalidades solicitadas (com a variação em relação à semana anterior):
     {feature_requests}
     
-    Por favor, preencha o template HTML abaixo, seguindo estas diretrizes específicas:
+    Siga estas diretrizes específicas:
     1. Na análise geral, inclua OBRIGATORIAMENTE:
        - O número total de feedbacks
        - A porcentagem exata de cada tipo de sentimento (Positivo, Negativo e Inconclusivo)
        - Uma análise da proporção entre feedbacks positivos e negativos
+       - A variação em relação à semana anterior
     2. Na análise de sentimentos, destaque:
        - Se houver feedbacks inconclusivos, analise possíveis razões para a ambiguidade
        - Como a distribuição dos sentimentos pode impactar as decisões do produto
-    
-    <html>
-    <head>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-            color: #333;
-        }}
-        .container {{
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-        }}
-        .header {{
-            background-color: #f8f9fa;
-            padding: 20px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-        }}
-        .section {{
-            margin-bottom: 30px;
-        }}
-        .positive {{
-            color: #28a745;
-        }}
-        .negative {{
-            color: #dc3545;
-        }}
-        .neutral {{
-            color: #6c757d;
-        }}
-        .highlight {{
-            background-color: #fff3cd;
-            padding: 10px;
-            border-radius: 5px;
-        }}
-        .metric {{
-            font-size: 1.2em;
-            font-weight: bold;
-        }}
-    </style>
-    </head>
-    <body>
-    <div class="container">
-        <div class="header">
-            <h1>Relatório Semanal de Feedback - AluMind</h1>
-            <p>Período: {start_date} a {end_date}</p>
-            <p class="metric">Total de Feedbacks: {total_feedbacks}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Análise Geral do Período</h2>
-            <p>[Insira aqui um parágrafo detalhado com as porcentagens exatas de cada tipo de sentimento e a análise das proporções]</p>
-        </div>
-        
-        <div class="section">
-            <h2>Análise de Sentimentos</h2>
-            <div class="highlight">
-                [Insira aqui a análise detalhada dos sentimentos, usando as classes 'positive', 'negative' e 'neutral' para destacar os pontos relevantes. Inclua análise dos feedbacks inconclusivos.]
-            </div>
-        </div>
-        
-        <div class="section">
-            <h2>Funcionalidades Mais Solicitadas</h2>
-            <ul>
-                [Insira aqui uma lista das funcionalidades mais solicitadas, com breve análise de cada uma. Use os dados de feature_code e suas contagens.]
-            </ul>
-        </div>
-        
-        <div class="section">
-            <h2>Recomendações</h2>
-            <ol>
-                [Insira aqui 3-5 recomendações baseadas na análise dos dados, focando nas funcionalidades mais solicitadas e nos insights dos feedbacks inconclusivos]
-            </ol>
-        </div>
-        
-        <div class="section">
-            <h2>Conclusão</h2>
-            <p>[Insira aqui um parágrafo de conclusão com as principais ações sugeridas]</p>
-        </div>
-    </div>
-    </body>
-    </html>
-    """
-    
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["start_date", "end_date", "total_feedbacks", "sentiment_summary", "feature_requests"]
-    )
-    
-    llm = ChatOpenAI(
-        model=get_openai_model(),
-        api_key=get_openai_key(),
-        temperature=0.7
-    )
-    
-    formatted_prompt = prompt.format(
+    3. Na análise das funcionalidades, comente brevemente as mais solicitadas e suas variações.
+    4. Faça de 3 a 5 recomendações, focando nas funcionalidades mais solicitadas e nos insights dos feedbacks inconclusivos.
+    5. Termine com uma conclusão com as principais ações sugeridas.
+    
+    Responda apenas com um objeto JSON, em texto simples (sem HTML nem Markdown), neste formato:
+    {schema}
+    """,
+    input_variables=["start_date", "end_date", "total_feedbacks", "previous_total_feedbacks", "sentiment_summary",
+                     "feature_requests", "schema"]
+)
+
+# Expected reply, e.g. {"general_analysis": "<Parágrafo com ...>", "recommendations": ["<...>"], ...}
+NARRATIVE_FORMAT = json.dumps({
+    name: ['<%s>' % field.description] if field.annotation == List[str] else '<%s>' % field.description
+    for name, field in ReportNarrative.model_fields.items()
+}, indent=2, ensure_ascii=False)
+
+# Label of feedbacks stored without a sentiment (NULL), in the tables and in the narrative prompt
+UNCLASSIFIED_SENTIMENT = 'Não classificado'
+
+REPORT_TEMPLATE = 'weekly_report.html'
+TEMPLATES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'templates'))
+
+# Standalone Jinja environment: reports are also rendered by the scheduler, outside any Flask app
+report_environment = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True,
+                                 trim_blocks=True, lstrip_blocks=True)
+
+# Function to get the [start, end) window of the last `days` full days before `now`
+def get_report_period(now=None, days=7):
+    end = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return end - timedelta(days=days), end
+
+def _percentage(count, total):
+    return round(count * 100.0 / total, 1) if total else 0.0
+
+# Function to get the report figures for [start, end), with week-over-week deltas
+def build_report_data(start, end):
+    data = get_report_data(start, end)
+    total, previous_total = data['total'], data['previous_total']
+
+    sentiment_summary = []
+    for row in data['sentiments']:
+        if not row['count'] and not row['previous_count']:
+            continue
+        sentiment_summary.append({
+            'sentiment': row['sentiment'] or UNCLASSIFIED_SENTIMENT,
+            'count': row['count'],
+            'percentage': _percentage(row['count'], total),
+            'previous_count': row['previous_count'],
+            'previous_percentage': _percentage(row['previous_count'], previous_total),
+            'delta': row['count'] - row['previous_count']
+        })
+
+    feature_requests = [
+        dict(row, delta=row['count'] - row['previous_count']) for row in data['features']
+    ]
+
+    return {
+        'start_date': start.date().isoformat(),
+        'end_date': (end - timedelta(microseconds=1)).date().isoformat(),
+        'total_feedbacks': total,
+        'previous_total_feedbacks': previous_total,
+        'total_delta': total - previous_total,
+        'sentiment_summary': sentiment_summary,
+        'feature_requests': feature_requests
+    }
+
+def _narrative_prompt(report_data):
+    return NARRATIVE_PROMPT.format(
         start_date=report_data['start_date'],
         end_date=report_data['end_date'],
         total_feedbacks=report_data['total_feedbacks'],
+        previous_total_feedbacks=report_data['previous_total_feedbacks'],
         sentiment_summary=json.dumps(report_data['sentiment_summary'], indent=2, ensure_ascii=False),
-        feature_requests=json.dumps(report_data['feature_requests'], indent=2, ensure_ascii=False)
+        feature_requests=json.dumps(report_data['feature_requests'], indent=2, ensure_ascii=False),
+        schema=NARRATIVE_FORMAT
     )
-    
-    # Extract content from AIMessage
-    report_html = llm.invoke(formatted_prompt).content
-    
-    return report_html
 
-# Function to send the report
-def send_email_report(report_html):
+def _parse_narrative(message):
+    # Extract content from AIMessage, tolerating a Markdown code fence around the JSON
+    content = message.content.strip()
+    if content.startswith('```'):
+        content = content.strip('`').removeprefix('json').strip()
+    return ReportNarrative.model_validate_json(content).model_dump()
+
+# Function to get the narrative sections for [start, end). The prompt carries every figure, so its
+# hash identifies the narrative: re-sending or previewing the period reuses the stored one, and
+# only a change in the figures, the prompt or the model asks the LLM again (one call).
+def get_narrative(start, end, report_data):
+    prompt = _narrative_prompt(report_data)
+    version = prompt_version(prompt, get_openai_model())
+
+    try:
+        narrative = get_report_narrative(start, end, version)
+    except Exception:
+        logger.exception("Report narrative cache lookup failed")
+        narrative = None
+    if narrative is not None:
+        return narrative
+
+    llm = get_llm(temperature=0.7)
+    narrative = _parse_narrative(invoke_llm('report', llm, prompt, response_format={'type': 'json_object'}))
+    try:
+        put_report_narrative(start, end, version, narrative)
+    except Exception:
+        logger.exception("Report narrative cache write failed")
+    return narrative
+
+# Function to render the weekly report for [start, end) (default: the last 7 full days) piece by
+# piece. The figures and tables are rendered before the narrative is requested, so a streamed
+# response shows them while the LLM is still writing.
+def stream_weekly_report(start=None, end=None):
+    if start is None or end is None:
+        start, end = get_report_period()
+
+    report_data = build_report_data(start, end)
+    template = report_environment.get_template(REPORT_TEMPLATE)
+    return template.generate(load_narrative=lambda: get_narrative(start, end, report_data), **report_data)
+
+# Function to generate e-mail weekly report for [start, end) (default: the last 7 full days)
+def generate_weekly_report(start=None, end=None):
+    return ''.join(stream_weekly_report(start, end))
+
+# Function to send the report; returns whether the e-mail was sent
+def send_email_report(report_html, report_date=None):
+    # Only the scheduler sends e-mail; the API never needs smtplib
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     sender_email = os.getenv('EMAIL_SENDER')
     sender_password = os.getenv('EMAIL_PASSWORD')
     receiver_email = os.getenv('SUPPORT_EMAIL')
     
     msg = MIMEMultipart('alternative')
-    msg['Subject'] = f'Weekly Feedback Report - {datetime.now().date()}'
+    msg['Subject'] = f'Weekly Feedback Report - {report_date or datetime.now().date()}'
     msg['From'] = sender_email
     msg['To'] = receiver_email
     
@@ -215,19 +192,7 @@ def send_email_report(report_html):
             server.login(sender_email, sender_password)
             server.sendmail(sender_email, receiver_email, msg.as_string())
         print("Weekly report sent successfully")
+        return True
     except Exception as e:
         print(f"Error sending email: {str(e)}")
-
-# Scheduler function
-def schedule_weekly_report():
-    def send_report():
-        report_html = generate_weekly_report()
-        send_email_report(report_html)
-        print(report_html)
-    
-    # Schedule the report to run every Monday at 9:00 AM
-    schedule.every().monday.at("09:00").do(send_report)
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
\ No newline at end of file
+        return False
@@ -0,0 +1,153 @@
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from src.database.database import (
+    ensure_schema, report_lock, get_report_runs, start_report_run, finish_report_run, maintain_feedback_partitions,
+    purge_expired_submissions
+)
+from src.reporting.report import get_report_period, generate_weekly_report, send_email_report
+from src.utils.config import (
+    load_config, get_report_weekday, get_report_time, get_report_catchup_weeks, get_report_retry_interval,
+    get_maintenance_interval
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Most recent moment at or before `now` when a weekly report was due
+def last_due_time(now, weekday=None, at=None):
+    weekday = get_report_weekday() if weekday is None else weekday
+    hour, minute = (int(part) for part in (at or get_report_time()).split(':'))
+
+    due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    due -= timedelta(days=(due.weekday() - weekday) % 7)
+    if due > now:
+        due -= timedelta(days=7)
+    return due
+
+# (start, end) periods that should have been reported by `now`, oldest first
+def due_periods(now, weeks=None, weekday=None, at=None):
+    weeks = get_report_catchup_weeks() if weeks is None else weeks
+    last_due = last_due_time(now, weekday, at)
+    return [get_report_period(last_due - timedelta(weeks=back)) for back in reversed(range(max(1, weeks)))]
+
+# Generate and send the report for one period, recording the attempt in report_runs
+def run_report(start, end):
+    start_report_run(start, end)
+    try:
+        report_html = generate_weekly_report(start, end)
+        if not send_email_report(report_html, (end - timedelta(days=1)).date()):
+            raise RuntimeError("E-mail delivery failed")
+    except Exception as e:
+        logger.exception("Report for %s - %s failed", start.date(), end.date())
+        finish_report_run(start, end, 'FAILED', str(e))
+        return False
+
+    finish_report_run(start, end, 'DONE')
+    logger.info("Report for %s - %s sent", start.date(), end.date())
+    return True
+
+# Run every due period that has no successful run yet. Returns None when another node holds
+# the lock, otherwise whether all of them succeeded.
+def run_due_reports(now=None):
+    periods = due_periods(now or datetime.now())
+
+    with report_lock() as acquired:
+        if not acquired:
+            logger.info("Another scheduler is running reports")
+            return None
+
+        # Read the history under the lock, so periods finished by another node are seen
+        done = {
+            (run['period_start'], run['period_end'])
+            for run in get_report_runs(periods[0][0]) if run['status'] == 'DONE'
+        }
+        ok = True
+        for start, end in periods:
+            if (start, end) not in done:
+                ok = run_report(start, end) and ok
+        return ok
+
+
+# Create upcoming feedback partitions and archive expired ones (no-op when not partitioned)
+def run_partition_maintenance():
+    try:
+        created, archived = maintain_feedback_partitions()
+    except Exception:
+        logger.exception("Could not maintain feedback partitions")
+        return
+    if created or archived:
+        logger.info("Created partitions %s, archived %s", created, archived)
+
+
+# Drop expired feedback submission reservations and the responses kept for Idempotency-Key replays
+def run_submission_purge():
+    try:
+        purged = purge_expired_submissions()
+    except Exception:
+        logger.exception("Could not purge expired feedback submissions")
+        return
+    if purged:
+        logger.info("Purged %d expired feedback submissions", purged)
+
+
+# Sleeps until the next due report or maintenance run instead of polling; a failed report is
+# retried sooner. Maintenance keeps its own interval, so it never waits for the weekly report.
+class ReportScheduler:
+    def __init__(self, retry_interval=None, maintenance_interval=None):
+        self.retry_interval = get_report_retry_interval() if retry_interval is None else retry_interval
+        self.maintenance_interval = get_maintenance_interval() if maintenance_interval is None else maintenance_interval
+        self._stopping = threading.Event()
+
+    def run(self):
+        next_report = next_maintenance = datetime.now()
+        while not self._stopping.is_set():
+            now = datetime.now()
+            if now >= next_maintenance:
+                run_partition_maintenance()
+                run_submission_purge()
+                next_maintenance = now + timedelta(seconds=self.maintenance_interval)
+
+            if now >= next_report:
+                try:
+                    ok = run_due_reports()
+                except Exception:
+                    logger.exception("Could not run due reports")
+                    ok = False
+                next_report = last_due_time(now) + timedelta(days=7)
+                if not ok:
+                    next_report = min(next_report, now + timedelta(seconds=self.retry_interval))
+                logger.info("Next report check at %s", next_report.isoformat(timespec='seconds'))
+
+            delay = (min(next_report, next_maintenance) - datetime.now()).total_seconds()
+            self._stopping.wait(max(1.0, delay))
+
+    def stop(self):
+        self._stopping.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send the weekly feedback report on schedule')
+    parser.add_argument('--once', action='store_true', help='run the due reports and exit (for cron)')
+    args = parser.parse_args(argv)
+
+    load_config()
+    logging.basicConfig(level=logging.INFO)
+    ensure_schema()
+
+    if args.once:
+        run_partition_maintenance()
+        run_submission_purge()
+        raise SystemExit(0 if run_due_reports() is not False else 1)
+
+    scheduler = ReportScheduler()
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    # Standalone scheduler process: python -m src.reporting.scheduler
+    main()
@@ -0,0 +1,165 @@
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta
+from src.utils.config import (
+    get_profiling_enabled, get_dashboard_timeline_days, get_dashboard_timeline_bucket, get_static_max_age
+)
+from src.utils.metrics import LabeledCounter, LabeledHistogram
+
+# Request parsing, response shaping and request metrics shared by the WSGI app (api.py)
+# and the ASGI app (asgi.py), so both serve the same contracts
+
+# Page size limits for the feedback listing
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+HTTP_REQUEST_SECONDS = LabeledHistogram(
+    'alumind_http_request_duration_seconds', 'HTTP request duration', ('method', 'endpoint'), register=True)
+HTTP_RESPONSES = LabeledCounter(
+    'alumind_http_responses_total', 'HTTP responses by status', ('method', 'endpoint', 'status'), register=True)
+FEEDBACK_OUTCOMES = LabeledCounter(
+    'alumind_feedback_submissions_total', 'POST /feedbacks results', ('outcome',), register=True)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def page_limit(args):
+    return min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+
+# Parse listing filters from the query string; raises ValueError on bad input
+def parse_feedback_filters(args):
+    sentiment = args.get('sentiment') or None
+    if sentiment and sentiment not in ('POSITIVO', 'NEGATIVO', 'INCONCLUSIVO'):
+        raise ValueError("Invalid sentiment")
+    start = datetime.fromisoformat(args['start']) if args.get('start') else None
+    end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    return {
+        'sentiment': sentiment,
+        'feature_code': args.get('feature_code') or None,
+        'start': start,
+        'end': end
+    }
+
+# Search text and fuzzy flag from the query string; raises ValueError on bad input
+def parse_search_query(args):
+    q = (args.get('q') or '').strip()
+    if not q:
+        raise ValueError("Missing search query")
+    return q, args.get('fuzzy', '').lower() in ('1', 'true')
+
+# Weekly report period from ?start=YYYY-MM-DD (the 7 days from that date); (None, None) means
+# the default period, the last 7 full days
+def parse_report_period(args):
+    if not args.get('start'):
+        return None, None
+    start = datetime.fromisoformat(args['start']).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=7)
+
+def serialize_feedback(row):
+    feedback = dict(row)
+    if feedback.get('created_at') is not None:
+        feedback['created_at'] = feedback['created_at'].isoformat()
+    return feedback
+
+# Dashboard timeline: bucket sizes and the longest range it may cover
+TIMELINE_BUCKETS = ('day', 'week', 'month')
+MAX_TIMELINE_DAYS = 731
+
+# Timeline bucket size and range from ?bucket=day|week|month&days=N; raises ValueError on bad input
+def parse_timeline_params(args):
+    bucket = (args.get('bucket') or get_dashboard_timeline_bucket()).lower()
+    if bucket not in TIMELINE_BUCKETS:
+        raise ValueError("Invalid bucket")
+    try:
+        days = int(args.get('days') or get_dashboard_timeline_days())
+    except ValueError:
+        raise ValueError("Invalid days")
+    if not 1 <= days <= MAX_TIMELINE_DAYS:
+        raise ValueError("days must be between 1 and %d" % MAX_TIMELINE_DAYS)
+    return bucket, days
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+# First days of the buckets covering the `days` days up to `today`, oldest first
+def timeline_buckets(today, days, bucket):
+    current = bucket_start(today - timedelta(days=days - 1), bucket)
+    buckets = []
+    while current <= today:
+        buckets.append(current)
+        if bucket == 'month':
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if bucket == 'week' else 1)
+    return buckets
+
+# Dashboard data as parallel arrays (one list per field instead of one object per row), with the
+# timeline zero-filled so the charts use it as is
+def dashboard_payload(total, sentiment_data, top_features, timeline_rows, bucket, buckets):
+    position = {day: index for index, day in enumerate(buckets)}
+    series = {}
+    for row in timeline_rows:
+        counts = series.setdefault(row['sentiment'], [0] * len(buckets))
+        if row['bucket'] in position:
+            counts[position[row['bucket']]] = int(row['count'])
+
+    return {
+        'total': int(total),
+        'sentiments': {
+            'labels': [row['sentiment'] for row in sentiment_data],
+            'counts': [int(row['count']) for row in sentiment_data],
+            'percentages': [float(row['percentage']) if row['percentage'] is not None else None
+                            for row in sentiment_data]
+        },
+        'top_features': {
+            'codes': [row['feature_code'] for row in top_features],
+            'counts': [int(row['count_value']) for row in top_features]
+        },
+        'timeline': {
+            'bucket': bucket,
+            'labels': [day.isoformat() for day in buckets],
+            'series': series
+        }
+    }
+
+_static_versions = {}
+
+# Short content hash of a static file, used as its cache-busting ?v= parameter
+def static_version(folder, filename):
+    path = os.path.join(folder, filename)
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    version = _static_versions.get(key)
+    if version is None:
+        with open(path, 'rb') as static_file:
+            version = hashlib.sha1(static_file.read()).hexdigest()[:12]
+        _static_versions[key] = version
+    return version
+
+# Versioned static URLs never serve different content, so browsers need not revalidate them
+def static_cache_control():
+    return 'public, max-age=%d, immutable' % get_static_max_age()
+
+def is_valid_feedback_request(data):
+    return bool(data) and 'id' in data and 'feedback' in data
+
+def wants_async_ingestion(mode, args):
+    return mode == 'async' or args.get('async', '').lower() in ('1', 'true')
+
+# Headers for a 503 caused by LLMUnavailable
+def retry_after_headers(error):
+    return {'Retry-After': str(int(math.ceil(error.retry_after or 5)))}
+
+def wants_profile(headers):
+    return get_profiling_enabled() and headers.get('X-Profile', '').lower() in ('1', 'true')
+
+def record_request(method, url_rule, status_code, elapsed):
+    endpoint = url_rule.rule if url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe((method, endpoint), elapsed)
+    HTTP_RESPONSES.inc((method, endpoint, str(status_code)))
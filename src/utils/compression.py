@@ -0,0 +1,80 @@
+import gzip
+import threading
+from collections import OrderedDict
+from src.utils.config import get_compression_enabled, get_compression_min_size
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzipped only
+    brotli = None
+
+# Response compression shared by the WSGI app (api.py) and the ASGI app (asgi.py); each app
+# hooks it into its after_request handler
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml'
+)
+
+# Favor speed for bodies compressed on every request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Compressed static files, keyed by (ETag, encoding), so each asset is compressed once
+_static_bodies = OrderedDict()
+_static_lock = threading.Lock()
+STATIC_CACHE_SIZE = 64
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Preferred encoding the client accepts (Accept-Encoding, q=0 excluded), or None
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+# Whether a response is worth compressing: a complete, successful text body of some size
+def should_compress(status_code, mimetype, length, headers):
+    return (get_compression_enabled() and 200 <= status_code < 300 and status_code != 206
+            and mimetype in COMPRESSIBLE_TYPES and length >= get_compression_min_size()
+            and 'Content-Encoding' not in headers)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+# compress() for bodies identified by a strong ETag (static files), computed once per version
+def compress_static(etag, data, encoding):
+    key = (etag, encoding)
+    with _static_lock:
+        body = _static_bodies.get(key)
+        if body is not None:
+            _static_bodies.move_to_end(key)
+            return body
+    body = compress(data, encoding)
+    with _static_lock:
+        _static_bodies[key] = body
+        while len(_static_bodies) > STATIC_CACHE_SIZE:
+            _static_bodies.popitem(last=False)
+    return body
+
+# The encoded body is a different byte sequence, so its ETag is only weakly equal to the original;
+# If-None-Match uses weak comparison, so revalidation keeps answering 304
+def weak_etag(etag):
+    return etag if etag is None or etag.startswith('W/') else 'W/' + etag
@@ -8,4 +8,272 @@ def get_openai_key():
     return os.getenv("OPENAI_API_KEY")
 
 def get_openai_model():
-    return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
\ No newline at end of file
+    return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
+
+# Optional OpenAI-compatible endpoint (e.g. a local stub server for benchmarks)
+def get_openai_base_url():
+    return os.getenv("OPENAI_BASE_URL") or None
+
+def get_llm_max_connections():
+    return int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+def get_llm_keepalive_expiry():
+    return float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+# "combined" (one structured LLM call) or "two_call" (spam_filter, then analyze_feedback_langchain)
+def get_analysis_mode():
+    return os.getenv("ANALYSIS_MODE", "combined").lower()
+
+def get_db_pool_min_size():
+    return int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+
+def get_db_pool_max_size():
+    return int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+def get_db_pool_timeout():
+    return float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def get_db_pool_ping_interval():
+    return float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+
+def get_llm_cache_enabled():
+    return os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def get_llm_cache_size():
+    return int(os.getenv("LLM_CACHE_SIZE", "10000"))
+
+# Seconds; defaults to one week
+def get_llm_cache_ttl():
+    return int(os.getenv("LLM_CACHE_TTL", "604800"))
+
+# Also keep cached LLM results in the llm_cache PostgreSQL table
+def get_llm_cache_persistent():
+    return os.getenv("LLM_CACHE_PERSISTENT", "false").lower() in ("1", "true", "yes")
+
+# "sync" (analyze inside the request) or "async" (queue and analyze in background workers)
+def get_ingestion_mode():
+    return os.getenv("INGESTION_MODE", "sync").lower()
+
+def get_ingestion_workers():
+    return int(os.getenv("INGESTION_WORKERS", "4"))
+
+def get_ingestion_max_attempts():
+    return int(os.getenv("INGESTION_MAX_ATTEMPTS", "5"))
+
+# Base delay in seconds for the exponential retry backoff
+def get_ingestion_backoff_base():
+    return float(os.getenv("INGESTION_BACKOFF_BASE", "2"))
+
+def get_ingestion_backoff_max():
+    return float(os.getenv("INGESTION_BACKOFF_MAX", "300"))
+
+# Seconds a worker may hold a job before another worker can reclaim it
+def get_ingestion_lease_seconds():
+    return int(os.getenv("INGESTION_LEASE_SECONDS", "300"))
+
+def get_ingestion_poll_interval():
+    return float(os.getenv("INGESTION_POLL_INTERVAL", "5"))
+
+# Seconds a submission may hold its feedback id (or Idempotency-Key) before a retry can take over
+def get_submission_lease_seconds():
+    return int(os.getenv("SUBMISSION_LEASE_SECONDS", "120"))
+
+# Seconds a duplicate submission waits for the one in progress before answering 409
+def get_submission_wait_seconds():
+    return float(os.getenv("SUBMISSION_WAIT_SECONDS", "30"))
+
+# Seconds a response is replayed to retries with the same Idempotency-Key
+def get_idempotency_key_ttl():
+    return int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
+# Parallel LLM calls used by the bulk importer
+def get_bulk_concurrency():
+    return int(os.getenv("BULK_CONCURRENCY", "4"))
+
+# Feedbacks sent together in one LLM prompt
+def get_bulk_batch_size():
+    return int(os.getenv("BULK_BATCH_SIZE", "10"))
+
+# Rows written per database transaction
+def get_bulk_chunk_size():
+    return int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+# Maximum LLM requests per minute issued by the bulk importer
+def get_bulk_rate_limit():
+    return float(os.getenv("BULK_RATE_LIMIT", "60"))
+
+# Parallel LLM calls of a re-analysis run (python -m src.analysis.reanalysis)
+def get_reanalysis_concurrency():
+    return int(os.getenv("REANALYSIS_CONCURRENCY", "4"))
+
+# Feedbacks analyzed per LLM prompt during re-analysis
+def get_reanalysis_batch_size():
+    return int(os.getenv("REANALYSIS_BATCH_SIZE", "10"))
+
+# Feedbacks per checkpoint: each chunk's labels and progress are committed together
+def get_reanalysis_chunk_size():
+    return int(os.getenv("REANALYSIS_CHUNK_SIZE", "500"))
+
+# Maximum LLM requests per minute issued by a re-analysis run
+def get_reanalysis_rate_limit():
+    return float(os.getenv("REANALYSIS_RATE_LIMIT", "60"))
+
+# Seconds a rendered dashboard is served without re-querying (0 disables the cache)
+def get_dashboard_cache_ttl():
+    return float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+
+# Seconds past the TTL during which a stale dashboard is served while it re-renders
+def get_dashboard_cache_stale_ttl():
+    return float(os.getenv("DASHBOARD_CACHE_STALE_TTL", "300"))
+
+# Default range and bucket size (day, week or month) of the dashboard timeline
+def get_dashboard_timeline_days():
+    return int(os.getenv("DASHBOARD_TIMELINE_DAYS", "30"))
+
+def get_dashboard_timeline_bucket():
+    return os.getenv("DASHBOARD_TIMELINE_BUCKET", "day").lower()
+
+# Response compression (br when the brotli package is installed, otherwise gzip)
+def get_compression_enabled():
+    return os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Smaller bodies are sent as is; compressing them costs more than it saves
+def get_compression_min_size():
+    return int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+
+# Seconds browsers may keep versioned static assets (their URLs change with their content)
+def get_static_max_age():
+    return int(os.getenv("STATIC_MAX_AGE", "31536000"))
+
+# Weekly report schedule: weekday (0 = Monday) and local time (HH:MM) when a report is due
+def get_report_weekday():
+    return int(os.getenv("REPORT_WEEKDAY", "0"))
+
+def get_report_time():
+    return os.getenv("REPORT_TIME", "09:00")
+
+# How many past weekly windows the scheduler catches up on after downtime
+def get_report_catchup_weeks():
+    return int(os.getenv("REPORT_CATCHUP_WEEKS", "4"))
+
+# Seconds to wait before retrying a failed report (or one locked by another node)
+def get_report_retry_interval():
+    return float(os.getenv("REPORT_RETRY_INTERVAL", "900"))
+
+# Seconds between the scheduler's partition maintenance and submission purge runs
+def get_maintenance_interval():
+    return float(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+
+def get_feature_clustering_enabled():
+    return os.getenv("FEATURE_CLUSTERING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# "hashing" (local character n-grams, no network) or "openai" (embeddings API)
+def get_feature_embedder():
+    return os.getenv("FEATURE_EMBEDDER", "hashing").lower()
+
+def get_feature_embedding_model():
+    return os.getenv("FEATURE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Minimum cosine similarity for a feature_code to join an existing cluster
+def get_feature_cluster_threshold():
+    return float(os.getenv("FEATURE_CLUSTER_THRESHOLD", "0.7"))
+
+# Weight of the feature_reason embedding relative to the feature_code one
+def get_feature_reason_weight():
+    return float(os.getenv("FEATURE_REASON_WEIGHT", "0.2"))
+
+def get_prefilter_enabled():
+    return os.getenv("PREFILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Model confidence needed to decide locally; anything less certain goes to the LLM
+def get_prefilter_threshold():
+    return float(os.getenv("PREFILTER_THRESHOLD", "0.98"))
+
+# Fraction of locally decided inputs still sent to the LLM to measure precision/recall
+def get_prefilter_audit_rate():
+    return float(os.getenv("PREFILTER_AUDIT_RATE", "0.02"))
+
+# Samples of each class needed before the local model is used
+def get_prefilter_min_samples():
+    return int(os.getenv("PREFILTER_MIN_SAMPLES", "50"))
+
+# Stored rows (per class) the local model is trained on
+def get_prefilter_training_rows():
+    return int(os.getenv("PREFILTER_TRAINING_ROWS", "5000"))
+
+# Seconds between retrainings of the local model
+def get_prefilter_retrain_interval():
+    return float(os.getenv("PREFILTER_RETRAIN_INTERVAL", "3600"))
+
+# LLM gateway: limits shared by every LLM call in the process
+def get_llm_requests_per_minute():
+    return float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+
+def get_llm_tokens_per_minute():
+    return float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+
+def get_llm_max_concurrency():
+    return int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Seconds a single LLM request may take
+def get_llm_timeout():
+    return float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Seconds a call may wait for the rate limiter and a concurrency slot before failing
+def get_llm_queue_timeout():
+    return float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+# Retries on 429, 5xx, timeouts and connection errors (with jittered exponential backoff)
+def get_llm_max_retries():
+    return int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+def get_llm_retry_base():
+    return float(os.getenv("LLM_RETRY_BASE", "0.5"))
+
+def get_llm_retry_max():
+    return float(os.getenv("LLM_RETRY_MAX", "20"))
+
+# Completion tokens reserved from the tokens/minute budget before the real usage is known
+def get_llm_expected_completion_tokens():
+    return int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "256"))
+
+# USD per million tokens; overrides the built-in price table when set
+def get_llm_price_input():
+    value = os.getenv("LLM_PRICE_INPUT_PER_1M")
+    return float(value) if value else None
+
+def get_llm_price_output():
+    value = os.getenv("LLM_PRICE_OUTPUT_PER_1M")
+    return float(value) if value else None
+
+# Whether clients may ask for a per-request stage breakdown with the X-Profile header
+def get_profiling_enabled():
+    return os.getenv("PROFILING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Typo-tolerant search with the pg_trgm extension (skipped when the extension cannot be created)
+def get_search_trigram_enabled():
+    return os.getenv("SEARCH_TRIGRAM_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Most recent matches a search ranks; bounds the cost of very common terms
+def get_search_max_candidates():
+    return int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+# Monthly range partitioning of feedbacks on created_at (existing tables are converted with
+# python -m src.database.partitions migrate)
+def get_feedbacks_partitioned():
+    return os.getenv("FEEDBACKS_PARTITIONED", "false").lower() in ("1", "true", "yes")
+
+# Months of partitions created ahead of the current one
+def get_partition_premake_months():
+    return int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+
+# Months of feedbacks kept in the database; older partitions are archived and dropped (0 keeps all)
+def get_feedbacks_retention_months():
+    return int(os.getenv("FEEDBACKS_RETENTION_MONTHS", "0"))
+
+def get_feedbacks_archive_dir():
+    return os.getenv("FEEDBACKS_ARCHIVE_DIR", "archive")
+
+# Schema handling at app startup: check (compare the migration version), migrate, or off
+def get_schema_startup():
+    return os.getenv("SCHEMA_STARTUP", "check").lower()
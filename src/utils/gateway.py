@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import httpx
+from src.utils.config import (
+    get_openai_model, get_llm_requests_per_minute, get_llm_tokens_per_minute, get_llm_max_concurrency,
+    get_llm_queue_timeout, get_llm_max_retries, get_llm_retry_base, get_llm_retry_max,
+    get_llm_expected_completion_tokens, get_llm_price_input, get_llm_price_output
+)
+from src.utils.metrics import LabeledCounter, LabeledHistogram, CallbackGauge
+from src.utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# USD per million (input, output) tokens; models are matched by prefix, longest first
+PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'text-embedding-3-small': (0.02, 0.0),
+    'text-embedding-3-large': (0.13, 0.0),
+}
+
+OK = 'ok'
+RATE_LIMITED = 'rate_limited'
+TIMEOUT = 'timeout'
+SERVER_ERROR = 'server_error'
+CONNECTION_ERROR = 'connection_error'
+PARSE_ERROR = 'parse_error'
+ERROR = 'error'
+REJECTED = 'rejected'
+
+
+# Raised when a call cannot be served right now (provider rate limit or outage after every
+# retry, or no capacity within the queue timeout); callers map it to 503 + Retry-After.
+class LLMUnavailable(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# A structured reply that did not match its schema; retried like a transient failure
+class MalformedOutput(Exception):
+    pass
+
+
+# Outcome of a failed attempt and whether it is worth retrying
+def classify_error(error):
+    # Imported here, like the client itself: the gateway is loaded long before the first call
+    import openai
+    if isinstance(error, MalformedOutput):
+        return PARSE_ERROR, True
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMITED, True
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException, TimeoutError)):
+        return TIMEOUT, True
+    if isinstance(error, openai.APIStatusError):
+        return (SERVER_ERROR, True) if error.status_code >= 500 else (ERROR, False)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return CONNECTION_ERROR, True
+    return ERROR, False
+
+# Seconds the provider asked us to wait, if it said so
+def retry_after_seconds(error):
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def estimate_tokens(text):
+    return max(1, len(text or '') // 4)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = get_llm_price_input(), get_llm_price_output()
+    if input_price is None or output_price is None:
+        for prefix in sorted(PRICES, key=len, reverse=True):
+            if (model or '').startswith(prefix):
+                input_price = PRICES[prefix][0] if input_price is None else input_price
+                output_price = PRICES[prefix][1] if output_price is None else output_price
+                break
+    if input_price is None or output_price is None:
+        return 0.0
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+
+# (prompt_tokens, completion_tokens, model) reported by a LangChain result, if any
+def extract_usage(message):
+    usage = getattr(message, 'usage_metadata', None)
+    metadata = getattr(message, 'response_metadata', None)
+    usage = usage if isinstance(usage, dict) else {}
+    metadata = metadata if isinstance(metadata, dict) else {}
+    if not usage and metadata.get('token_usage'):
+        token_usage = metadata['token_usage']
+        usage = {'input_tokens': token_usage.get('prompt_tokens', 0),
+                 'output_tokens': token_usage.get('completion_tokens', 0)}
+    if not usage:
+        return None
+    return usage.get('input_tokens', 0), usage.get('output_tokens', 0), metadata.get('model_name')
+
+
+# Single entry point for LLM traffic: request and token budgets, bounded concurrency,
+# retries with jittered backoff and per-call metrics, shared by every caller in the process
+class LLMGateway:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None,
+                 queue_timeout=None, max_retries=None, retry_base=None, retry_max=None):
+        self.requests = TokenBucket.per_minute(requests_per_minute or get_llm_requests_per_minute())
+        self.tokens = TokenBucket.per_minute(tokens_per_minute or get_llm_tokens_per_minute())
+        self.max_concurrency = max_concurrency or get_llm_max_concurrency()
+        self.queue_timeout = get_llm_queue_timeout() if queue_timeout is None else queue_timeout
+        self.max_retries = get_llm_max_retries() if max_retries is None else max_retries
+        self.retry_base = get_llm_retry_base() if retry_base is None else retry_base
+        self.retry_max = get_llm_retry_max() if retry_max is None else retry_max
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # Coroutines get their own cap (an asyncio semaphore cannot be shared with threads)
+        self._async_slots = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        # Metrics, labeled by call kind (e.g. 'combined', 'spam', 'report')
+        self.calls = LabeledCounter(
+            'alumind_llm_calls_total', 'LLM calls by outcome', ('kind', 'outcome'))
+        self.attempts = LabeledCounter(
+            'alumind_llm_attempts_total', 'LLM HTTP attempts by outcome', ('kind', 'outcome'))
+        self.latency = LabeledHistogram(
+            'alumind_llm_call_duration_seconds', 'LLM call duration, retries included', ('kind',))
+        self.queue_wait = LabeledHistogram(
+            'alumind_llm_queue_wait_seconds', 'Time spent waiting for LLM budget and a slot', ('kind',))
+        self.token_usage = LabeledCounter(
+            'alumind_llm_tokens_total', 'Tokens reported by the provider', ('kind', 'type'))
+        self.cost = LabeledCounter(
+            'alumind_llm_cost_usd_total', 'Estimated LLM spend in USD', ('kind',))
+        self.in_flight = CallbackGauge(
+            'alumind_llm_in_flight', 'LLM requests currently in flight', lambda: self._in_flight)
+
+    # Invoke a LangChain runnable. Structured runnables built with include_raw=True are
+    # unwrapped to their parsed value, after their raw message has been metered.
+    def invoke(self, kind, runnable, prompt, **kwargs):
+        return self.call(kind, lambda: runnable.invoke(prompt, **kwargs), estimate_tokens(prompt))
+
+    # Run `fn` (one LLM request) under the gateway's limits, retrying transient failures
+    def call(self, kind, fn, estimated_prompt_tokens=1):
+        reserved = estimated_prompt_tokens + get_llm_expected_completion_tokens()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(kind, reserved)
+            try:
+                result = fn()
+            except Exception as e:
+                self._release()
+                time.sleep(self._failed(kind, e, attempt, reserved, start))
+                continue
+
+            self._release()
+            try:
+                return self._succeeded(kind, result, reserved, start)
+            except MalformedOutput as e:
+                time.sleep(self._failed(kind, e, attempt, reserved, start))
+
+    # Async counterpart of invoke(): awaits runnable.ainvoke, so a pending call holds no thread
+    async def ainvoke(self, kind, runnable, prompt, **kwargs):
+        return await self.acall(kind, lambda: runnable.ainvoke(prompt, **kwargs), estimate_tokens(prompt))
+
+    # Async counterpart of call(); `fn` returns an awaitable
+    async def acall(self, kind, fn, estimated_prompt_tokens=1):
+        reserved = estimated_prompt_tokens + get_llm_expected_completion_tokens()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._acquire_async(kind, reserved)
+            try:
+                result = await fn()
+            except Exception as e:
+                self._release_async()
+                await asyncio.sleep(self._failed(kind, e, attempt, reserved, start))
+                continue
+
+            self._release_async()
+            try:
+                return self._succeeded(kind, result, reserved, start)
+            except MalformedOutput as e:
+                await asyncio.sleep(self._failed(kind, e, attempt, reserved, start))
+
+    # Account for a failed attempt; returns the delay before retrying, or raises when giving up
+    def _failed(self, kind, error, attempt, reserved, start):
+        # A failed request consumed no tokens (or none we can measure); give them back. A malformed
+        # reply was metered already.
+        if not isinstance(error, MalformedOutput):
+            self.tokens.adjust(-reserved)
+        outcome, retryable = classify_error(error)
+        self.attempts.inc((kind, outcome))
+        retry_after = retry_after_seconds(error)
+        # A provider asking for a longer pause than callers wait in the queue is not waited for
+        if not retryable or attempt > self.max_retries or (retry_after or 0) > self.queue_timeout:
+            self._finish(kind, outcome, start)
+            if outcome in (RATE_LIMITED, SERVER_ERROR, TIMEOUT, CONNECTION_ERROR):
+                raise LLMUnavailable("LLM %s after %d attempts: %s" % (outcome, attempt, error),
+                                     retry_after) from error
+            raise error
+
+        delay = min(self.retry_max, retry_after) if retry_after else random.uniform(
+            0, min(self.retry_max, self.retry_base * (2 ** (attempt - 1))))
+        logger.warning("LLM %s call failed (%s, attempt %d), retrying in %.2fs", kind, outcome, attempt, delay)
+        return delay
+
+    def _succeeded(self, kind, result, reserved, start):
+        # Raises MalformedOutput (after metering the reply) before the attempt is counted
+        result = self._record_usage(kind, result, reserved)
+        self.attempts.inc((kind, OK))
+        self._finish(kind, OK, start)
+        return result
+
+    def _acquire(self, kind, tokens):
+        start = time.monotonic()
+        taken = []
+        try:
+            self.requests.acquire(1, timeout=self.queue_timeout)
+            taken.append((self.requests, 1))
+            remaining = self.queue_timeout - (time.monotonic() - start)
+            self.tokens.acquire(tokens, timeout=max(0.001, remaining))
+            taken.append((self.tokens, tokens))
+            remaining = self.queue_timeout - (time.monotonic() - start)
+            if not self._slots.acquire(timeout=max(0.001, remaining)):
+                raise TimeoutError("No free LLM slot")
+        except TimeoutError as e:
+            self._refund(taken)
+            self.calls.inc((kind, REJECTED))
+            raise LLMUnavailable("LLM capacity exhausted: %s" % e, retry_after=1.0) from e
+        finally:
+            self.queue_wait.observe((kind,), time.monotonic() - start)
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def _acquire_async(self, kind, tokens):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        start = time.monotonic()
+        taken = []
+        try:
+            await self.requests.acquire_async(1, timeout=self.queue_timeout)
+            taken.append((self.requests, 1))
+            remaining = self.queue_timeout - (time.monotonic() - start)
+            await self.tokens.acquire_async(tokens, timeout=max(0.001, remaining))
+            taken.append((self.tokens, tokens))
+            remaining = self.queue_timeout - (time.monotonic() - start)
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), max(0.001, remaining))
+            except asyncio.TimeoutError:
+                raise TimeoutError("No free LLM slot")
+        except TimeoutError as e:
+            self._refund(taken)
+            self.calls.inc((kind, REJECTED))
+            raise LLMUnavailable("LLM capacity exhausted: %s" % e, retry_after=1.0) from e
+        finally:
+            self.queue_wait.observe((kind,), time.monotonic() - start)
+        with self._lock:
+            self._in_flight += 1
+
+    def _release_async(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._async_slots.release()
+
+    # A rejected call sends no request: give back the budget it took before timing out
+    @staticmethod
+    def _refund(taken):
+        for bucket, amount in taken:
+            bucket.adjust(-amount)
+
+    def _finish(self, kind, outcome, start):
+        self.calls.inc((kind, outcome))
+        self.latency.observe((kind,), time.monotonic() - start)
+
+    def _record_usage(self, kind, result, reserved):
+        raw, parsing_error = result, None
+        if isinstance(result, dict) and 'parsed' in result and 'raw' in result:
+            raw, parsing_error = result['raw'], result.get('parsing_error')
+            result = result['parsed']
+
+        usage = extract_usage(raw)
+        if usage is not None:
+            prompt_tokens, completion_tokens, model = usage
+            self.tokens.adjust(prompt_tokens + completion_tokens - reserved)
+            self.token_usage.inc((kind, 'prompt'), prompt_tokens)
+            self.token_usage.inc((kind, 'completion'), completion_tokens)
+            self.cost.inc((kind,), estimate_cost(model or get_openai_model(), prompt_tokens, completion_tokens))
+        if parsing_error:
+            raise MalformedOutput("LLM reply did not match the schema: %s" % parsing_error) from parsing_error
+        return result
+
+    def stats(self):
+        by_kind = {}
+        for (kind, outcome), count in self.calls.snapshot().items():
+            by_kind.setdefault(kind, {'calls': {}})['calls'][outcome] = int(count)
+        for (kind, outcome), count in self.attempts.snapshot().items():
+            by_kind.setdefault(kind, {'calls': {}}).setdefault('attempts', {})[outcome] = int(count)
+        for (kind, part), count in self.token_usage.snapshot().items():
+            by_kind.setdefault(kind, {'calls': {}})['%s_tokens' % part] = int(count)
+        for (kind,), cost in self.cost.snapshot().items():
+            by_kind.setdefault(kind, {'calls': {}})['estimated_cost_usd'] = round(cost, 6)
+        for (kind,), histogram in self.latency.items():
+            entry = by_kind.setdefault(kind, {'calls': {}})
+            entry['latency_p50'] = histogram.quantile(0.5)
+            entry['latency_p95'] = histogram.quantile(0.95)
+            entry['latency_p99'] = histogram.quantile(0.99)
+
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            'in_flight': in_flight,
+            'max_concurrency': self.max_concurrency,
+            'requests_per_minute': round(self.requests.rate * 60),
+            'tokens_per_minute': round(self.tokens.rate * 60),
+            'by_kind': by_kind
+        }
+
+    # Metric objects for the Prometheus endpoint (they live and die with the gateway)
+    def metrics(self):
+        return [self.calls, self.attempts, self.latency, self.queue_wait, self.token_usage, self.cost, self.in_flight]
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+# Drop the process-wide gateway (limits are re-read from the environment on next use)
+def reset_gateway():
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
+
+def invoke_llm(kind, runnable, prompt, **kwargs):
+    return get_gateway().invoke(kind, runnable, prompt, **kwargs)
+
+async def ainvoke_llm(kind, runnable, prompt, **kwargs):
+    return await get_gateway().ainvoke(kind, runnable, prompt, **kwargs)
+
+def get_gateway_stats():
+    return get_gateway().stats()
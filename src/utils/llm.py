@@ -0,0 +1,111 @@
+import threading
+import httpx
+from src.utils.config import (
+    get_openai_key, get_openai_model, get_openai_base_url,
+    get_llm_max_connections, get_llm_keepalive_expiry, get_llm_timeout
+)
+
+_clients = {}
+_structured_clients = {}
+_clients_lock = threading.Lock()
+_http_client = None
+_async_http_client = None
+
+
+# str.format prompt with the PromptTemplate interface (.template, .format) used by the prompts;
+# langchain is only imported when the first client is built
+class PromptTemplate:
+    def __init__(self, template, input_variables=()):
+        self.template = template
+        self.input_variables = list(input_variables)
+
+    def format(self, **kwargs):
+        return self.template.format(**kwargs)
+
+
+# Shared HTTP client so every ChatOpenAI instance reuses the same keep-alive connections
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        with _clients_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    limits=_http_limits(), timeout=httpx.Timeout(get_llm_timeout(), connect=10.0)
+                )
+    return _http_client
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=get_llm_max_connections(),
+        max_keepalive_connections=get_llm_max_connections(),
+        keepalive_expiry=get_llm_keepalive_expiry()
+    )
+
+# Async twin of get_http_client, used by ainvoke in the ASGI app (one event loop per process)
+def get_async_http_client():
+    global _async_http_client
+    if _async_http_client is None:
+        with _clients_lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(
+                    limits=_http_limits(), timeout=httpx.Timeout(get_llm_timeout(), connect=10.0)
+                )
+    return _async_http_client
+
+# Process-wide ChatOpenAI registry keyed by model, temperature and API key
+def get_llm(model=None, temperature=None, api_key=None):
+    model = model or get_openai_model()
+    api_key = api_key or get_openai_key()
+    base_url = get_openai_base_url()
+    key = (model, temperature, api_key, base_url)
+
+    llm = _clients.get(key)
+    if llm is None:
+        # Deferred: langchain_openai (and openai) take most of the app's import time
+        from langchain_openai import ChatOpenAI
+        http_client = get_http_client()
+        http_async_client = get_async_http_client()
+        with _clients_lock:
+            llm = _clients.get(key)
+            if llm is None:
+                kwargs = {'temperature': temperature} if temperature is not None else {}
+                llm = ChatOpenAI(
+                    model=model,
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    timeout=get_llm_timeout(),
+                    # Retries are handled by the LLM gateway (src/utils/gateway.py)
+                    max_retries=0,
+                    **kwargs
+                )
+                _clients[key] = llm
+    return llm
+
+# Registry entry for llm.with_structured_output(schema), built once per client and schema.
+# With include_raw=True the result also carries the raw message (and its token usage).
+def get_structured_llm(schema, method="function_calling", include_raw=False, **llm_kwargs):
+    llm = get_llm(**llm_kwargs)
+    key = (id(llm), schema, method, include_raw)
+
+    structured = _structured_clients.get(key)
+    if structured is None:
+        with _clients_lock:
+            structured = _structured_clients.get(key)
+            if structured is None:
+                structured = llm.with_structured_output(schema, method=method, include_raw=include_raw)
+                _structured_clients[key] = structured
+    return structured
+
+# Drop every cached client (used when credentials change and in tests)
+def reset_llm_clients():
+    global _http_client, _async_http_client
+    with _clients_lock:
+        _clients.clear()
+        _structured_clients.clear()
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        # Closing needs the event loop it was used on; dropping it lets its connections be collected
+        _async_http_client = None
@@ -0,0 +1,254 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached hit to a slow LLM completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Finer low end for in-process work and indexed queries, which finish well under 5 ms
+FAST_BUCKETS = (0.0005, 0.001, 0.0025) + DEFAULT_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Metrics created with register=True, in creation order
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+# Monotonic counters keyed by a tuple of label values
+class LabeledCounter:
+    type = 'counter'
+
+    def __init__(self, name=None, documentation='', labelnames=(), register=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        if register:
+            _register(self)
+
+    def inc(self, labels=(), amount=1.0):
+        with self._lock:
+            self._values[labels] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [(self.name, self.labelnames, labels, value) for labels, value in sorted(self.snapshot().items())]
+
+
+# Cumulative histogram (Prometheus style: each bucket counts observations <= its bound)
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    # Upper bound of the bucket holding the q-quantile (None when empty)
+    def quantile(self, q):
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if not total:
+            return None
+        target, seen = q * total, 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, value_sum = list(self._counts), self._count, self._sum
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            cumulative.append((bound, running))
+        return {'count': total, 'sum': value_sum, 'buckets': cumulative}
+
+
+# Histograms keyed by a tuple of label values, created on first use
+class LabeledHistogram:
+    type = 'histogram'
+
+    def __init__(self, name=None, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS, register=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+        if register:
+            _register(self)
+
+    def labels(self, labels=()):
+        histogram = self._histograms.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(labels, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, labels, value):
+        self.labels(labels).observe(value)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def samples(self):
+        samples = []
+        for labels, histogram in self.items():
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot['buckets']:
+                samples.append((self.name + '_bucket', self.labelnames + ('le',),
+                                labels + (_format_value(bound),), count))
+            samples.append((self.name + '_sum', self.labelnames, labels, snapshot['sum']))
+            samples.append((self.name + '_count', self.labelnames, labels, snapshot['count']))
+        return samples
+
+
+# Point-in-time values read from a callback at scrape time (e.g. pool or cache stats)
+class CallbackGauge:
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=(), register=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        if register:
+            _register(self)
+
+    # The callback returns a number, or a {label values tuple: number} dict
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, self.labelnames, labels, value) for labels, value in sorted(values.items())
+                if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+# Gauge per numeric entry of a stats dict (as served by /stats), labeled by entry name
+def stats_gauge(name, documentation, stats, register=False):
+    return CallbackGauge(name, documentation, lambda: {(key,): value for key, value in stats().items()},
+                         ('stat',), register=register)
+
+
+def _format_value(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+# Prometheus text exposition (version 0.0.4) of the registered metrics plus `extra` ones
+def render_prometheus(extra=()):
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics + list(extra):
+        # A failing callback (e.g. a gauge whose source is down) leaves out only its own metric
+        try:
+            samples = metric.samples()
+        except Exception:
+            logger.exception("Could not collect metric %s", metric.name)
+            continue
+        lines.append('# HELP %s %s' % (metric.name, _escape(metric.documentation)))
+        lines.append('# TYPE %s %s' % (metric.name, metric.type))
+        for name, labelnames, labels, value in samples:
+            label_text = ','.join('%s="%s"' % (k, _escape(v)) for k, v in zip(labelnames, labels))
+            value = float(value)
+            value_text = 'NaN' if math.isnan(value) else _format_value(value)
+            lines.append('%s{%s} %s' % (name, label_text, value_text) if label_text else '%s %s' % (name, value_text))
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = LabeledHistogram(
+    'alumind_stage_duration_seconds', 'Duration of request processing stages', ('stage',),
+    buckets=FAST_BUCKETS, register=True)
+
+# Stage breakdown of the current request, when it asked for one (see start_profile)
+_profile = contextvars.ContextVar('profile', default=None)
+
+def start_profile():
+    return _profile.set([])
+
+def finish_profile(token):
+    stages = _profile.get()
+    try:
+        _profile.reset(token)
+    except ValueError:
+        # Started in another context (e.g. a hook run elsewhere); just stop collecting here
+        _profile.set(None)
+    return stages or []
+
+def _record(histogram, label, elapsed, profile_name=None):
+    histogram.observe((label,), elapsed)
+    stages = _profile.get()
+    if stages is not None:
+        stages.append((profile_name or label, elapsed))
+
+# Time a block of code as a named stage
+@contextmanager
+def stage(name, histogram=STAGE_SECONDS):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(histogram, name, time.perf_counter() - start)
+
+# Decorator timing every call of a function into `histogram`, labeled with its name
+# (shown as `prefix` + name in profiled requests)
+def timed(histogram, prefix=''):
+    def decorator(fn):
+        label, profile_name = fn.__name__, prefix + fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _record(histogram, label, time.perf_counter() - start, profile_name)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(histogram, label, time.perf_counter() - start, profile_name)
+        return wrapper
+    return decorator
+
+# Server-Timing header value ("name;dur=<ms>") for a profiled request
+def server_timing(stages, total=None):
+    entries = ['%s;dur=%.2f' % (name, elapsed * 1000) for name, elapsed in stages]
+    if total is not None:
+        entries.append('total;dur=%.2f' % (total * 1000))
+    return ', '.join(entries)
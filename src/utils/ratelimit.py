@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+
+# Thread-safe token bucket: `rate` tokens are added per second, up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount, capacity=None):
+        return cls(amount / 60.0, capacity if capacity is not None else amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Take `tokens` without blocking; returns False when not enough are available
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    # Take `tokens` if available and return 0, otherwise return the seconds until they will be.
+    # Requests larger than the capacity wait for a full bucket and then drive it negative.
+    def _take_or_wait(self, tokens):
+        with self._lock:
+            self._refill()
+            needed = min(tokens, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= tokens
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def _next_wait(self, wait, start, timeout):
+        if timeout is None:
+            return wait
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            raise TimeoutError("Rate limiter timed out after %.1fs" % timeout)
+        return min(wait, remaining)
+
+    # Block until `tokens` are available (or `timeout` expires); returns the time spent waiting
+    def acquire(self, tokens=1, timeout=None):
+        start = time.monotonic()
+        while True:
+            wait = self._take_or_wait(tokens)
+            if not wait:
+                return time.monotonic() - start
+            time.sleep(self._next_wait(wait, start, timeout))
+
+    # Same as acquire(), waiting with asyncio.sleep so the event loop keeps running
+    async def acquire_async(self, tokens=1, timeout=None):
+        start = time.monotonic()
+        while True:
+            wait = self._take_or_wait(tokens)
+            if not wait:
+                return time.monotonic() - start
+            await asyncio.sleep(self._next_wait(wait, start, timeout))
+
+    # Correct an earlier reservation without waiting: positive `tokens` are taken (the bucket
+    # may go negative, delaying later callers), negative ones are given back.
+    def adjust(self, tokens):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+# Single-entry cache for a rendered response, with stale-while-revalidate.
+#
+# - Fresh entries (younger than `ttl` and not invalidated) are served as is.
+# - Stale entries (expired or invalidated, but younger than `ttl + stale_ttl`) are served
+#   immediately while exactly one background thread renders a replacement.
+# - Without a usable entry, one caller renders and concurrent callers wait for its result,
+#   so a burst of viewers never turns into a burst of identical database queries.
+class StaleWhileRevalidateCache:
+    def __init__(self, ttl=30.0, stale_ttl=300.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._async_render_lock = asyncio.Lock()
+        self._entry = None  # (body, etag, rendered_at, version)
+        self._version = 0
+        self._refreshing = False
+        self._refresh_task = None
+
+        # Metrics
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+        self._last_refresh_duration = 0.0
+        self._refresh_times = deque(maxlen=1000)
+
+    @staticmethod
+    def make_etag(body):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        return hashlib.sha1(data).hexdigest()
+
+    # Mark the cached body as outdated; it is still served (stale) until a refresh finishes
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    # Return (body, etag). `render` produces the body; `spawn(fn)` runs a background
+    # refresh (defaults to a daemon thread, callers may wrap it to carry a context).
+    def get(self, render, spawn=None):
+        if self.ttl <= 0:
+            body = render()
+            return body, self.make_etag(body)
+
+        fresh, stale, start_refresh = self._lookup()
+        if fresh is not None:
+            return fresh[0], fresh[1]
+        if stale is not None:
+            if start_refresh:
+                (spawn or self._spawn)(lambda: self._refresh(render))
+            return stale[0], stale[1]
+
+        # Nothing servable: render in the foreground, one caller at a time
+        with self._render_lock:
+            fresh = self._fresh_entry()
+            if fresh is not None:
+                return fresh[0], fresh[1]
+            return self._render(render)
+
+    # Async variant of get(): `render` is a coroutine function, refreshes run as tasks and
+    # concurrent misses wait on an asyncio lock instead of blocking the event loop
+    async def aget(self, render):
+        if self.ttl <= 0:
+            body = await render()
+            return body, self.make_etag(body)
+
+        fresh, stale, start_refresh = self._lookup()
+        if fresh is not None:
+            return fresh[0], fresh[1]
+        if stale is not None:
+            if start_refresh:
+                # Keep a reference so the task is not garbage collected mid-render
+                self._refresh_task = asyncio.ensure_future(self._arefresh(render))
+            return stale[0], stale[1]
+
+        async with self._async_render_lock:
+            fresh = self._fresh_entry()
+            if fresh is not None:
+                return fresh[0], fresh[1]
+            return await self._arender(render)
+
+    # (fresh entry, stale entry, whether to start a refresh), counting the hit or miss
+    def _lookup(self):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry
+            if entry is not None:
+                age = now - entry[2]
+                if age < self.ttl and entry[3] == self._version:
+                    self._hits += 1
+                    return entry, None, False
+                if age < self.ttl + self.stale_ttl:
+                    self._stale_hits += 1
+                    start_refresh = not self._refreshing
+                    self._refreshing = True
+                    return None, entry, start_refresh
+            self._misses += 1
+            return None, None, False
+
+    def _fresh_entry(self):
+        with self._lock:
+            entry = self._entry
+            if entry is not None and time.monotonic() - entry[2] < self.ttl and entry[3] == self._version:
+                return entry
+            return None
+
+    def _spawn(self, target):
+        threading.Thread(target=target, daemon=True).start()
+
+    def _refresh(self, render):
+        try:
+            with self._render_lock:
+                self._render(render)
+        except Exception:
+            logger.exception("Background refresh of cached response failed")
+            with self._lock:
+                self._refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    async def _arefresh(self, render):
+        try:
+            async with self._async_render_lock:
+                await self._arender(render)
+        except Exception:
+            logger.exception("Background refresh of cached response failed")
+            with self._lock:
+                self._refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _render(self, render):
+        with self._lock:
+            version = self._version
+        start = time.monotonic()
+        return self._store(render(), version, start)
+
+    async def _arender(self, render):
+        with self._lock:
+            version = self._version
+        start = time.monotonic()
+        return self._store(await render(), version, start)
+
+    def _store(self, body, version, start):
+        etag = self.make_etag(body)
+        finished = time.monotonic()
+        with self._lock:
+            self._entry = (body, etag, start, version)
+            self._refreshes += 1
+            self._last_refresh_duration = finished - start
+            self._refresh_times.append(finished)
+        return body, etag
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(1 for t in self._refresh_times if now - t < 60)
+            return {
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'refreshes': self._refreshes,
+                'refresh_errors': self._refresh_errors,
+                'refreshes_per_minute': recent,
+                'last_refresh_duration': round(self._last_refresh_duration, 6),
+                'age': round(now - self._entry[2], 3) if self._entry else None,
+            }
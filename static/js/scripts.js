@@ -1,31 +1,30 @@
-// Dashboard chart initialization
-function initializeSentimentChart(sentimentData) {
-    const labels = sentimentData.map(item => item.sentiment);
-    const counts = sentimentData.map(item => item.count);
-    const percentages = sentimentData.map(item => item.percentage);
+const SENTIMENT_COLORS = {
+    POSITIVO: 'rgba(75, 192, 192, 1)',
+    NEGATIVO: 'rgba(255, 99, 132, 1)',
+    INCONCLUSIVO: 'rgba(108, 117, 125, 1)'  // Grey for INCONCLUSIVO
+};
+
+function sentimentColor(label, alpha) {
+    const color = SENTIMENT_COLORS[label] || SENTIMENT_COLORS.INCONCLUSIVO;
+    return alpha === undefined ? color : color.replace(', 1)', `, ${alpha})`);
+}
+
+// Dashboard chart initialization (sentiments come as parallel arrays from /dashboard/data)
+function initializeSentimentChart(sentiments) {
+    const labels = sentiments.labels;
+    const counts = sentiments.counts;
+    const percentages = sentiments.percentages;
 
     const ctx = document.getElementById('sentimentChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'bar',
         data: {
             labels: labels,
             datasets: [{
                 label: 'Feedbacks',
                 data: counts,
-                backgroundColor: labels.map(label => {
-                    switch(label) {
-                        case 'POSITIVO': return 'rgba(75, 192, 192, 0.2)';
-                        case 'NEGATIVO': return 'rgba(255, 99, 132, 0.2)';
-                        default: return 'rgba(108, 117, 125, 0.2)';  // Grey for INCONCLUSIVO
-                    }
-                }),
-                borderColor: labels.map(label => {
-                    switch(label) {
-                        case 'POSITIVO': return 'rgba(75, 192, 192, 1)';
-                        case 'NEGATIVO': return 'rgba(255, 99, 132, 1)';
-                        default: return 'rgba(108, 117, 125, 1)';  // Grey for INCONCLUSIVO
-                    }
-                }),
+                backgroundColor: labels.map(label => sentimentColor(label, 0.2)),
+                borderColor: labels.map(label => sentimentColor(label)),
                 borderWidth: 1
             }]
         },
@@ -52,6 +51,97 @@ function initializeSentimentChart(sentimentData) {
     });
 }
 
+// Feedbacks per sentiment over time; the series arrive zero-filled, one value per bucket
+function timelineDatasets(timeline) {
+    return Object.keys(timeline.series).map(sentiment => ({
+        label: sentiment,
+        data: timeline.series[sentiment],
+        borderColor: sentimentColor(sentiment),
+        backgroundColor: sentimentColor(sentiment, 0.2),
+        fill: false,
+        tension: 0.2
+    }));
+}
+
+function initializeTimelineChart(timeline) {
+    const ctx = document.getElementById('timelineChart').getContext('2d');
+    return new Chart(ctx, {
+        type: 'line',
+        data: {labels: timeline.labels, datasets: timelineDatasets(timeline)},
+        options: {scales: {y: {beginAtZero: true}}}
+    });
+}
+
+function renderSummary(data) {
+    document.getElementById('totalFeedbacks').textContent = data.total;
+
+    const progress = document.getElementById('sentimentProgress');
+    progress.innerHTML = '';
+    data.sentiments.labels.forEach((sentiment, index) => {
+        const percentage = data.sentiments.percentages[index];
+        const bar = document.createElement('div');
+        switch(sentiment) {
+            case 'POSITIVO': bar.className = 'progress-bar bg-success'; break;
+            case 'NEGATIVO': bar.className = 'progress-bar bg-danger'; break;
+            default: bar.className = 'progress-bar bg-secondary';
+        }
+        bar.setAttribute('role', 'progressbar');
+        bar.style.width = `${percentage}%`;
+        bar.textContent = `${sentiment} (${percentage}%)`;
+        progress.appendChild(bar);
+    });
+
+    const features = document.getElementById('topFeatures');
+    features.innerHTML = '';
+    data.top_features.codes.forEach((code, index) => {
+        const item = document.createElement('div');
+        item.className = 'list-group-item d-flex justify-content-between align-items-center py-3';
+        const title = document.createElement('h5');
+        title.className = 'mb-0';
+        title.textContent = code;
+        const badge = document.createElement('span');
+        badge.className = 'badge badge-primary badge-pill';
+        badge.textContent = data.top_features.counts[index];
+        item.append(title, badge);
+        features.appendChild(item);
+    });
+}
+
+// Dashboard figures, loaded after the page shell from GET /dashboard/data
+function initializeDashboard() {
+    if (!document.getElementById('totalFeedbacks')) {
+        return;
+    }
+    const bucketSelect = document.getElementById('timelineBucket');
+    let timelineChart = null;
+
+    async function loadData(query) {
+        try {
+            const response = await fetch('/dashboard/data' + (query ? '?' + query : ''));
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error);
+            }
+            if (!timelineChart) {
+                renderSummary(data);
+                initializeSentimentChart(data.sentiments);
+                timelineChart = initializeTimelineChart(data.timeline);
+            } else {
+                timelineChart.data.labels = data.timeline.labels;
+                timelineChart.data.datasets = timelineDatasets(data.timeline);
+                timelineChart.update();
+            }
+        } catch (error) {
+            console.error('Error:', error);
+        }
+    }
+
+    if (bucketSelect) {
+        bucketSelect.addEventListener('change', () => loadData(bucketSelect.value));
+    }
+    loadData('');
+}
+
 // Feedback form submission handler
 function initializeFeedbackForm() {
     const form = document.getElementById('feedbackForm');
@@ -97,14 +187,100 @@ function initializeFeedbackForm() {
     }
 }
 
+// Incrementally loaded feedback table (keyset pagination over GET /feedbacks,
+// or the ranked results of GET /feedbacks/search when there is a search text)
+function sentimentBadge(sentiment) {
+    const badge = document.createElement('span');
+    switch(sentiment) {
+        case 'POSITIVO': badge.className = 'badge badge-success'; break;
+        case 'NEGATIVO': badge.className = 'badge badge-danger'; break;
+        default: badge.className = 'badge sentiment-badge inconclusive';
+    }
+    badge.textContent = sentiment;
+    return badge;
+}
+
+function appendFeedbackRows(tableBody, items) {
+    items.forEach(item => {
+        const row = document.createElement('tr');
+        [item.id, item.feedback, null, item.feature_code || '-', item.feature_reason || '-', item.created_at]
+            .forEach((value, index) => {
+                const cell = document.createElement('td');
+                if (index === 2) {
+                    cell.appendChild(sentimentBadge(item.sentiment));
+                } else if (index === 1 && item.highlight) {
+                    // Escaped by the server; only the <mark> tags around matched terms are HTML
+                    cell.innerHTML = item.highlight;
+                } else {
+                    cell.textContent = value;
+                }
+                row.appendChild(cell);
+            });
+        tableBody.appendChild(row);
+    });
+}
+
+function initializeFeedbackTable() {
+    const tableBody = document.getElementById('feedbackTableBody');
+    const loadMore = document.getElementById('loadMoreFeedbacks');
+    const filters = document.getElementById('feedbackFilters');
+    if (!tableBody || !loadMore) {
+        return;
+    }
+
+    let filterParams = new URLSearchParams();
+
+    async function loadPage(cursor, replace) {
+        const params = new URLSearchParams(filterParams);
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        // Search results come ranked in a single page
+        const path = params.has('q') ? '/feedbacks/search?' : '/feedbacks?';
+        loadMore.disabled = true;
+        try {
+            const response = await fetch(path + params.toString());
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.error);
+            }
+            if (replace) {
+                tableBody.innerHTML = '';
+            }
+            appendFeedbackRows(tableBody, result.items);
+            loadMore.dataset.cursor = result.next_cursor || '';
+            loadMore.style.display = result.next_cursor ? 'block' : 'none';
+        } catch (error) {
+            console.error('Error:', error);
+        } finally {
+            loadMore.disabled = false;
+        }
+    }
+
+    loadMore.addEventListener('click', () => loadPage(loadMore.dataset.cursor, false));
+    // The first page is fetched after the page shell has rendered
+    loadPage(null, true);
+
+    if (filters) {
+        filters.addEventListener('submit', (e) => {
+            e.preventDefault();
+            filterParams = new URLSearchParams();
+            new FormData(filters).forEach((value, key) => {
+                if (value) {
+                    filterParams.set(key, value);
+                }
+            });
+            loadPage(null, true);
+        });
+    }
+}
+
 // Initialize all scripts
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize feedback form if it exists
     initializeFeedbackForm();
     
-    // Initialize sentiment chart if we're on the dashboard page
-    const sentimentData = window.sentimentData;
-    if (sentimentData) {
-        initializeSentimentChart(sentimentData);
-    }
+    // Load the dashboard figures and the paginated feedback table if we're on the dashboard page
+    initializeDashboard();
+    initializeFeedbackTable();
 });
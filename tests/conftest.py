@@ -0,0 +1,5 @@
+import os
+
+# The app tests mock the database, so the schema check of the first request is skipped unless a
+# test sets SCHEMA_STARTUP itself (see test_migrations.py and test_api.py)
+os.environ.setdefault('SCHEMA_STARTUP', 'off')
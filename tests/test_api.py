@@ -1,5 +1,11 @@
 import pytest
+import gzip
 import json
+import re
+import subprocess
+import time
+from datetime import date, timedelta
+from decimal import Decimal
 from unittest.mock import patch, MagicMock
 import sys
 import os
@@ -8,15 +14,27 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from api import app
-from src.reporting.report import generate_weekly_report
+from src.analysis.cache import clear_cache
+from src.database.database import close_pool
+from src.database.migrations import SchemaOutdated
+from src.analysis.analysis import FeedbackAnalysis
+
+
+# POST /feedbacks reserves the feedback id before analyzing it; these tests start from a free id
+def free_submission_ids():
+    return patch.multiple('src.ingestion.submissions', finish_submission=MagicMock(),
+                          reserve_submission=MagicMock(return_value={'reused': False, 'claimed': True}))
 
 
 @pytest.fixture
 def client():
     """Create a test client for the Flask app."""
     app.config['TESTING'] = True
+    close_pool()
+    clear_cache()
     with app.test_client() as client:
         yield client
+    close_pool()
 
 
 def test_health_check_endpoint(client):
@@ -27,9 +45,11 @@ def test_health_check_endpoint(client):
     assert data['status'] == 'ok'
 
 
-@patch('api.analyze_feedback_langchain')
-@patch('api.spam_filter')
-@patch('api.get_db_connection')
+@free_submission_ids()
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'two_call', 'FEATURE_CLUSTERING_ENABLED': 'false', 'PREFILTER_ENABLED': 'false'})
+@patch('src.analysis.analysis.analyze_feedback_langchain')
+@patch('src.analysis.analysis.spam_filter')
+@patch('src.database.database.get_db_connection')
 def test_create_feedback_endpoint(mock_get_db, mock_spam_filter, mock_analyze, client):
     """Test the feedback creation endpoint with valid data."""
     # Configure mocks
@@ -46,6 +66,7 @@ def test_create_feedback_endpoint(mock_get_db, mock_spam_filter, mock_analyze, c
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
     mock_get_db.return_value = mock_conn
+    mock_conn.closed = 0
     mock_conn.cursor.return_value = mock_cursor
     
     # Test data
@@ -75,4 +96,228 @@ def test_create_feedback_endpoint(mock_get_db, mock_spam_filter, mock_analyze, c
     mock_spam_filter.assert_called_once_with(test_feedback['feedback'])
     mock_analyze.assert_called_once_with(test_feedback['feedback'], test_feedback['id'])
     mock_cursor.execute.assert_called_once()
-    mock_conn.commit.assert_called_once()
\ No newline at end of file
+    mock_conn.commit.assert_called_once()
+
+
+@free_submission_ids()
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'FEATURE_CLUSTERING_ENABLED': 'false', 'PREFILTER_ENABLED': 'false'})
+@patch('src.analysis.analysis.get_structured_llm')
+@patch('src.database.database.get_db_connection')
+def test_create_feedback_combined_analysis(mock_get_db, mock_structured_llm, client):
+    """The combined mode analyzes the feedback with a single structured LLM call."""
+    structured_llm = mock_structured_llm.return_value
+    structured_llm.invoke.return_value = FeedbackAnalysis(
+        is_spam=False,
+        sentiment='NEGATIVO',
+        feature_code='EDITAR PERFIL',
+        feature_reason='O usuário quer editar o próprio perfil'
+    )
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_get_db.return_value = mock_conn
+
+    response = client.post('/feedbacks', json={'id': 'abc', 'feedback': 'Não consigo editar meu perfil.'})
+
+    assert response.status_code == 201
+    assert json.loads(response.data) == {
+        'id': 'abc',
+        'sentiment': 'NEGATIVO',
+        'feature_code': 'EDITAR PERFIL',
+        'feature_reason': 'O usuário quer editar o próprio perfil'
+    }
+    structured_llm.invoke.assert_called_once()
+    mock_conn.cursor.return_value.execute.assert_called_once()
+
+
+@free_submission_ids()
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined'})
+@patch('src.analysis.analysis.get_structured_llm')
+@patch('src.database.database.get_db_connection')
+def test_create_feedback_combined_spam(mock_get_db, mock_structured_llm, client):
+    """A spam verdict from the combined call is rejected without touching the database."""
+    structured_llm = mock_structured_llm.return_value
+    structured_llm.invoke.return_value = FeedbackAnalysis(is_spam=True)
+
+    response = client.post('/feedbacks', json={'id': 'spam1', 'feedback': 'compre agora!!!'})
+
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'Feedback is spam'
+    mock_get_db.assert_not_called()
+
+
+@patch('api.get_feedbacks_page')
+def test_list_feedbacks_endpoint(mock_page, client):
+    """GET /feedbacks returns one page plus the cursor of the next one."""
+    from datetime import datetime
+    mock_page.return_value = ([{
+        'id': 'f1', 'feedback': 'Ótimo app', 'sentiment': 'POSITIVO',
+        'feature_code': None, 'feature_reason': None, 'created_at': datetime(2024, 5, 1, 12, 0)
+    }], 'next-page')
+
+    response = client.get('/feedbacks?limit=1&sentiment=POSITIVO&start=2024-05-01')
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['next_cursor'] == 'next-page'
+    assert data['items'][0]['created_at'] == '2024-05-01T12:00:00'
+    mock_page.assert_called_once_with(limit=1, cursor=None, sentiment='POSITIVO', feature_code=None,
+                                      start=datetime(2024, 5, 1), end=None)
+
+
+def test_list_feedbacks_rejects_bad_filters(client):
+    """Invalid cursors, sentiments and dates are client errors."""
+    assert client.get('/feedbacks?cursor=not-a-cursor').status_code == 400
+    assert client.get('/feedbacks?sentiment=FELIZ').status_code == 400
+    assert client.get('/feedbacks?start=ontem').status_code == 400
+
+
+@patch('src.database.database.get_db_connection')
+def test_feedbacks_page_uses_keyset_cursor(mock_get_db, client):
+    """The cursor of a full page resumes strictly after its last (created_at, id)."""
+    from datetime import datetime
+    from src.database.database import get_feedbacks_page, decode_cursor
+    rows = [
+        {'id': 'b', 'created_at': datetime(2024, 5, 2)},
+        {'id': 'a', 'created_at': datetime(2024, 5, 1)},
+        {'id': 'z', 'created_at': datetime(2024, 4, 30)},
+    ]
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_conn.cursor.return_value.fetchall.return_value = rows
+    mock_get_db.return_value = mock_conn
+
+    feedbacks, cursor = get_feedbacks_page(limit=2)
+    assert [row['id'] for row in feedbacks] == ['b', 'a']
+    assert decode_cursor(cursor) == (datetime(2024, 5, 1), 'a')
+
+    get_feedbacks_page(limit=2, cursor=cursor, feature_code='LOGIN')
+    sql, params = mock_conn.cursor.return_value.execute.call_args.args
+    assert '(created_at, id) < (%s, %s)' in sql
+    assert params == [datetime(2024, 5, 1), 'a', 'LOGIN', 3]
+
+
+@patch('src.database.database.get_db_connection')
+def test_search_feedbacks_endpoint(mock_get_db, client):
+    """GET /feedbacks/search returns ranked matches with escaped, highlighted excerpts."""
+    from datetime import datetime
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_conn.cursor.return_value.fetchall.return_value = [{
+        'id': 'f1', 'feedback': 'As <b>notificações</b> não chegam', 'sentiment': 'NEGATIVO',
+        'feature_code': 'NOTIFICACOES', 'feature_reason': None, 'created_at': datetime(2024, 5, 1, 12, 0),
+        'rank': 0.1, 'highlight': 'As \x02notificações\x03 não chegam <b>'
+    }]
+    mock_get_db.return_value = mock_conn
+
+    response = client.get('/feedbacks/search?q=notificações&sentiment=NEGATIVO&limit=10')
+
+    assert response.status_code == 200
+    item = json.loads(response.data)['items'][0]
+    assert item['highlight'] == 'As <mark>notificações</mark> não chegam &lt;b&gt;'
+    assert item['created_at'] == '2024-05-01T12:00:00'
+    sql, params = mock_conn.cursor.return_value.execute.call_args.args
+    assert 'search_vector @@ websearch_to_tsquery' in sql
+    assert params[-4:] == ['notificações', 'NEGATIVO', 1000, 10]
+
+    assert client.get('/feedbacks/search?q=%20').status_code == 400
+
+
+@patch('api.render_dashboard_data', return_value='{"total":1}')
+def test_dashboard_etag_and_invalidation(mock_render, client):
+    """The dashboard data is cached, answers 304 to matching ETags and re-renders after writes."""
+    from api import dashboard_cache
+    from src.database.database import _notify_feedbacks_changed
+    dashboard_cache.invalidate()
+    dashboard_cache._entry = None
+
+    first = client.get('/dashboard/data')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    cached = client.get('/dashboard/data', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert mock_render.call_count == 1
+
+    # A write marks the data stale; it is served once more while being re-rendered
+    mock_render.return_value = '{"total":2}'
+    _notify_feedbacks_changed()
+    stale = client.get('/dashboard/data')
+    assert stale.data == b'{"total":1}'
+    for _ in range(100):
+        if dashboard_cache.stats()['refreshes'] == 2:
+            break
+        time.sleep(0.01)
+    refreshed = client.get('/dashboard/data', headers={'If-None-Match': etag})
+    assert refreshed.status_code == 200
+    assert refreshed.data == b'{"total":2}'
+
+
+@patch('api.get_feedback_timeline')
+@patch('api.get_top_requested_features', return_value=[{'feature_code': 'LOGIN', 'count_value': 7}])
+@patch('api.get_sentiment_data', return_value=[{'sentiment': 'POSITIVO', 'count': 3, 'percentage': Decimal('60.0')},
+                                               {'sentiment': 'NEGATIVO', 'count': 2, 'percentage': Decimal('40.0')}])
+@patch('api.get_total_feedback_count', return_value=5)
+def test_dashboard_data_is_aggregated_and_compressed(mock_total, mock_sentiments, mock_features, mock_timeline,
+                                                     client):
+    """The data API returns parallel arrays and a zero-filled timeline, gzipped on request."""
+    monday = date.today() - timedelta(days=date.today().weekday())
+    mock_timeline.return_value = [{'bucket': monday, 'sentiment': 'NEGATIVO', 'count': 4}]
+
+    with patch.dict(os.environ, {'COMPRESSION_MIN_SIZE': '10'}):
+        response = client.get('/dashboard/data?bucket=week&days=14', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    data = json.loads(gzip.decompress(response.data))
+    assert data['sentiments'] == {'labels': ['POSITIVO', 'NEGATIVO'], 'counts': [3, 2], 'percentages': [60.0, 40.0]}
+    assert data['top_features'] == {'codes': ['LOGIN'], 'counts': [7]}
+    timeline = data['timeline']
+    assert timeline['bucket'] == 'week' and timeline['labels'][-1] == monday.isoformat()
+    assert timeline['series'] == {'NEGATIVO': [0] * (len(timeline['labels']) - 1) + [4]}
+    assert mock_timeline.call_args.args == ('week', date.fromisoformat(timeline['labels'][0]))
+
+    assert client.get('/dashboard/data?bucket=hour').status_code == 400
+
+
+def test_dashboard_shell_links_versioned_static_files(client):
+    """The page is a data-free shell; its static files are versioned, long-lived and compressed."""
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert 'feedbackTableBody"></tbody>' in page
+    script = re.search(r'src="(/static/js/scripts\.js\?v=\w+)"', page).group(1)
+
+    response = client.get(script, headers={'Accept-Encoding': 'br, gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] in ('br', 'gzip')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['ETag'].startswith('W/')
+
+    revalidated = client.get(script, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+@patch('api.get_feedback_status', return_value={'id': 'f1', 'status': 'DONE'})
+@patch('src.database.database._schema_ready', False)
+@patch('src.database.database.ensure_schema', side_effect=[SchemaOutdated('missing migrations 6'), None])
+def test_schema_is_checked_on_the_first_request_that_needs_it(mock_ensure_schema, mock_status):
+    """Creating the app touches no database; a failed check answers 503 and is retried."""
+    from api import create_app
+    with create_app().test_client() as client:
+        assert client.get('/health').status_code == 200
+        mock_ensure_schema.assert_not_called()
+
+        failed = client.get('/feedbacks/f1')
+        assert (failed.status_code, failed.get_json()) == (503, {'error': 'missing migrations 6'})
+        assert client.get('/feedbacks/f1').status_code == 200
+        assert client.get('/feedbacks/f1').status_code == 200
+    assert mock_ensure_schema.call_count == 2
+
+
+def test_import_leaves_llm_and_smtp_modules_for_first_use():
+    """Importing the app loads neither LangChain/OpenAI nor the report and e-mail code."""
+    code = ("import sys, api; print(','.join(sorted(m for m in ('langchain_core', 'langchain_openai', 'openai', "
+            "'smtplib', 'src.reporting.report') if m in sys.modules)))")
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    env = dict(os.environ, INGESTION_MODE='sync')
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
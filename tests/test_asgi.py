@@ -0,0 +1,111 @@
+import pytest
+import asyncio
+import sys
+import os
+from unittest.mock import patch, AsyncMock
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from src.analysis.analysis import FeedbackAnalysis
+from src.analysis.cache import clear_cache
+from src.utils.gateway import LLMGateway
+from src.utils.llm import get_llm, reset_llm_clients
+from src.utils.response_cache import StaleWhileRevalidateCache
+
+asgi = pytest.importorskip('asgi')
+
+
+def test_async_gateway_holds_many_pending_calls_without_threads():
+    """Awaited calls against a slow fake server overlap up to the concurrency cap."""
+    with FakeOpenAIServer(latency=0.2) as server:
+        with patch.dict(os.environ, {'OPENAI_BASE_URL': server.base_url, 'OPENAI_API_KEY': 'test',
+                                     'LLM_MAX_CONNECTIONS': '50'}):
+            reset_llm_clients()
+            try:
+                gateway = LLMGateway(max_concurrency=50, requests_per_minute=100000)
+
+                async def run():
+                    llm = get_llm()
+                    return await asyncio.gather(*[gateway.ainvoke('spam', llm, 'x%d' % i) for i in range(50)])
+
+                messages = asyncio.run(run())
+                stats = gateway.stats()
+            finally:
+                reset_llm_clients()
+
+    assert [m.content for m in messages] == ['Y'] * 50
+    assert stats['by_kind']['spam']['calls'] == {'ok': 50}
+    # Serially this would take 10s; overlapped it takes about one round trip
+    assert stats['by_kind']['spam']['latency_p99'] <= 2.5
+
+
+def test_async_dashboard_cache_renders_once_for_concurrent_misses():
+    cache = StaleWhileRevalidateCache(ttl=30, stale_ttl=300)
+    renders = []
+
+    async def render():
+        renders.append(1)
+        await asyncio.sleep(0.05)
+        return 'page'
+
+    async def run():
+        return await asyncio.gather(*[cache.aget(render) for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert {body for body, _ in results} == {'page'}
+    assert len(renders) == 1
+
+
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'FEATURE_CLUSTERING_ENABLED': 'false', 'PREFILTER_ENABLED': 'false'})
+@patch('src.analysis.analysis.get_structured_llm')
+@patch('asgi.finish_submission_async', new=AsyncMock())
+@patch('asgi.reserve_submission_async', new=AsyncMock(return_value={'reused': False, 'claimed': True}))
+@patch('asgi.insert_feedback_async', new_callable=AsyncMock)
+@patch('asgi.open_async_pool', new_callable=AsyncMock)
+@patch('asgi.ensure_schema_once')
+def test_asgi_create_feedback_keeps_the_response_contract(mock_ensure_schema, mock_open_pool, mock_insert,
+                                                          mock_structured_llm):
+    """POST /feedbacks answers like the WSGI app, analyzing with ainvoke."""
+    clear_cache()
+    mock_structured_llm.return_value.ainvoke = AsyncMock(return_value=FeedbackAnalysis(
+        is_spam=False, sentiment='NEGATIVO', feature_code='LOGIN', feature_reason='O app fecha ao fazer login'))
+
+    async def run():
+        async with asgi.app.test_app() as test_app:
+            client = test_app.test_client()
+            created = await client.post('/feedbacks', json={'id': 'a1', 'feedback': 'App fecha no login'})
+            invalid = await client.post('/feedbacks', json={'feedback': 'sem id'})
+            return created.status_code, await created.get_json(), invalid.status_code, await invalid.get_json()
+
+    status, body, invalid_status, invalid_body = asyncio.run(run())
+    clear_cache()
+
+    assert status == 201
+    assert body == {'id': 'a1', 'sentiment': 'NEGATIVO', 'feature_code': 'LOGIN',
+                    'feature_reason': 'O app fecha ao fazer login'}
+    assert (invalid_status, invalid_body) == (400, {'error': 'Invalid request data'})
+    mock_insert.assert_awaited_once()
+    assert mock_insert.await_args.args[0]['id'] == 'a1'
+
+
+@patch('asgi.get_prefilter_stats', return_value={})
+@patch('src.database.database.get_pool', side_effect=AssertionError('the sync pool must not be opened'))
+@patch('asgi.open_async_pool', new_callable=AsyncMock)
+@patch('asgi.ensure_schema_once')
+def test_asgi_stats_and_metrics_do_not_open_the_sync_pool(mock_ensure_schema, mock_open_pool, mock_get_pool,
+                                                          mock_prefilter_stats):
+    """/stats and /metrics answer with the database down instead of connecting from the event loop."""
+    async def run():
+        async with asgi.app.test_app() as test_app:
+            client = test_app.test_client()
+            stats = await client.get('/stats')
+            metrics = await client.get('/metrics')
+            return stats.status_code, await stats.get_json(), metrics.status_code
+
+    stats_status, stats_body, metrics_status = asyncio.run(run())
+
+    assert (stats_status, metrics_status) == (200, 200)
+    assert 'db_pool' in stats_body
+    mock_get_pool.assert_not_called()
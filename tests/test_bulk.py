@@ -0,0 +1,110 @@
+import io
+import json
+import sys
+import os
+from unittest.mock import patch
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import app
+from src.ingestion.bulk import BulkImporter, read_feedback_items, stream_report, summarize
+
+
+def fake_batch_analysis(feedbacks):
+    """Label 'spam' texts as spam and everything else as a positive feedback."""
+    return [
+        {'is_spam': 'spam' in text, 'sentiment': None if 'spam' in text else 'POSITIVO',
+         'feature_code': None, 'feature_reason': None}
+        for text in feedbacks
+    ]
+
+
+@patch('src.ingestion.bulk.insert_feedbacks_bulk', side_effect=lambda rows: {row['id'] for row in rows})
+@patch('src.ingestion.bulk.get_existing_feedback_ids', return_value={'old'})
+@patch('src.ingestion.bulk.analyze_feedback_batch', side_effect=fake_batch_analysis)
+def test_bulk_import_reports_every_item(mock_analyze, mock_existing, mock_insert):
+    """Every input item gets exactly one status, and known ids cost no LLM calls."""
+    items = [
+        {'id': 'a', 'feedback': 'adoro o app'},
+        {'id': 'old', 'feedback': 'já importado'},
+        {'id': 'b', 'feedback': 'spam spam spam'},
+        {'id': 'a', 'feedback': 'repetido no arquivo'},
+        {'id': 'c'},
+        {'id': 'd', 'feedback': 'quero mais meditações'},
+    ]
+    importer = BulkImporter(concurrency=2, batch_size=2, chunk_size=4, rate_limit=6000)
+
+    results = list(importer.run(items))
+
+    assert [(r['id'], r['status']) for r in results] == [
+        ('a', 'inserted'), ('old', 'duplicate'), ('b', 'spam'), ('a', 'duplicate'), ('c', 'failed'), ('d', 'inserted')
+    ]
+    analyzed = [text for call in mock_analyze.call_args_list for text in call.args[0]]
+    assert sorted(analyzed) == ['adoro o app', 'quero mais meditações', 'spam spam spam']
+    assert mock_insert.call_count == 2  # one transaction per chunk
+    assert summarize(results) == {'inserted': 2, 'duplicate': 2, 'spam': 1, 'failed': 1, 'total': 6}
+
+
+@patch('src.ingestion.bulk.insert_feedbacks_bulk', return_value=set())
+@patch('src.ingestion.bulk.get_existing_feedback_ids', return_value=set())
+@patch('src.ingestion.bulk.analyze_feedback_batch', side_effect=fake_batch_analysis)
+def test_rows_lost_to_concurrent_insert_are_duplicates(mock_analyze, mock_existing, mock_insert):
+    """Rows skipped by ON CONFLICT DO NOTHING are reported as duplicates."""
+    results = list(BulkImporter(rate_limit=6000).run([{'id': 'x', 'feedback': 'bom app'}]))
+    assert results == [{'id': 'x', 'status': 'duplicate'}]
+
+
+@patch('src.ingestion.bulk.insert_feedbacks_bulk', side_effect=lambda rows: {row['id'] for row in rows})
+@patch('src.ingestion.bulk.get_existing_feedback_ids', return_value={'7'})
+@patch('src.ingestion.bulk.analyze_feedback_batch', side_effect=fake_batch_analysis)
+def test_numeric_ids_are_stored_as_text(mock_analyze, mock_existing, mock_insert):
+    """JSON number ids match the TEXT id column; ids of other types fail on their own."""
+    items = [{'id': 42, 'feedback': 'bom app'}, {'id': 7, 'feedback': 'já importado'}, {'id': '42', 'feedback': 'repetido'},
+             {'id': [1], 'feedback': 'id inválido'}, {'id': True, 'feedback': 'id inválido'}]
+    results = list(BulkImporter(rate_limit=6000).run(items))
+
+    assert [(r['id'], r['status']) for r in results] == [
+        ('42', 'inserted'), ('7', 'duplicate'), ('42', 'duplicate'), ([1], 'failed'), (True, 'failed')]
+    assert mock_existing.call_args.args[0] == ['42', '7']
+    assert [row['id'] for row in mock_insert.call_args.args[0]] == ['42']
+
+
+def test_read_csv_and_jsonl():
+    """Both input formats stream {'id', 'feedback'} items; bad JSON lines become errors."""
+    csv_items = list(read_feedback_items(io.StringIO('id,feedback\n1,"Olá, tudo bem"\n'), 'csv'))
+    assert csv_items == [{'id': '1', 'feedback': 'Olá, tudo bem'}]
+
+    jsonl_items = list(read_feedback_items(io.StringIO('{"id": "1", "feedback": "ok"}\n\nnot json\n')))
+    assert jsonl_items[0] == {'id': '1', 'feedback': 'ok'}
+    assert jsonl_items[1] == {'_error': 'Invalid JSON on line 3'}
+
+
+@patch('src.ingestion.bulk.insert_feedbacks_bulk', side_effect=lambda rows: {row['id'] for row in rows})
+@patch('src.ingestion.bulk.get_existing_feedback_ids', return_value=set())
+@patch('src.ingestion.bulk.analyze_feedback_batch', side_effect=fake_batch_analysis)
+def test_bulk_endpoint_accepts_jsonl(mock_analyze, mock_existing, mock_insert):
+    """POST /feedbacks/bulk reads JSONL and streams the per-item report, then the summary."""
+    body = '{"id": "1", "feedback": "ótimo"}\n{"id": "2", "feedback": "spam"}\n'
+    with app.test_client() as client:
+        response = client.post('/feedbacks/bulk', data=body, content_type='application/x-ndjson')
+        assert response.is_streamed
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert lines[:-1] == [{'id': '1', 'status': 'inserted'}, {'id': '2', 'status': 'spam'}]
+    assert lines[-1]['summary']['inserted'] == 1 and lines[-1]['summary']['spam'] == 1
+
+
+def test_report_ends_with_the_error_when_the_import_stops():
+    """Items already reported stay in the stream; the last line carries the error and partial counts."""
+    def results():
+        yield {'id': 'a', 'status': 'inserted'}
+        raise RuntimeError('database is down')
+
+    lines = [json.loads(line) for line in stream_report(results())]
+
+    assert lines[0] == {'id': 'a', 'status': 'inserted'}
+    assert lines[1]['error'] == 'database is down'
+    assert lines[1]['summary']['inserted'] == 1 and lines[1]['summary']['total'] == 1
@@ -0,0 +1,88 @@
+import pytest
+import json
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import app
+from src.analysis.analysis import FeedbackAnalysis
+from src.analysis.cache import LRUCache, cache_key, cached_llm_call, clear_cache, get_cache_stats, normalize_text
+from src.database.database import close_pool
+
+
+# POST /feedbacks reserves the feedback id before analyzing it; these tests start from a free id
+def free_submission_ids():
+    return patch.multiple('src.ingestion.submissions', finish_submission=MagicMock(),
+                          reserve_submission=MagicMock(return_value={'reused': False, 'claimed': True}))
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+def test_normalized_text_shares_cache_key():
+    """Case, accents, punctuation and spacing do not change the cache key."""
+    assert normalize_text("  App   CRASHA no Login!!! ") == "app crasha no login"
+    assert cache_key('spam', "Meditação guiada", 'v1', 'm') == cache_key('spam', "meditacao  GUIADA.", 'v1', 'm')
+    assert cache_key('spam', "meditacao", 'v1', 'm') != cache_key('spam', "meditacao", 'v2', 'm')
+    assert cache_key('spam', "meditacao", 'v1', 'm') != cache_key('spam', "meditacao", 'v1', 'other-model')
+
+
+def test_lru_evicts_oldest_and_expires_entries():
+    """The in-process tier is bounded and honours the entry TTL."""
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    cache.set('d', 4, ttl=-1)
+    assert cache.get('d') is None
+
+
+def test_model_change_invalidates_entries():
+    """Switching OPENAI_MODEL misses the cache instead of reusing old labels."""
+    compute = MagicMock(return_value={'valid': True})
+    with patch.dict(os.environ, {'OPENAI_MODEL': 'model-a'}):
+        cached_llm_call('spam', "texto", 'v1', compute)
+        cached_llm_call('spam', "texto", 'v1', compute)
+    with patch.dict(os.environ, {'OPENAI_MODEL': 'model-b'}):
+        cached_llm_call('spam', "texto", 'v1', compute)
+
+    assert compute.call_count == 2
+    stats = get_cache_stats()
+    assert stats['memory_hits'] == 1
+    assert stats['misses'] == 2
+
+
+@free_submission_ids()
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'FEATURE_CLUSTERING_ENABLED': 'false', 'PREFILTER_ENABLED': 'false'})
+@patch('src.analysis.analysis.get_structured_llm')
+@patch('src.database.database.get_db_connection')
+def test_duplicate_feedback_is_served_from_cache(mock_get_db, mock_structured_llm):
+    """A resubmitted complaint skips the LLM but is still stored under the caller's id."""
+    mock_structured_llm.return_value.invoke.return_value = FeedbackAnalysis(
+        is_spam=False, sentiment='NEGATIVO', feature_code='LOGIN', feature_reason='O app fecha ao fazer login')
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_get_db.return_value = mock_conn
+    close_pool()
+
+    with app.test_client() as client:
+        first = client.post('/feedbacks', json={'id': 'u1', 'feedback': 'App crashes on login'})
+        second = client.post('/feedbacks', json={'id': 'u2', 'feedback': 'app crashes on login!!'})
+
+    close_pool()
+    assert first.status_code == 201 and second.status_code == 201
+    assert json.loads(second.data)['id'] == 'u2'
+    assert mock_structured_llm.return_value.invoke.call_count == 1
+    inserted_ids = [c.args[1][0] for c in mock_conn.cursor.return_value.execute.call_args_list]
+    assert inserted_ids == ['u1', 'u2']
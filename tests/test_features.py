@@ -0,0 +1,49 @@
+import pytest
+import sys
+import os
+import numpy as np
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analysis.features import HashingEmbedder, FeatureIndex, FeatureClusterer
+
+
+def test_hashing_embedder_groups_spelling_variants():
+    """Accents, plurals and filler words do not split one feature into several."""
+    embedder = HashingEmbedder()
+    vectors = embedder.embed(['MEDITACAO_GUIADA', 'MEDITAÇÕES GUIADAS', 'MAIS_MEDITACAO', 'DIARIO_HUMOR'])
+    similarity = vectors @ vectors.T
+
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert similarity[0, 1] > 0.99
+    assert similarity[0, 2] > 0.7
+    assert similarity[0, 3] < 0.3
+
+
+def test_feature_index_returns_nearest_cluster():
+    index = FeatureIndex(2)
+    assert index.nearest(np.array([1.0, 0.0])) == (None, 0.0)
+
+    index.add(7, np.array([1.0, 0.0]))
+    index.add(9, np.array([0.0, 1.0]))
+    cluster_id, score = index.nearest(np.array([0.6, 0.8]))
+    assert cluster_id == 9
+    assert score == pytest.approx(0.8)
+
+
+@patch('src.analysis.features.get_feature_clusters', return_value=[])
+@patch('src.analysis.features.create_feature_cluster')
+def test_clusterer_assigns_incrementally(mock_create, mock_clusters):
+    """Similar codes join the first cluster; a different feature gets a new one."""
+    mock_create.side_effect = [1, 2]
+    clusterer = FeatureClusterer(HashingEmbedder(), threshold=0.7, reason_weight=0)
+
+    assert clusterer.assign('MEDITACAO_GUIADA') == 1
+    assert clusterer.assign('MEDITACOES_GUIADAS') == 1
+    assert clusterer.assign('MAIS_MEDITACAO') == 1
+    assert clusterer.assign('MODO_ESCURO') == 2
+    assert clusterer.assign('MEDITACAO_GUIADA') == 1
+
+    assert [c.args[0] for c in mock_create.call_args_list] == ['MEDITACAO_GUIADA', 'MODO_ESCURO']
@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+import httpx
+import openai
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from src.utils.gateway import LLMGateway, LLMUnavailable, MalformedOutput, reset_gateway, get_gateway
+from src.utils.llm import get_llm, reset_llm_clients
+
+
+def test_gateway_retries_rate_limits_against_fake_server():
+    """429s from the provider are retried with backoff and the final call is metered."""
+    with FakeOpenAIServer(fail_first=2, error_status=429) as server:
+        with patch.dict(os.environ, {'OPENAI_BASE_URL': server.base_url, 'OPENAI_API_KEY': 'test',
+                                     'OPENAI_MODEL': 'gpt-4o-mini', 'LLM_RETRY_BASE': '0.01'}):
+            reset_llm_clients()
+            reset_gateway()
+            try:
+                message = get_gateway().invoke('spam', get_llm(), 'Feedback: "Adoro o app"')
+                stats = get_gateway().stats()['by_kind']['spam']
+            finally:
+                reset_llm_clients()
+                reset_gateway()
+
+    assert message.content == 'Y'
+    assert server.requests == 3
+    assert stats['calls'] == {'ok': 1}
+    assert stats['attempts'] == {'rate_limited': 2, 'ok': 1}
+    assert stats['prompt_tokens'] > 0 and stats['completion_tokens'] > 0
+    assert stats['estimated_cost_usd'] > 0
+
+
+def test_gateway_gives_up_with_llm_unavailable():
+    """Persistent server errors end in LLMUnavailable; other errors are not retried."""
+    with FakeOpenAIServer(error_rate=1.0, error_status=503) as server:
+        with patch.dict(os.environ, {'OPENAI_BASE_URL': server.base_url, 'OPENAI_API_KEY': 'test'}):
+            reset_llm_clients()
+            try:
+                gateway = LLMGateway(max_retries=2, retry_base=0.01)
+                with pytest.raises(LLMUnavailable):
+                    gateway.invoke('spam', get_llm(), 'x')
+            finally:
+                reset_llm_clients()
+    assert server.requests == 3
+
+    calls = []
+    with pytest.raises(ValueError):
+        gateway.call('spam', lambda: calls.append(1) or (_ for _ in ()).throw(ValueError('bad')))
+    assert calls == [1]
+
+
+def test_gateway_caps_concurrency():
+    """No more than max_concurrency calls run at once; the rest wait for a slot."""
+    gateway = LLMGateway(max_concurrency=2, queue_timeout=5)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def slow_call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    threads = [threading.Thread(target=gateway.call, args=('test', slow_call)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert gateway.stats()['by_kind']['test']['calls'] == {'ok': 6}
+
+
+def test_rejected_call_gives_back_its_budget():
+    """A call that times out waiting for a slot returns its request and token reservations."""
+    gateway = LLMGateway(requests_per_minute=60, tokens_per_minute=6000, max_concurrency=1, queue_timeout=0.05)
+    gateway._slots.acquire()
+    try:
+        with pytest.raises(LLMUnavailable):
+            gateway.call('spam', lambda: 'never', estimated_prompt_tokens=1000)
+    finally:
+        gateway._slots.release()
+
+    assert gateway.requests.try_acquire(60)
+    assert gateway.tokens.try_acquire(6000)
+
+
+def test_malformed_structured_reply_is_retried():
+    """A reply that fails schema parsing counts as a retryable attempt, not as a success."""
+    gateway = LLMGateway(max_retries=2, retry_base=0)
+    replies = iter([
+        {'raw': None, 'parsed': None, 'parsing_error': ValueError('missing field sentiment')},
+        {'raw': None, 'parsed': 'ok', 'parsing_error': None},
+    ])
+    assert gateway.call('combined', lambda: next(replies)) == 'ok'
+    stats = gateway.stats()['by_kind']['combined']
+    assert stats['attempts'] == {'parse_error': 1, 'ok': 1}
+    assert stats['calls'] == {'ok': 1}
+
+    with pytest.raises(MalformedOutput, match='missing field'):
+        LLMGateway(max_retries=0).call('combined', lambda: {
+            'raw': None, 'parsed': None, 'parsing_error': ValueError('missing field sentiment')})
+
+
+def test_long_retry_after_is_not_waited_for():
+    """A Retry-After longer than the queue timeout fails fast; shorter ones are capped at retry_max."""
+    def rate_limited(retry_after):
+        request = httpx.Request('POST', 'http://llm.test/v1/chat/completions')
+        response = httpx.Response(429, headers={'retry-after': retry_after}, request=request)
+        return openai.RateLimitError('Too Many Requests', response=response, body=None)
+
+    gateway = LLMGateway(max_retries=3, queue_timeout=30, retry_max=0.01)
+    calls = []
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable) as raised:
+        gateway.call('spam', lambda: calls.append(1) or (_ for _ in ()).throw(rate_limited('3600')))
+    assert calls == [1] and raised.value.retry_after == 3600
+    assert time.monotonic() - start < 1
+
+    replies = iter([rate_limited('20'), 'ok'])
+    def flaky():
+        reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    assert gateway.call('spam', flaky) == 'ok'
+    assert time.monotonic() - start < 1
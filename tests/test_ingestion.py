@@ -0,0 +1,115 @@
+import pytest
+import json
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import app
+from src.analysis.analysis import COMBINED_PROMPT_VERSION
+from src.ingestion.worker import IngestionWorkerPool, backoff_delay, process_feedback_job
+
+
+# POST /feedbacks reserves the feedback id before analyzing it; these tests start from a free id
+def free_submission_ids():
+    return patch.multiple('src.ingestion.submissions', finish_submission=MagicMock(),
+                          reserve_submission=MagicMock(return_value={'reused': False, 'claimed': True}))
+
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app."""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@free_submission_ids()
+@patch.dict(os.environ, {'INGESTION_MODE': 'async'})
+@patch('api.notify_ingestion_workers')
+@patch('api.enqueue_feedback', return_value=True)
+@patch('api.analyze_feedback')
+def test_async_create_feedback_returns_202(mock_analyze, mock_enqueue, mock_notify, client):
+    """In async mode the feedback is queued and accepted without calling the LLM."""
+    response = client.post('/feedbacks', json={'id': 'a1', 'feedback': 'Quero mais meditações'})
+
+    assert response.status_code == 202
+    assert response.headers['Location'] == '/feedbacks/a1'
+    assert json.loads(response.data) == {'id': 'a1', 'status': 'PENDING', 'status_url': '/feedbacks/a1'}
+    mock_enqueue.assert_called_once_with('a1', 'Quero mais meditações')
+    mock_notify.assert_called_once()
+    mock_analyze.assert_not_called()
+
+
+@free_submission_ids()
+@patch('api.enqueue_feedback', return_value=False)
+def test_async_duplicate_id_returns_409(mock_enqueue, client):
+    """An id that is already queued or stored is rejected."""
+    response = client.post('/feedbacks?async=true', json={'id': 'a1', 'feedback': 'texto'})
+    assert response.status_code == 409
+
+
+@patch('api.get_feedback_status')
+def test_feedback_status_endpoint(mock_status, client):
+    """GET /feedbacks/<id> reports the queue status, or 404 for unknown ids."""
+    mock_status.return_value = {'id': 'a1', 'status': 'PENDING', 'attempts': 1, 'last_error': None}
+    response = client.get('/feedbacks/a1')
+    assert response.status_code == 200
+    assert json.loads(response.data)['status'] == 'PENDING'
+
+    mock_status.return_value = None
+    assert client.get('/feedbacks/missing').status_code == 404
+
+
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'OPENAI_MODEL': 'gpt-4o-mini'})
+@patch('src.ingestion.worker.complete_feedback_job')
+@patch('src.ingestion.worker.analyze_feedback')
+def test_worker_stores_analyzed_feedback(mock_analyze, mock_complete):
+    """A successful analysis is stored, stamped with its model and prompt version, and the job closed."""
+    mock_analyze.return_value = (True, {'id': 'a1', 'sentiment': 'POSITIVO', 'feature_code': None, 'feature_reason': None})
+
+    assert process_feedback_job({'id': 'a1', 'feedback': 'Adoro o app', 'attempts': 1}) == 'DONE'
+    mock_complete.assert_called_once_with({
+        'id': 'a1', 'feedback': 'Adoro o app', 'sentiment': 'POSITIVO', 'feature_code': None, 'feature_reason': None,
+        'feature_cluster_id': None, 'analysis_model': 'gpt-4o-mini', 'analysis_prompt_version': COMBINED_PROMPT_VERSION
+    })
+
+
+@patch('src.ingestion.worker.finish_feedback_job')
+@patch('src.ingestion.worker.retry_feedback_job')
+@patch('src.ingestion.worker.analyze_feedback', side_effect=RuntimeError('429 Too Many Requests'))
+def test_worker_retries_then_gives_up(mock_analyze, mock_retry, mock_finish):
+    """Failures are retried with backoff until the attempt limit, then marked FAILED."""
+    with patch.dict(os.environ, {'INGESTION_MAX_ATTEMPTS': '3', 'INGESTION_BACKOFF_BASE': '2'}):
+        assert process_feedback_job({'id': 'a1', 'feedback': 'x', 'attempts': 2}) == 'PENDING'
+        assert process_feedback_job({'id': 'a1', 'feedback': 'x', 'attempts': 3}) == 'FAILED'
+
+    feedback_id, error, delay = mock_retry.call_args.args
+    assert feedback_id == 'a1' and '429' in error
+    assert 0 <= delay <= 4
+    mock_finish.assert_called_once_with('a1', 'FAILED', '429 Too Many Requests')
+
+
+def test_backoff_is_capped():
+    """Backoff grows exponentially but never beyond the cap."""
+    assert all(backoff_delay(20, base=1, cap=30) <= 30 for _ in range(50))
+
+
+@patch('src.ingestion.worker.process_feedback_job', side_effect=[RuntimeError('pool timeout'), 'DONE'])
+@patch('src.ingestion.worker.claim_feedback_jobs')
+def test_worker_survives_a_failure_to_record_the_outcome(mock_claim, mock_process):
+    """An error escaping process_feedback_job is logged and the worker moves on to the next job."""
+    pool = IngestionWorkerPool(workers=1, poll_interval=0, lease_seconds=60)
+    jobs = [[{'id': 'a1', 'feedback': 'x', 'attempts': 1}], [{'id': 'a2', 'feedback': 'y', 'attempts': 1}]]
+
+    def claim(limit, lease_seconds):
+        if not jobs:
+            pool._stopping.set()
+            return []
+        return jobs.pop(0)
+    mock_claim.side_effect = claim
+
+    pool._run()
+    assert [c.args[0]['id'] for c in mock_process.call_args_list] == ['a1', 'a2']
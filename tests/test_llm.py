@@ -0,0 +1,42 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from src.analysis.analysis import spam_filter, analyze_feedback_combined
+from src.utils.llm import get_llm, reset_llm_clients
+
+
+@pytest.fixture
+def fake_llm():
+    """Point the LLM registry at a local fake OpenAI server."""
+    with FakeOpenAIServer() as server:
+        env = {'OPENAI_BASE_URL': server.base_url, 'OPENAI_API_KEY': 'sk-test', 'OPENAI_MODEL': 'fake-model',
+               'LLM_CACHE_ENABLED': 'false'}
+        with patch.dict(os.environ, env):
+            reset_llm_clients()
+            yield server
+            reset_llm_clients()
+
+
+def test_registry_reuses_clients(fake_llm):
+    """Clients are shared per (model, temperature, key) and rebuilt only when the key changes."""
+    assert get_llm() is get_llm()
+    assert get_llm(temperature=0.7) is get_llm(temperature=0.7)
+    assert get_llm(temperature=0.7) is not get_llm()
+
+
+def test_calls_share_keep_alive_connection(fake_llm):
+    """Sequential LLM calls go over a single keep-alive HTTP connection."""
+    assert spam_filter("Quero mais meditações guiadas") is True
+    assert spam_filter("Quero mais meditações guiadas") is True
+    result = analyze_feedback_combined("Quero mais meditações guiadas", "f1")
+
+    assert result['id'] == 'f1'
+    assert result['sentiment'] == 'POSITIVO'
+    assert fake_llm.requests == 3
+    assert fake_llm.connections == 1
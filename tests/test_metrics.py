@@ -0,0 +1,97 @@
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import app
+from src.analysis.analysis import FeedbackAnalysis
+from src.analysis.cache import clear_cache
+from src.database.database import close_pool
+from src.utils.metrics import CallbackGauge, LabeledCounter, LabeledHistogram, render_prometheus, stage, start_profile, finish_profile
+
+
+# POST /feedbacks reserves the feedback id before analyzing it; these tests start from a free id
+def free_submission_ids():
+    return patch.multiple('src.ingestion.submissions', finish_submission=MagicMock(),
+                          reserve_submission=MagicMock(return_value={'reused': False, 'claimed': True}))
+
+
+def test_prometheus_text_format():
+    """Counters and cumulative histogram buckets render in the exposition format."""
+    counter = LabeledCounter('test_events_total', 'Events', ('kind',))
+    counter.inc(('a"b',), 2)
+    histogram = LabeledHistogram('test_duration_seconds', 'Durations', ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(('x',), 0.05)
+    histogram.observe(('x',), 0.5)
+
+    text = render_prometheus(extra=[counter, histogram])
+
+    assert '# TYPE test_events_total counter' in text
+    assert 'test_events_total{kind="a\\"b"} 2.0' in text
+    assert 'test_duration_seconds_bucket{stage="x",le="0.1"} 1.0' in text
+    assert 'test_duration_seconds_bucket{stage="x",le="+Inf"} 2.0' in text
+    assert 'test_duration_seconds_count{stage="x"} 2.0' in text
+
+
+def test_failing_gauge_leaves_the_other_metrics():
+    """A gauge whose callback raises is skipped; the pool gauge never opens the pool."""
+    counter = LabeledCounter('test_ok_total', 'Events', ('kind',))
+    counter.inc(('a',))
+    broken = CallbackGauge('test_broken', 'Broken', MagicMock(side_effect=RuntimeError('database is down')))
+
+    close_pool()
+    with patch('src.database.database.get_db_connection', side_effect=RuntimeError('no database')) as mock_connect:
+        text = render_prometheus(extra=[broken, counter])
+    mock_connect.assert_not_called()
+
+    assert 'test_broken' not in text
+    assert 'test_ok_total{kind="a"} 1.0' in text
+    assert '# TYPE alumind_db_pool gauge' in text
+
+
+def test_stages_are_collected_only_while_profiling():
+    histogram = LabeledHistogram('test_stage_seconds', 'Stages', ('stage',))
+    with stage('idle', histogram):
+        pass
+    token = start_profile()
+    with stage('profiled', histogram):
+        pass
+    stages = finish_profile(token)
+
+    assert [name for name, _ in stages] == ['profiled']
+    assert [labels for labels, _ in histogram.items()] == [('idle',), ('profiled',)]
+
+
+@free_submission_ids()
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'FEATURE_CLUSTERING_ENABLED': 'false', 'PREFILTER_ENABLED': 'false'})
+@patch('src.analysis.analysis.get_structured_llm')
+@patch('src.database.database.get_db_connection')
+def test_profile_header_and_metrics_endpoint(mock_get_db, mock_structured_llm):
+    """X-Profile returns the stage breakdown, and /metrics counts the outcome and DB timing."""
+    clear_cache()
+    mock_structured_llm.return_value.invoke.return_value = FeedbackAnalysis(
+        is_spam=False, sentiment='POSITIVO', feature_code=None, feature_reason=None)
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_get_db.return_value = mock_conn
+    close_pool()
+
+    with app.test_client() as client:
+        profiled = client.post('/feedbacks', json={'id': 'm1', 'feedback': 'Gostei muito'}, headers={'X-Profile': '1'})
+        plain = client.post('/feedbacks', json={'id': 'm2', 'feedback': 'Gostei demais'})
+        metrics = client.get('/metrics')
+
+    close_pool()
+    clear_cache()
+    assert profiled.status_code == 201 and plain.status_code == 201
+    timing = profiled.headers['Server-Timing']
+    assert 'analysis;dur=' in timing and 'db.insert_feedback;dur=' in timing and 'total;dur=' in timing
+    assert 'Server-Timing' not in plain.headers
+
+    text = metrics.get_data(as_text=True)
+    assert metrics.content_type.startswith('text/plain')
+    assert 'alumind_feedback_submissions_total{outcome="created"}' in text
+    assert 'alumind_db_query_duration_seconds_count{function="insert_feedback"}' in text
+    assert 'alumind_http_responses_total{method="POST",endpoint="/feedbacks",status="201"}' in text
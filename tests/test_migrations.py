@@ -0,0 +1,108 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.migrations import MIGRATIONS, LATEST_VERSION, SchemaOutdated, apply_migrations
+from src.database.database import ensure_schema, close_pool
+
+
+class FakeCursor:
+    """Answers the catalog queries of the migration runner for a plain (unpartitioned) schema."""
+
+    def __init__(self, version):
+        self.version = version
+        self.statements = []
+        self.result = None
+
+    def execute(self, sql, params=None):
+        self.statements.append((' '.join(sql.split()), params))
+        if 'to_regclass(\'schema_migrations\')' in sql:
+            self.result = (True,)
+        elif 'MAX(version)' in sql:
+            self.result = (self.version,)
+        elif 'relkind' in sql:
+            self.result = ('r',)
+        else:
+            self.result = (False,)
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def test_only_pending_migrations_run_and_indexes_are_built_concurrently():
+    cur = FakeCursor(version=1)
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+
+    assert apply_migrations(conn) == [v for v in range(2, LATEST_VERSION + 1)]
+
+    sql = [statement for statement, _ in cur.statements]
+    assert not any('CREATE TABLE IF NOT EXISTS feedbacks' in statement for statement in sql)
+    assert 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_feedbacks_sentiment ON feedbacks (sentiment)' in sql
+    # pg_trgm is not installed here, so its index is skipped rather than failing the migration
+    assert not any('idx_feedbacks_feedback_trgm' in statement for statement in sql)
+    recorded = [params for statement, params in cur.statements if statement.startswith('INSERT INTO schema_migrations')]
+    assert recorded == [(m.version, m.name) for m in MIGRATIONS if m.version > 1]
+    assert sql[-1].startswith('SELECT pg_advisory_unlock')
+
+
+@patch.dict(os.environ, {'SCHEMA_STARTUP': 'check'})
+@patch('src.database.database.get_db_connection')
+def test_startup_check_fails_fast_on_missing_migrations(mock_get_db):
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_conn.cursor.return_value.fetchone.return_value = (True,)
+    mock_conn.cursor.return_value.fetchall.return_value = [(LATEST_VERSION,)]
+    mock_get_db.return_value = mock_conn
+
+    close_pool()
+    try:
+        with pytest.raises(SchemaOutdated, match='python -m src.database.migrations'):
+            ensure_schema()
+    finally:
+        close_pool()
+
+    # Nothing but catalog reads at startup: no DDL
+    executed = ' '.join(call.args[0] for call in mock_conn.cursor.return_value.execute.call_args_list)
+    assert 'CREATE' not in executed and 'ALTER' not in executed
+
+
+def test_baseline_migration_only_creates_the_original_table():
+    cur = FakeCursor(version=0)
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+
+    assert apply_migrations(conn, target=1) == [1]
+
+    sql = ' '.join(statement for statement, _ in cur.statements)
+    assert 'CREATE TABLE IF NOT EXISTS feedbacks' in sql
+    # Every later feature brings its own migration
+    for table in ('llm_cache', 'feedback_queue', 'feature_clusters', 'spam_samples', 'report_runs'):
+        assert table not in sql
+    assert 'search_vector' not in sql and 'feedback_stats' not in sql
+
+
+def test_index_skipped_for_a_missing_extension_is_built_once_it_is_installed():
+    class TrigramCursor(FakeCursor):
+        def execute(self, sql, params=None):
+            super().execute(sql, params)
+            if 'pg_extension' in sql:
+                self.result = (True,)
+
+    cur = TrigramCursor(version=LATEST_VERSION)
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+
+    assert apply_migrations(conn) == []
+
+    sql = [statement for statement, _ in cur.statements]
+    assert ('CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_feedbacks_feedback_trgm ON feedbacks '
+            'USING GIN (feedback gin_trgm_ops)') in sql
+    assert not any(statement.startswith('INSERT INTO schema_migrations') for statement in sql)
@@ -0,0 +1,61 @@
+import gzip
+import json
+import sys
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.partitions import (
+    add_months, partition_name, partition_month, partition_months, expired_partitions, write_archive
+)
+from src.database.database import maintain_feedback_partitions
+
+
+def test_partition_months_cover_the_premake_window():
+    """Partitions run from the first month (e.g. the oldest migrated row) to N months ahead."""
+    now = datetime(2024, 11, 20, 15, 30)
+    assert partition_months(now, 2) == [datetime(2024, 11, 1), datetime(2024, 12, 1), datetime(2025, 1, 1)]
+    assert partition_months(now, 0, first=datetime(2024, 9, 3)) == [
+        datetime(2024, 9, 1), datetime(2024, 10, 1), datetime(2024, 11, 1)]
+    assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+    assert partition_month(partition_name(datetime(2024, 3, 1))) == datetime(2024, 3, 1)
+
+
+def test_only_whole_months_past_retention_expire():
+    names = [partition_name(datetime(2024, month, 1)) for month in range(1, 13)]
+    now = datetime(2024, 12, 15)
+
+    assert expired_partitions(names, now, 0) == []
+    # Keeping 3 months keeps September, October and November (December is the current one)
+    assert expired_partitions(names, now, 3) == names[:8]
+
+
+def test_archive_is_gzipped_jsonl(tmp_path):
+    path = str(tmp_path / 'archive' / 'feedbacks_p2024_01.jsonl.gz')
+    rows = [{'id': 'f1', 'feedback': 'Ótimo', 'created_at': datetime(2024, 1, 2, 3, 4)},
+            {'id': 'f2', 'feedback': 'Ruim', 'created_at': datetime(2024, 1, 5)}]
+
+    assert write_archive(iter(rows), path) == 2
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        lines = [json.loads(line) for line in archive]
+    assert lines[0] == {'id': 'f1', 'feedback': 'Ótimo', 'created_at': '2024-01-02T03:04:00'}
+    assert not os.path.exists(path + '.partial')
+
+
+@patch('src.database.database.is_partitioned', return_value=False)
+@patch('src.database.database.get_connection')
+def test_maintenance_closes_its_cursor_on_a_plain_table(mock_get_connection, mock_is_partitioned):
+    """A plain feedbacks table needs no maintenance, and the cursor opened to find out is closed."""
+    conn = MagicMock()
+
+    @contextmanager
+    def connection():
+        yield conn
+    mock_get_connection.side_effect = connection
+
+    assert maintain_feedback_partitions() == ([], [])
+    conn.cursor.return_value.close.assert_called_once()
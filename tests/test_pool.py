@@ -0,0 +1,139 @@
+import pytest
+import threading
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.pool import ConnectionPool, PoolTimeout
+
+
+def make_connection():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = 0
+    return conn
+
+
+def test_connections_are_reused():
+    """A returned connection is handed out again instead of opening a new one."""
+    connect = MagicMock(side_effect=make_connection)
+    pool = ConnectionPool(connect, minconn=0, maxconn=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert connect.call_count == 1
+    first.commit.assert_called()
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_error_rolls_back_and_returns_connection():
+    """An exception inside the block rolls back and still releases the connection."""
+    pool = ConnectionPool(make_connection, minconn=1, maxconn=1)
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("boom")
+
+    conn.rollback.assert_called()
+    stats = pool.stats()
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
+
+
+def test_saturated_pool_waits_then_times_out():
+    """Checkout blocks while the pool is full and raises PoolTimeout when it stays full."""
+    pool = ConnectionPool(make_connection, minconn=0, maxconn=1, timeout=0.05)
+    held = pool.getconn()
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    released = threading.Timer(0.05, pool.putconn, args=(held,))
+    released.start()
+    conn = pool.getconn(timeout=2)
+    released.join()
+
+    assert conn is held
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] == 1
+    assert stats['saturation'] == 1.0
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    """A pooled connection that was closed behind our back is discarded on checkout."""
+    pool = ConnectionPool(make_connection, minconn=1, maxconn=1)
+    with pool.connection() as conn:
+        pass
+    conn.closed = 1
+
+    with pool.connection() as fresh:
+        pass
+
+    assert fresh is not conn
+    assert pool.stats()['discarded'] == 1
+
+
+def test_concurrent_checkouts_never_exceed_maxconn():
+    """Slots stay reserved while connecting or replacing a stale connection, so size never tops maxconn."""
+    lock = threading.Lock()
+    open_connections = []
+    peak = [0]
+
+    def slow_connect():
+        conn = make_connection()
+        conn.close.side_effect = lambda: setattr(conn, 'closed', 1)
+        with lock:
+            open_connections.append(conn)
+            peak[0] = max(peak[0], sum(1 for c in open_connections if not c.closed))
+        threading.Event().wait(0.005)
+        return conn
+
+    pool = ConnectionPool(slow_connect, minconn=0, maxconn=3, timeout=5, ping_interval=0)
+    # Every idle connection is pinged and half of the pings fail, so stale ones are replaced
+    failures = iter([True, False] * 100)
+
+    def checkouts():
+        for _ in range(20):
+            conn = pool.getconn()
+            conn.cursor.side_effect = RuntimeError('gone') if next(failures) else None
+            pool.putconn(conn)
+
+    threads = [threading.Thread(target=checkouts) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] <= 3
+    assert pool.stats()['size'] <= 3 and pool.stats()['in_use'] == 0
+
+
+def test_failed_replacement_frees_the_slot_for_a_waiter():
+    """When replacing a dead connection fails, the slot is released and a waiting thread woken right away."""
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 2:
+            threading.Event().wait(0.1)
+            raise RuntimeError('connection refused')
+        return make_connection()
+
+    pool = ConnectionPool(connect, minconn=1, maxconn=1, timeout=5)
+    pool._idle[0][0].closed = 1
+    failed = threading.Thread(target=lambda: pytest.raises(RuntimeError, pool.getconn))
+    failed.start()
+    threading.Event().wait(0.02)
+
+    conn = pool.getconn()
+    failed.join()
+    assert len(attempts) == 3
+    assert pool.stats()['size'] == 1 and pool.stats()['wait_time_max'] < 2
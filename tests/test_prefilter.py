@@ -0,0 +1,76 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analysis.analysis import analyze_feedback, FeedbackAnalysis
+from src.analysis.cache import clear_cache
+from src.analysis.prefilter import heuristic_rule, NgramSpamModel, SpamPrefilter, set_prefilter
+
+VALID_TEXTS = [
+    'Gostaria de mais meditações guiadas para dormir',
+    'O app trava quando abro as sessões de terapia',
+    'Adorei os conteúdos sobre ansiedade, muito úteis',
+    'Seria ótimo poder editar meu perfil',
+    'As notificações de lembrete chegam atrasadas',
+    'Queria um modo escuro para usar à noite',
+]
+SPAM_TEXTS = [
+    'Ganhe 500 reais por dia trabalhando de casa, acesse já',
+    'Oferta exclusiva de celulares baratos, chame no zap',
+    'Seguidores grátis para seu instagram, peça já',
+    'Empréstimo sem consulta ao SPC, ligue agora',
+    'Curso de marketing digital com 90% de desconto hoje',
+    'Faça renda com apostas esportivas, bônus de cadastro',
+]
+
+
+@pytest.mark.parametrize('text, rule', [
+    ('', 'empty'),
+    ('!!! ???', 'empty'),
+    ('https://promo.example.com/x', 'url_only'),
+    ('ok', 'too_short'),
+    ('kkkkkkkkkkkk', 'repeated_characters'),
+    ('Compre agora com desconto!', 'spam_phrase'),
+    ('Adorei!!!!!! Muito bom o app', None),
+    ('Gostaria de mais meditações guiadas', None),
+])
+def test_heuristic_rules(text, rule):
+    assert heuristic_rule(text) == rule
+
+
+def test_ngram_model_separates_classes():
+    model = NgramSpamModel().fit(VALID_TEXTS, SPAM_TEXTS)
+    assert model.spam_probability('Ganhe reais por dia trabalhando de casa') > 0.9
+    assert model.spam_probability('Gostaria de meditações guiadas para ansiedade') < 0.1
+
+
+@patch.dict(os.environ, {'ANALYSIS_MODE': 'combined', 'PREFILTER_ENABLED': 'true'})
+@patch('src.analysis.prefilter.insert_spam_sample')
+@patch('src.analysis.analysis.get_structured_llm')
+def test_prefilter_skips_llm_for_confident_spam(mock_structured_llm, mock_insert_sample):
+    """Confident local spam never reaches the LLM; uncertain inputs do, and their label is recorded."""
+    prefilter = SpamPrefilter(NgramSpamModel().fit(VALID_TEXTS, SPAM_TEXTS), threshold=0.999999, audit_rate=0)
+    set_prefilter(prefilter)
+    clear_cache()
+    mock_structured_llm.return_value.invoke.return_value = FeedbackAnalysis(is_spam=True)
+    try:
+        assert analyze_feedback('clique aqui para ganhar', 'a') == (False, None)
+        mock_structured_llm.return_value.invoke.assert_not_called()
+
+        assert analyze_feedback('Não gostei da última atualização', 'b') == (False, None)
+        mock_structured_llm.return_value.invoke.assert_called_once()
+        mock_insert_sample.assert_called_once()
+
+        stats = prefilter.stats()
+        assert stats['checked'] == 2
+        assert stats['local_spam'] == 1
+        assert stats['llm_calls_avoided'] == 1
+        assert stats['avoided_fraction'] == 0.5
+        assert stats['rules'] == {'spam_phrase': 1}
+    finally:
+        set_prefilter(None)
+        clear_cache()
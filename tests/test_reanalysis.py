@@ -0,0 +1,120 @@
+import pytest
+import sys
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analysis.analysis import FeedbackBatchAnalysis, FeedbackBatchItem, classify_feedback_batch
+from src.analysis.reanalysis import Reanalyzer, agreement_stats, resume_or_start
+
+
+def fake_batch_analysis(feedbacks):
+    """Fail batches with a 'timeout' text, flag 'spam' texts and label the rest as negative."""
+    if any('timeout' in text for text in feedbacks):
+        raise TimeoutError('LLM timed out')
+    return [
+        {'is_spam': 'spam' in text, 'sentiment': None if 'spam' in text else 'NEGATIVO',
+         'feature_code': None if 'spam' in text else 'LOGIN', 'feature_reason': None}
+        for text in feedbacks
+    ]
+
+
+def feedback_row(index, text):
+    return {'id': 'f%d' % index, 'feedback': text, 'created_at': datetime(2024, 5, index)}
+
+
+@patch('src.analysis.reanalysis.assign_feature_cluster', return_value=7)
+@patch('src.analysis.reanalysis.save_reanalysis_chunk')
+@patch('src.analysis.reanalysis.get_reanalysis_chunk')
+@patch('src.analysis.reanalysis.classify_feedback_batch', side_effect=fake_batch_analysis)
+def test_run_resumes_from_checkpoint_and_commits_each_chunk(mock_analyze, mock_chunk, mock_save, mock_cluster):
+    """Each chunk's labels are saved with the checkpoint after its last row; failures are only counted."""
+    run = {'id': 3, 'model': 'gpt-new', 'prompt_version': 'v2', 'status': 'RUNNING',
+           'last_created_at': datetime(2024, 5, 1), 'last_id': 'f1'}
+    chunks = [
+        [feedback_row(2, 'não consigo entrar'), feedback_row(3, 'spam spam')],
+        [feedback_row(4, 'timeout no login')],
+        []
+    ]
+    mock_chunk.side_effect = chunks
+    mock_save.side_effect = lambda run_id, results, checkpoint, failed: dict(
+        run, last_created_at=checkpoint[0], last_id=checkpoint[1])
+
+    progress = list(Reanalyzer(concurrency=2, batch_size=1, chunk_size=2, rate_limit=6000).run(run))
+
+    assert [p['last_id'] for p in progress] == ['f3', 'f4']
+    # The scan starts after the stored checkpoint and continues after each saved chunk
+    assert [c.args[0] for c in mock_chunk.call_args_list] == [
+        (datetime(2024, 5, 1), 'f1'), (datetime(2024, 5, 3), 'f3'), (datetime(2024, 5, 4), 'f4')]
+    assert mock_chunk.call_args.args[1:] == ('gpt-new', 'v2', 2)
+
+    first, second = mock_save.call_args_list
+    run_id, results, checkpoint, failed = first.args
+    assert (run_id, checkpoint, failed) == (3, (datetime(2024, 5, 3), 'f3'), 0)
+    assert [(r['id'], r['is_spam'], r['sentiment'], r.get('feature_cluster_id')) for r in results] == [
+        ('f2', False, 'NEGATIVO', 7), ('f3', True, None, None)]
+    assert second.args[1:] == ([], (datetime(2024, 5, 4), 'f4'), 1)
+
+
+def test_agreement_stats():
+    """Rates count the feedbacks the new analysis still labels; spam verdicts are reported apart."""
+    rows = [
+        {'sentiment': 'POSITIVO', 'shadow_sentiment': 'POSITIVO', 'shadow_is_spam': False,
+         'same_feature': True, 'same_cluster': True, 'count': 6},
+        {'sentiment': 'POSITIVO', 'shadow_sentiment': 'INCONCLUSIVO', 'shadow_is_spam': False,
+         'same_feature': False, 'same_cluster': True, 'count': 3},
+        {'sentiment': 'NEGATIVO', 'shadow_sentiment': 'POSITIVO', 'shadow_is_spam': False,
+         'same_feature': False, 'same_cluster': False, 'count': 1},
+        {'sentiment': 'NEGATIVO', 'shadow_sentiment': None, 'shadow_is_spam': True,
+         'same_feature': False, 'same_cluster': False, 'count': 2},
+    ]
+
+    assert agreement_stats(rows) == {
+        'analyzed': 12,
+        'now_spam': 2,
+        'sentiment_agreement': 0.6,
+        'feature_agreement': 0.6,
+        'cluster_agreement': 0.9,
+        'sentiment_changes': {'POSITIVO -> INCONCLUSIVO': 3, 'NEGATIVO -> POSITIVO': 1}
+    }
+    assert agreement_stats([])['sentiment_agreement'] is None
+
+
+@patch('src.analysis.reanalysis.start_reanalysis_run')
+@patch('src.analysis.reanalysis.get_reanalysis_run')
+def test_active_run_is_resumed_only_with_the_same_model_and_prompt(mock_run, mock_start):
+    """The shadow columns hold one run: a run with another model must be swapped or discarded first."""
+    active = {'id': 1, 'status': 'RUNNING', 'model': 'gpt-old', 'prompt_version': 'v1'}
+    mock_run.return_value = active
+    assert resume_or_start('gpt-old', 'v1') is active
+    with pytest.raises(ValueError, match='swap or discard'):
+        resume_or_start('gpt-new', 'v1')
+    mock_start.assert_not_called()
+
+    mock_run.return_value = dict(active, status='SWAPPED')
+    resume_or_start('gpt-new', 'v1')
+    mock_start.assert_called_once_with('gpt-new', 'v1')
+
+
+@patch('src.analysis.analysis.record_llm_label')
+@patch('src.analysis.analysis.store_cached_result')
+@patch('src.analysis.analysis.get_cached_result')
+@patch('src.analysis.analysis.check_spam_locally')
+@patch('src.analysis.analysis.invoke_llm')
+@patch('src.analysis.analysis.get_structured_llm')
+def test_shadow_labels_come_from_the_model_only(mock_llm, mock_invoke, mock_prefilter, mock_cache_get, mock_cache_put,
+                                                mock_record):
+    """Shadow runs skip the pre-filter and cache and record nothing as live traffic."""
+    mock_invoke.return_value = FeedbackBatchAnalysis(results=[
+        FeedbackBatchItem(index=1, is_spam=False, sentiment='NEGATIVO', feature_code='LOGIN', feature_reason=None),
+        FeedbackBatchItem(index=2, is_spam=True)])
+
+    results = classify_feedback_batch(['não consigo entrar', 'compre agora'])
+
+    assert [(r['is_spam'], r['sentiment']) for r in results] == [(False, 'NEGATIVO'), (True, None)]
+    assert mock_invoke.call_count == 1
+    for side_effect in (mock_prefilter, mock_cache_get, mock_cache_put, mock_record):
+        side_effect.assert_not_called()
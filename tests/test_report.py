@@ -0,0 +1,103 @@
+import json
+import sys
+import os
+from datetime import datetime
+from unittest.mock import patch
+from langchain_core.messages import AIMessage
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.reporting.report import get_report_period, build_report_data, generate_weekly_report, stream_weekly_report
+
+
+def test_report_period_covers_last_full_days():
+    """The default window is [midnight 7 days ago, today's midnight)."""
+    start, end = get_report_period(datetime(2026, 10, 12, 9, 30))
+    assert start == datetime(2026, 10, 5)
+    assert end == datetime(2026, 10, 12)
+
+
+@patch('src.reporting.report.get_report_data')
+def test_build_report_data_computes_deltas(mock_report_data):
+    """Percentages and week-over-week deltas are derived from one data-layer call."""
+    mock_report_data.return_value = {
+        'total': 4, 'previous_total': 2,
+        'sentiments': [
+            {'sentiment': 'POSITIVO', 'count': 3, 'previous_count': 1},
+            {'sentiment': 'NEGATIVO', 'count': 1, 'previous_count': 1},
+            {'sentiment': 'INCONCLUSIVO', 'count': 0, 'previous_count': 0},
+            {'sentiment': None, 'count': 0, 'previous_count': 1},
+        ],
+        'features': [{'feature_code': 'X', 'count': 2, 'previous_count': 3, 'feature_reason': 'r'}],
+    }
+
+    data = build_report_data(datetime(2026, 10, 5), datetime(2026, 10, 12))
+
+    mock_report_data.assert_called_once_with(datetime(2026, 10, 5), datetime(2026, 10, 12))
+    assert data['start_date'] == '2026-10-05'
+    assert data['end_date'] == '2026-10-11'
+    assert data['total_delta'] == 2
+    assert data['sentiment_summary'] == [
+        {'sentiment': 'POSITIVO', 'count': 3, 'percentage': 75.0,
+         'previous_count': 1, 'previous_percentage': 50.0, 'delta': 2},
+        {'sentiment': 'NEGATIVO', 'count': 1, 'percentage': 25.0,
+         'previous_count': 1, 'previous_percentage': 50.0, 'delta': 0},
+        # Feedbacks stored without a sentiment get a label instead of None
+        {'sentiment': 'Não classificado', 'count': 0, 'percentage': 0.0,
+         'previous_count': 1, 'previous_percentage': 50.0, 'delta': -1},
+    ]
+    assert data['feature_requests'][0]['delta'] == -1
+    assert data['feature_requests'][0]['feature_reason'] == 'r'
+
+
+NARRATIVE = {
+    'general_analysis': 'Semana com <b>menos</b> feedbacks.',
+    'sentiment_analysis': 'Sem feedbacks inconclusivos.',
+    'feature_analysis': 'Nenhuma funcionalidade pedida.',
+    'recommendations': ['Divulgar o app', 'Pedir avaliações'],
+    'conclusion': 'Acompanhar o volume.'
+}
+
+
+@patch('src.reporting.report.put_report_narrative')
+@patch('src.reporting.report.get_report_narrative', return_value=None)
+@patch('src.reporting.report.get_llm')
+@patch('src.reporting.report.get_report_data')
+def test_generate_weekly_report_uses_window(mock_report_data, mock_get_llm, mock_cached, mock_store):
+    """The figures are rendered locally; the LLM writes only the narrative JSON, which is then cached."""
+    mock_report_data.return_value = {'total': 0, 'previous_total': 5, 'sentiments': [], 'features': []}
+    mock_get_llm.return_value.invoke.return_value = AIMessage(content=json.dumps(NARRATIVE))
+
+    html = generate_weekly_report(datetime(2026, 9, 1), datetime(2026, 9, 8))
+
+    assert 'Período: 2026-09-01 a 2026-09-07' in html
+    assert '<span class="negative">-5</span>' in html
+    # Narrative text is escaped, never injected as markup
+    assert 'Semana com &lt;b&gt;menos&lt;/b&gt; feedbacks.' in html
+    assert '<li>Pedir avaliações</li>' in html
+    prompt = mock_get_llm.return_value.invoke.call_args[0][0]
+    assert '2026-09-01 até 2026-09-07' in prompt
+    assert 'semana anterior: 5' in prompt
+    assert '<style>' not in prompt
+    period_start, period_end, version, narrative = mock_store.call_args[0]
+    assert (period_start, period_end, narrative) == (datetime(2026, 9, 1), datetime(2026, 9, 8), NARRATIVE)
+    assert mock_cached.call_args[0] == (datetime(2026, 9, 1), datetime(2026, 9, 8), version)
+
+
+@patch('src.reporting.report.get_report_narrative', return_value=NARRATIVE)
+@patch('src.reporting.report.get_llm')
+@patch('src.reporting.report.get_report_data')
+def test_cached_narrative_is_reused_and_figures_stream_first(mock_report_data, mock_get_llm, mock_cached):
+    """A stored narrative costs no LLM call, and the figures are emitted before it is looked up."""
+    mock_report_data.return_value = {'total': 3, 'previous_total': 1, 'sentiments': [
+        {'sentiment': 'POSITIVO', 'count': 3, 'previous_count': 1}], 'features': []}
+
+    chunks = stream_weekly_report(datetime(2026, 9, 1), datetime(2026, 9, 8))
+    head = next(chunks)
+    mock_cached.assert_not_called()
+
+    html = head + ''.join(chunks)
+    mock_get_llm.assert_not_called()
+    mock_cached.assert_called_once()
+    assert html.index('Distribuição de Sentimentos') < html.index('Acompanhar o volume.')
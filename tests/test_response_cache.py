@@ -0,0 +1,81 @@
+import threading
+import sys
+import os
+import time
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.response_cache import StaleWhileRevalidateCache
+
+
+class Renderer:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls += 1
+            return 'page %d' % self.calls
+
+
+def run_inline(refresh):
+    refresh()
+
+
+def test_fresh_entry_is_reused():
+    """Within the TTL the page is rendered once and keeps its ETag."""
+    cache = StaleWhileRevalidateCache(ttl=60)
+    render = Renderer()
+
+    first = cache.get(render)
+    second = cache.get(render)
+
+    assert first == second
+    assert render.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_invalidated_entry_is_served_stale_while_refreshing():
+    """After a write the old page is served once while a refresh renders the new one."""
+    cache = StaleWhileRevalidateCache(ttl=60)
+    render = Renderer()
+    cache.get(render)
+    cache.invalidate()
+
+    stale_body, _ = cache.get(render, spawn=run_inline)
+    fresh_body, _ = cache.get(render)
+
+    assert stale_body == 'page 1'
+    assert fresh_body == 'page 2'
+    stats = cache.stats()
+    assert stats['stale_hits'] == 1
+    assert stats['refreshes'] == 2
+
+
+def test_concurrent_misses_render_once():
+    """Viewers arriving on an empty cache wait for a single render instead of stampeding."""
+    cache = StaleWhileRevalidateCache(ttl=60)
+    render = Renderer(delay=0.05)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get(render))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert render.calls == 1
+    assert len(set(results)) == 1
+
+
+def test_zero_ttl_disables_caching():
+    """A TTL of zero renders on every request."""
+    cache = StaleWhileRevalidateCache(ttl=0)
+    render = Renderer()
+    cache.get(render)
+    cache.get(render)
+    assert render.calls == 2
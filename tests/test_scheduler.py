@@ -0,0 +1,87 @@
+import sys
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.reporting.scheduler import last_due_time, due_periods, run_due_reports, ReportScheduler
+
+
+@contextmanager
+def fake_lock(acquired):
+    yield acquired
+
+
+def test_last_due_time():
+    """Reports are due on the configured weekday and time; before that, last week's is the latest."""
+    monday_9 = datetime(2026, 10, 12, 9, 0)
+    assert last_due_time(datetime(2026, 10, 14, 12, 0), 0, '09:00') == monday_9
+    assert last_due_time(monday_9, 0, '09:00') == monday_9
+    assert last_due_time(datetime(2026, 10, 12, 8, 59), 0, '09:00') == datetime(2026, 10, 5, 9, 0)
+
+
+def test_due_periods_catch_up_oldest_first():
+    """Missed weekly windows are listed oldest first, each [start, end) seven days long."""
+    periods = due_periods(datetime(2026, 10, 14), weeks=3, weekday=0, at='09:00')
+    assert periods == [
+        (datetime(2026, 9, 21), datetime(2026, 9, 28)),
+        (datetime(2026, 9, 28), datetime(2026, 10, 5)),
+        (datetime(2026, 10, 5), datetime(2026, 10, 12)),
+    ]
+
+
+@patch.dict(os.environ, {'REPORT_WEEKDAY': '0', 'REPORT_TIME': '09:00', 'REPORT_CATCHUP_WEEKS': '3'})
+@patch('src.reporting.scheduler.run_report', return_value=True)
+@patch('src.reporting.scheduler.get_report_runs')
+@patch('src.reporting.scheduler.report_lock')
+def test_run_due_reports_skips_done_periods(mock_lock, mock_runs, mock_run_report):
+    """Only periods without a DONE run are generated, and nothing runs without the lock."""
+    mock_lock.side_effect = lambda: fake_lock(True)
+    mock_runs.return_value = [
+        {'period_start': datetime(2026, 9, 21), 'period_end': datetime(2026, 9, 28), 'status': 'DONE'},
+        {'period_start': datetime(2026, 9, 28), 'period_end': datetime(2026, 10, 5), 'status': 'FAILED'},
+    ]
+
+    assert run_due_reports(datetime(2026, 10, 14)) is True
+    assert [call.args for call in mock_run_report.call_args_list] == [
+        (datetime(2026, 9, 28), datetime(2026, 10, 5)),
+        (datetime(2026, 10, 5), datetime(2026, 10, 12)),
+    ]
+
+    mock_run_report.reset_mock()
+    mock_lock.side_effect = lambda: fake_lock(False)
+    assert run_due_reports(datetime(2026, 10, 14)) is None
+    mock_run_report.assert_not_called()
+
+
+@patch.dict(os.environ, {'REPORT_WEEKDAY': '0', 'REPORT_TIME': '09:00'})
+@patch('src.reporting.scheduler.run_submission_purge')
+@patch('src.reporting.scheduler.run_partition_maintenance')
+@patch('src.reporting.scheduler.run_due_reports', return_value=True)
+def test_maintenance_runs_on_its_own_interval(mock_reports, mock_maintenance, mock_purge):
+    """Partition maintenance and the purge run hourly, while the report waits for its weekly due time."""
+    class FakeClock:
+        current = datetime(2026, 10, 14, 12, 0)
+
+        @classmethod
+        def now(cls):
+            return cls.current
+
+    scheduler = ReportScheduler(retry_interval=900, maintenance_interval=3600)
+    waits = []
+
+    def fake_wait(delay):
+        waits.append(delay)
+        FakeClock.current += timedelta(seconds=delay)
+        if len(waits) == 5:
+            scheduler.stop()
+
+    with patch('src.reporting.scheduler.datetime', FakeClock), patch.object(scheduler._stopping, 'wait', fake_wait):
+        scheduler.run()
+
+    assert waits == [3600] * 5
+    assert mock_maintenance.call_count == mock_purge.call_count == 5
+    mock_reports.assert_called_once()
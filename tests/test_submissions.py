@@ -0,0 +1,93 @@
+import json
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the project root to the path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api import app
+from src.ingestion.submissions import request_hash, submit_once
+
+
+def reservation(**fields):
+    row = {'stored': False, 'reused': False, 'claimed': False, 'reserved': False, 'idempotency_key': None,
+           'request_hash': None, 'status_code': None, 'response': None, 'in_progress': False}
+    row.update(fields)
+    return row
+
+
+@patch('src.ingestion.submissions.POLL_INTERVAL', 0)
+@patch('src.ingestion.submissions.finish_submission')
+@patch('src.ingestion.submissions.reserve_submission')
+def test_duplicates_wait_for_the_submission_in_progress(mock_reserve, mock_finish):
+    """A stored id is rejected outright; a duplicate in flight is waited for, never analyzed twice."""
+    submit = MagicMock(return_value=({'id': 'f1'}, 201, {}))
+    feedback = {'id': 'f1', 'feedback': 'Quero modo escuro'}
+
+    mock_reserve.return_value = reservation(stored=True)
+    assert submit_once(feedback, None, submit) == ({'error': 'Feedback with this ID already exists'}, 409, {})
+
+    mock_reserve.side_effect = [
+        reservation(reserved=True, in_progress=True, request_hash=''),
+        reservation(stored=True)
+    ]
+    assert submit_once(feedback, None, submit)[1] == 409
+    submit.assert_not_called()
+
+    mock_reserve.side_effect = None
+    mock_reserve.return_value = reservation(claimed=True)
+    assert submit_once(feedback, None, submit) == ({'id': 'f1'}, 201, {})
+    submit.assert_called_once()
+    # Without an Idempotency-Key nothing is kept: the id is released once the feedback is stored
+    mock_finish.assert_called_with('f1', 201, None)
+
+
+@patch('src.ingestion.submissions.finish_submission')
+@patch('src.ingestion.submissions.reserve_submission')
+def test_idempotency_key_keeps_and_replays_the_response(mock_reserve, mock_finish):
+    """The first response is kept for retries with the same key and payload; 503s are not."""
+    feedback = {'id': 'f1', 'feedback': 'Quero modo escuro'}
+    mock_reserve.return_value = reservation(claimed=True)
+
+    created = ({'id': 'f1', 'sentiment': 'POSITIVO'}, 201, {})
+    submit_once(feedback, 'k1', lambda: created)
+    mock_finish.assert_called_with('f1', 201, {'body': created[0], 'headers': {}})
+
+    submit_once(feedback, 'k2', lambda: ({'error': 'busy'}, 503, {'Retry-After': '5'}))
+    mock_finish.assert_called_with('f1', 503, None)
+
+    mock_reserve.return_value = reservation(
+        stored=True, reserved=True, idempotency_key='k1', request_hash=request_hash(feedback, 'k1'),
+        status_code=201, response={'body': created[0], 'headers': {}})
+    assert submit_once(feedback, 'k1', MagicMock()) == (created[0], 201, {'Idempotent-Replayed': 'true'})
+
+    changed = dict(feedback, feedback='Outro texto')
+    assert submit_once(changed, 'k1', MagicMock())[1] == 422
+    mock_reserve.return_value = reservation(reused=True)
+    assert submit_once({'id': 'f2', 'feedback': 'x'}, 'k1', MagicMock())[1] == 422
+
+
+@patch('api.analyze_feedback')
+@patch('src.ingestion.submissions.finish_submission')
+@patch('src.ingestion.submissions.reserve_submission')
+def test_create_feedback_replays_before_any_analysis(mock_reserve, mock_finish, mock_analyze):
+    """POST /feedbacks with a used Idempotency-Key answers from the reservation, without the LLM."""
+    feedback = {'id': 'f1', 'feedback': 'Quero modo escuro'}
+    body = {'id': 'f1', 'sentiment': 'POSITIVO', 'feature_code': 'MODO ESCURO', 'feature_reason': 'Tema escuro'}
+    mock_reserve.return_value = reservation(
+        stored=True, reserved=True, idempotency_key='retry-1', request_hash=request_hash(feedback, 'retry-1'),
+        status_code=201, response={'body': body, 'headers': {}})
+
+    with app.test_client() as client:
+        replayed = client.post('/feedbacks', json=feedback, headers={'Idempotency-Key': 'retry-1'})
+        invalid = client.post('/feedbacks', json=feedback, headers={'Idempotency-Key': 'x' * 300})
+
+    assert replayed.status_code == 201
+    assert json.loads(replayed.data) == body
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+    assert invalid.status_code == 400
+    mock_reserve.assert_called_once()
+    assert mock_reserve.call_args.args[:2] == ('f1', 'retry-1')
+    mock_analyze.assert_not_called()
+    mock_finish.assert_not_called()